@@ -0,0 +1,68 @@
+import os
+import json
+
+import requests
+
+from answer_pipeline import AnswerResult
+
+# --- عميل خدمة الإجابة (answer_service.py): نفس واجهة AnswerEngine التي تستخدمها واجهة Streamlit ---
+ANSWER_SERVICE_URL = os.getenv("ANSWER_SERVICE_URL", "")
+ANSWER_SERVICE_TIMEOUT_SECONDS = float(os.getenv("ANSWER_SERVICE_TIMEOUT_SECONDS", "60"))
+
+def result_from_dict(payload):
+    return AnswerResult(payload["answer"], payload["source"], payload.get("debug", []), payload.get("timings", {}))
+
+
+class AnswerServiceClient:
+    """
+    يرسل الأسئلة إلى خدمة الإجابة عبر HTTP ويعيد نفس الأحداث والنتائج التي يعيدها المحرك المحلي.
+    """
+    def __init__(self, base_url=ANSWER_SERVICE_URL, timeout=ANSWER_SERVICE_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def answer(self, user_question):
+        response = self.session.post(f"{self.base_url}/answer", json={"question": user_question}, timeout=self.timeout)
+        response.raise_for_status()
+        return result_from_dict(response.json())
+
+    def stream_answer(self, user_question):
+        """
+        مولّد الأحداث: ("source", المصدر)، ("token", نص)، ثم ("result", AnswerResult) أو ("error", الاستثناء).
+        """
+        try:
+            with self.session.post(
+                f"{self.base_url}/answer/stream", json={"question": user_question}, stream=True, timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=False):
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    kind, value = event["event"], event["data"]
+                    if kind == "result":
+                        yield kind, result_from_dict(value)
+                        return
+                    if kind == "error":
+                        yield kind, RuntimeError(value)
+                        return
+                    yield kind, value
+        except requests.RequestException as e:
+            yield "error", e
+            return
+        yield "error", RuntimeError("انقطع الاتصال بخدمة الإجابة قبل اكتمال الإجابة.")
+
+    def embeddings_ready(self):
+        try:
+            return self.session.get(f"{self.base_url}/health", timeout=self.timeout).json().get("embeddings_ready", False)
+        except (requests.RequestException, ValueError):
+            return False
+
+    def stats(self):
+        response = self.session.get(f"{self.base_url}/stats", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,195 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from answer_pipeline import AnswerPipeline, FAQ_DISTANCE_THRESHOLD
+from bm25_index import load_bm25_index
+from compact_store import get_store_version, has_compact_store, load_faq_store
+from embedding_backends import EMBEDDINGS_BACKEND, get_embeddings
+from faq_lookup import build_exact_match_index
+from query_cache import QueryCache
+from semantic_cache import SemanticAnswerCache
+from serper_cache import CachedSerperSearch
+
+# --- محرك الإجابة: تحميل الموارد وبناء خط الإجابة، دون أي اعتماد على واجهة Streamlit ---
+FAQ_VECTOR_DB_PATH = os.getenv("FAQ_VECTOR_DB_PATH", "faiss_university_qa_db")
+# EMBEDDINGS_MODEL_NAME = "sentence-transformers/distiluse-base-multilingual-cased-v1"
+EMBEDDINGS_MODEL_NAME = os.getenv("EMBEDDINGS_MODEL_NAME", "asafaya/bert-base-arabic")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-1.5-flash")
+# تشغيل استعلام تجريبي بعد تحميل النموذج حتى لا يتحمل أول مستخدم زمن تهيئة torch و BERT
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+WARMUP_QUERY = "ما هي الكليات الموجودة في الجامعة؟"
+# فترة فحص تغيّر فهرس الـ FAQ في خيط الخلفية بالثواني (0 = بدون إعادة تحميل تلقائية)
+FAQ_RELOAD_INTERVAL_SECONDS = float(os.getenv("FAQ_RELOAD_INTERVAL_SECONDS", "5"))
+
+def get_faq_index_version(vector_db_path):
+    # نسخة compact_info.json تتغير بعد اكتمال كل إعادة بناء فيُعاد تحميل الفهرس تلقائياً
+    return get_store_version(vector_db_path)
+
+def load_llm(model=LLM_MODEL_NAME):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, temperature=0) # استخدام نموذج Google Gemini
+
+def load_serper_search():
+    from langchain_community.utilities import GoogleSerperAPIWrapper
+    # البحث باللغة العربية، أول 3 نتائج، مع ذاكرة دائمة على القرص للنتائج (TTL + تحديث في الخلفية)
+    return CachedSerperSearch(GoogleSerperAPIWrapper(gl="sa", hl="ar", k=3))
+
+
+class AnswerEngine:
+    """
+    يملك جميع موارد الإجابة (نموذج التضمين، قاعدة الـ FAQ، الذاكرات، Gemini، Serper) ويشاركها بين كل الطلبات.
+    نموذج التضمين يُحمَّل في الخلفية، وفهرس الـ FAQ يُعاد تحميله من خيط في الخلفية عند إعادة بنائه،
+    فلا يمر أي عمل على القرص عبر حلقة أحداث الخدمة.
+    """
+    def __init__(self, vector_db_path=FAQ_VECTOR_DB_PATH, model_name=EMBEDDINGS_MODEL_NAME, enable_web_search=None,
+                 warmup=WARMUP_ON_STARTUP, faq_distance_threshold=FAQ_DISTANCE_THRESHOLD,
+                 reload_interval=FAQ_RELOAD_INTERVAL_SECONDS):
+        self.vector_db_path = vector_db_path
+        self.model_name = model_name
+        self.faq_distance_threshold = faq_distance_threshold
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._stop_reloader = threading.Event()
+        self._resources = []
+
+        self.embeddings_future = self._load_embeddings_in_background(warmup)
+        self.query_cache = QueryCache()
+        self.semantic_answer_cache = None
+        self.llm = load_llm()
+        self._resources.append(self.llm)
+        if enable_web_search is None:
+            enable_web_search = bool(os.getenv("SERPER_API_KEY"))
+        self.serper_search = load_serper_search() if enable_web_search else None
+        if self.serper_search is not None:
+            self._resources.append(self.serper_search)
+
+        self.faq_index_version = None
+        self._failed_faq_index_version = None
+        self.pipeline = None
+        self._load_faq()
+        self.embeddings_future.add_done_callback(self._enable_semantic_cache)
+        if self.reload_interval > 0:
+            threading.Thread(target=self._reload_loop, daemon=True).start()
+
+    def _load_embeddings_in_background(self, warmup):
+        # حتى يكتمل تحميل النموذج يجيب البحث اللفظي (BM25) في الـ FAQ وحده
+        def load():
+            # الواجهة (torch أو onnx) تُحدد عبر EMBEDDINGS_BACKEND ويجب أن تطابق واجهة build_vector_db.py
+            embeddings = get_embeddings(self.model_name, EMBEDDINGS_BACKEND)
+            self._resources.append(embeddings)
+            if warmup:
+                embeddings.embed_query(WARMUP_QUERY)
+            return embeddings
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(load)
+        executor.shutdown(wait=False)
+        return future
+
+    def embeddings_ready(self):
+        return self.embeddings_future.done()
+
+    def _load_faq(self):
+        """
+        يحمّل الفهرس الجديد أولاً ثم يستبدل به السابق، فإذا فشل التحميل يبقى الفهرس السابق صالحاً للاستخدام.
+        """
+        # الصيغة المضغوطة (memory map بدون pickle) لا تحتاج نموذج التضمين للتحميل، فلا ننتظره
+        embeddings = None if has_compact_store(self.vector_db_path) else self.embeddings_future.result()
+        # النسخة تُقرأ قبل التحميل: إذا انتهى بناء جديد أثناءه يُعاد التحميل في الفحص التالي
+        faq_index_version = get_faq_index_version(self.vector_db_path)
+        faq_vector_db = load_faq_store(self.vector_db_path, embeddings)
+        try:
+            faq_exact_match_index = build_exact_match_index(faq_vector_db)
+            faq_bm25_index = load_bm25_index(self.vector_db_path, faq_vector_db)
+        except Exception:
+            close = getattr(faq_vector_db, "close", None)
+            if callable(close):
+                close()
+            raise
+
+        previous_vector_db = getattr(self, "faq_vector_db", None)
+        self.faq_vector_db = faq_vector_db
+        self.faq_exact_match_index = faq_exact_match_index
+        self.faq_bm25_index = faq_bm25_index
+        self._resources.append(faq_vector_db)
+        if previous_vector_db is not None:
+            # الطلبات الجارية قد تستخدم الفهرس السابق، لذا يُترك لجامع القمامة بدلاً من إغلاقه هنا
+            self._resources.remove(previous_vector_db)
+        self.faq_index_version = faq_index_version
+        # التطابقات المخزنة تخص الفهرس السابق
+        self.query_cache.invalidate()
+        self.pipeline = AnswerPipeline(
+            self.embeddings_future, self.faq_vector_db, self.llm, self.serper_search,
+            exact_match_index=self.faq_exact_match_index,
+            query_cache=self.query_cache,
+            semantic_answer_cache=self.semantic_answer_cache,
+            bm25_index=self.faq_bm25_index,
+            faq_distance_threshold=self.faq_distance_threshold,
+        )
+
+    def reload_if_changed(self):
+        """
+        يعيد تحميل فهرس الـ FAQ إذا تغيّرت نسخته، ويعيد True عند النجاح.
+        نسخة فشل تحميلها لا تُعاد محاولتها حتى تتغير النسخة مرة أخرى.
+        """
+        faq_index_version = get_faq_index_version(self.vector_db_path)
+        if faq_index_version in (self.faq_index_version, self._failed_faq_index_version):
+            return False
+        with self._lock:
+            try:
+                self._load_faq()
+            except Exception as e:
+                self._failed_faq_index_version = faq_index_version
+                print(f"⚠️ تعذر إعادة تحميل فهرس الـ FAQ من '{self.vector_db_path}'، سيستمر استخدام الفهرس السابق: {e}")
+                return False
+        return True
+
+    def _reload_loop(self):
+        while not self._stop_reloader.wait(self.reload_interval):
+            self.reload_if_changed()
+
+    def _enable_semantic_cache(self, embeddings_future):
+        # تُستدعى في خيط تحميل النموذج عند اكتماله، فتحميل الذاكرة من القرص لا يمر عبر طلبات المستخدمين
+        if embeddings_future.cancelled() or embeddings_future.exception() is not None:
+            return
+        # اسم الواجهة جزء من هوية الذاكرة حتى لا تُخلط متجهات torch و onnx
+        semantic_answer_cache = SemanticAnswerCache(embeddings_future.result(), f"{self.model_name}@{EMBEDDINGS_BACKEND}")
+        with self._lock:
+            self.semantic_answer_cache = semantic_answer_cache
+            self._resources.append(semantic_answer_cache)
+            self.pipeline.semantic_answer_cache = semantic_answer_cache
+
+    def get_pipeline(self):
+        """
+        خط الإجابة الحالي. لا يقرأ من القرص ولا ينتظر القفل: إعادة التحميل تتم في خيط الخلفية
+        وتستبدل self.pipeline دفعة واحدة عند اكتمالها.
+        """
+        return self.pipeline
+
+    async def answer(self, user_question, on_event=None):
+        return await self.get_pipeline().answer(user_question, on_event)
+
+    def stream_answer(self, user_question):
+        # نفس أحداث AnswerPipeline.stream_answer_sync: source / token / result / error
+        return self.get_pipeline().stream_answer_sync(user_question)
+
+    def stats(self):
+        return {
+            "embeddings_ready": self.embeddings_ready(),
+            "faq_vectors": self.faq_vector_db.index.ntotal,
+            "query_cache": self.query_cache.stats(),
+            "serper_cache": self.serper_search.stats() if self.serper_search is not None else None,
+        }
+
+    def close(self):
+        self._stop_reloader.set()
+        for resource in self._resources:
+            for target in (resource, getattr(resource, "client", None)):
+                close = getattr(target, "close", None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception:
+                        pass
+        self._resources.clear()
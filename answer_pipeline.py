@@ -0,0 +1,309 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from faq_lookup import lookup_exact_match
+from bm25_index import HybridFaqRetriever
+
+# --- عتبة المسافة لأسئلة الـ FAQ والمهل الزمنية لكل طبقة (بالثواني) ---
+FAQ_DISTANCE_THRESHOLD = 0.2
+FAQ_TIMEOUT_SECONDS = float(os.getenv("FAQ_TIMEOUT_SECONDS", "10"))
+SERPER_TIMEOUT_SECONDS = float(os.getenv("SERPER_TIMEOUT_SECONDS", "6"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+
+UNIVERSITY_LINK_MARKERS = ("shamuniversity.com", "SHAM.UNIV")
+TIMEOUT_ANSWER = "عذراً، استغرقت الإجابة وقتاً أطول من المتوقع. يرجى المحاولة مرة أخرى."
+LLM_ERROR_ANSWER = "عذراً، حدث خطأ أثناء محاولة الإجابة من الذكاء الاصطناعي. يرجى المحاولة لاحقاً."
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    """
+    أنت مساعد ذكي. لخص المعلومات التالية للإجابة على السؤال التالي.
+    إذا كانت المعلومات غير كافية، اذكر ذلك بوضوح.
+    السؤال: {question}
+    المعلومات المسترجعة:
+    {snippets}
+
+    الإجابة الملخصة:
+    """
+)
+
+GENERAL_LLM_PROMPT = ChatPromptTemplate.from_template(
+    """
+    أنت مساعد ذكي. أجب على السؤال بأسلوب مهذب وواضح.
+    إذا كان السؤال يتعلق بمعلومات محددة جداً لا تعرفها ولم تجدها في مصادر البحث، اذكر بوضوح أنك لا تعرف.
+    لا تحاول اختلاق إجابات.
+
+    سؤال المستخدم: {question}
+
+    الإجابة:
+    """
+)
+
+# النتيجة: الإجابة، مصدرها (faq / web_search_answer_box / web_search_summary / llm / error)،
+# رسائل التتبع (DEBUG) وأزمنة كل طبقة بالمللي ثانية
+AnswerResult = namedtuple("AnswerResult", ["answer", "source", "debug", "timings"])
+# lexical_match: تطابق لفظي واثق (BM25) يكفي للإجابة من الـ FAQ حتى لو تجاوزت المسافة الدلالية العتبة
+FaqHit = namedtuple("FaqHit", ["embedding", "doc", "score", "lexical_match"], defaults=(False,))
+
+
+class AnswerPipeline:
+    """
+    خط الإجابة متعدد الطبقات: تطابق حرفي ← FAQ (هجين BM25 + FAISS) ← الذاكرة الدلالية ← Serper ← Gemini.
+    يبدأ طلب Serper بشكل استباقي أثناء البحث في الـ FAQ ويلغيه إذا كان تطابق الـ FAQ واثقاً،
+    ولكل طبقة مهلة، وللطلب كله موعد نهائي تُعاد عنده أفضل إجابة متاحة.
+    """
+    def __init__(self, embeddings, faq_vector_db, llm, serper_search=None, exact_match_index=None,
+                 query_cache=None, semantic_answer_cache=None, bm25_index=None, faq_distance_threshold=FAQ_DISTANCE_THRESHOLD,
+                 faq_timeout=FAQ_TIMEOUT_SECONDS, serper_timeout=SERPER_TIMEOUT_SECONDS,
+                 llm_timeout=LLM_TIMEOUT_SECONDS, request_deadline=REQUEST_DEADLINE_SECONDS):
+        self.embeddings = embeddings
+        self.faq_vector_db = faq_vector_db
+        self.llm = llm
+        self.serper_search = serper_search
+        self.exact_match_index = exact_match_index
+        self.query_cache = query_cache
+        self.semantic_answer_cache = semantic_answer_cache
+        self.hybrid_retriever = HybridFaqRetriever(faq_vector_db, bm25_index) if bm25_index is not None else None
+        self.faq_distance_threshold = faq_distance_threshold
+        self.faq_timeout = faq_timeout
+        self.serper_timeout = serper_timeout
+        self.llm_timeout = llm_timeout
+        self.request_deadline = request_deadline
+        self.summary_chain = SUMMARY_PROMPT | llm | StrOutputParser()
+        self.general_response_chain = GENERAL_LLM_PROMPT | llm | StrOutputParser()
+
+    def current_embeddings(self):
+        # نموذج التضمين قد يُحمَّل في الخلفية (Future)، وحتى يجهز يعمل البحث اللفظي وحده
+        if isinstance(self.embeddings, Future):
+            return self.embeddings.result() if self.embeddings.done() else None
+        return self.embeddings
+
+    # --- الطبقات ---
+    def search_faq(self, user_question):
+        """
+        البحث المتزامن في الـ FAQ (مع إعادة استخدام التضمين وأفضل تطابق من الذاكرة المؤقتة).
+        مع فهرس BM25 يكون البحث هجيناً (لفظي + دلالي)، وبدونه دلالياً فقط بأفضل نتيجة واحدة.
+        """
+        if self.query_cache is not None:
+            cached_query = self.query_cache.get(user_question)
+            if cached_query:
+                return FaqHit(cached_query.embedding, cached_query.doc, cached_query.score, cached_query.lexical_match)
+
+        embeddings = self.current_embeddings()
+        query_embedding = embeddings.embed_query(user_question) if embeddings is not None else None
+        if self.hybrid_retriever is not None:
+            best_faq_doc, best_faq_score, lexical_match = self.hybrid_retriever.search(user_question, query_embedding)
+        elif query_embedding is not None:
+            docs_with_scores = self.faq_vector_db.similarity_search_with_score_by_vector(query_embedding, k=1)
+            best_faq_doc, best_faq_score = docs_with_scores[0] if docs_with_scores else (None, float("inf"))
+            lexical_match = False
+        else:
+            return None
+        # لا نخزن نتائج البحث اللفظي وحده، فنتيجة البحث الهجين بعد تحميل النموذج أدق
+        if self.query_cache is not None and query_embedding is not None:
+            self.query_cache.put(user_question, query_embedding, best_faq_doc, best_faq_score, lexical_match)
+        return FaqHit(query_embedding, best_faq_doc, best_faq_score, lexical_match)
+
+    async def search_web(self, user_question):
+        # نتائج Serper الخام (answerBox و organic) عبر العميل غير المتزامن
+        return await self.serper_search.aresults(f"جامعة الشام {user_question}")
+
+    @staticmethod
+    def parse_web_results(search_results):
+        """
+        يعيد (إجابة صندوق الإجابة إن وجدت، قائمة المقتطفات ذات الصلة بالجامعة).
+        """
+        if not search_results:
+            return None, []
+        answer_box = search_results.get("answerBox") or {}
+        answer_from_serper = answer_box.get("snippet") or answer_box.get("answer")
+        relevant_snippets = [
+            result.get("snippet") for result in search_results.get("organic", [])
+            if result.get("snippet") and any(marker in result.get("link", "") for marker in UNIVERSITY_LINK_MARKERS)
+        ]
+        return answer_from_serper, relevant_snippets[:3] # خذ أول 3 مقتطفات ذات صلة
+
+    # --- التنسيق الزمني ---
+    async def answer(self, user_question, on_event=None):
+        """
+        on_event (اختياري): دالة تستقبل أحداث البث ("source", المصدر) ثم ("token", جزء من النص)
+        لطبقتي web_search_summary و llm، فتُعرض الإجابة أثناء توليدها.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_deadline
+        debug = []
+        timings = {}
+
+        def remaining(tier_timeout):
+            return max(0.0, min(tier_timeout, deadline - loop.time()))
+
+        async def timed(name, awaitable, tier_timeout):
+            started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(awaitable, timeout=remaining(tier_timeout))
+            finally:
+                timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+        def result(answer, source):
+            return AnswerResult(answer, source, debug, timings)
+
+        streamed_parts = []
+
+        async def generate(name, chain, inputs):
+            # بدون مستمع: استدعاء عادي؛ مع مستمع: بث الرموز فور توليدها وتسجيل زمن أول رمز (ttft)
+            if on_event is None:
+                return await chain.ainvoke(inputs)
+            started = time.perf_counter()
+            on_event("source", name)
+            async for chunk in chain.astream(inputs):
+                if not streamed_parts:
+                    timings[f"{name}_ttft"] = round((time.perf_counter() - started) * 1000, 1)
+                streamed_parts.append(chunk)
+                on_event("token", chunk)
+            return "".join(streamed_parts)
+
+        def partial_answer():
+            # إذا بدأ البث ثم انقطع، نحتفظ بما وصل للمستخدم بدلاً من الانتقال لطبقة أخرى
+            return "".join(streamed_parts) if streamed_parts else None
+
+        # المرحلة 0: تطابق حرفي مع سؤال FAQ بعد التوحيد (بدون نموذج التضمين)
+        exact_match = lookup_exact_match(self.exact_match_index, user_question)
+        if exact_match:
+            debug.append(f"تم الإجابة من FAQ مباشرة (تطابق حرفي بعد التوحيد مع: '{exact_match.question}').")
+            return result(exact_match.answer, "faq")
+
+        # نبدأ طلب Serper استباقياً بالتوازي مع البحث في الـ FAQ
+        web_task = asyncio.ensure_future(self.search_web(user_question)) if self.serper_search else None
+
+        def cancel_web_task():
+            if web_task and not web_task.done():
+                web_task.cancel()
+
+        try:
+            # المرحلة 1: البحث في قاعدة بيانات الأسئلة والأجوبة (FAQ)
+            faq_hit = None
+            try:
+                faq_hit = await timed("faq", asyncio.to_thread(self.search_faq, user_question), self.faq_timeout)
+            except asyncio.TimeoutError:
+                debug.append("انتهت مهلة البحث في الـ FAQ.")
+
+            if faq_hit and faq_hit.embedding is None:
+                debug.append("نموذج التضمين لم يُحمَّل بعد: البحث في الـ FAQ لفظي (BM25) فقط.")
+            if faq_hit and faq_hit.doc:
+                debug.append(f"أفضل مسافة في الـ FAQ: {faq_hit.score:.2f} — أفضل تطابق (سؤال): '{faq_hit.doc.page_content}'")
+                if faq_hit.score <= self.faq_distance_threshold or faq_hit.lexical_match:
+                    if faq_hit.doc.metadata.get("answer"):
+                        cancel_web_task()
+                        if faq_hit.score <= self.faq_distance_threshold:
+                            debug.append(f"تم الإجابة من FAQ مباشرة (المسافة: {faq_hit.score:.2f} <= {self.faq_distance_threshold}).")
+                        else:
+                            debug.append("تم الإجابة من FAQ مباشرة (تطابق لفظي واثق عبر BM25).")
+                        return result(faq_hit.doc.metadata["answer"], "faq")
+                    debug.append("⚠️ تم العثور على سؤال FAQ، لكنه لا يحتوي على إجابة. سيتم اللجوء للبحث على الويب أو LLM.")
+
+            # المرحلة 1.5: إجابة سابقة من الطبقات الاحتياطية لسؤال مشابه دلالياً
+            if faq_hit and faq_hit.embedding is not None and self.semantic_answer_cache is not None:
+                cached_answer = self.semantic_answer_cache.lookup(faq_hit.embedding)
+                if cached_answer:
+                    cancel_web_task()
+                    debug.append(f"تم الإجابة من الذاكرة الدلالية (سؤال مشابه: '{cached_answer.question}'، المسافة: {cached_answer.distance:.2f}).")
+                    return result(cached_answer.answer, cached_answer.source)
+
+            answer_content, answer_source, relevant_snippets = None, None, []
+            # إجابة مقطوعة (انتهاء المهلة أو خطأ أثناء البث) تُعرض للمستخدم لكنها لا تُخزن في الذاكرة الدلالية
+            answer_complete = False
+            # المرحلة 2: نتائج البحث على الويب (الطلب بدأ مسبقاً)
+            if web_task:
+                try:
+                    search_results = await timed("web_search", asyncio.shield(web_task), self.serper_timeout)
+                    answer_from_serper, relevant_snippets = self.parse_web_results(search_results)
+                    if answer_from_serper:
+                        debug.append("تم العثور على إجابة من Serper (صندوق الإجابة).")
+                        answer_content, answer_source = answer_from_serper, "web_search_answer_box"
+                        answer_complete = True
+                    elif relevant_snippets:
+                        debug.append("جاري تلخيص نتائج البحث من Serper.")
+                        summarized_answer = await timed(
+                            "web_search_summary",
+                            generate("web_search_summary", self.summary_chain, {"question": user_question, "snippets": "\n".join(relevant_snippets)}),
+                            self.llm_timeout,
+                        )
+                        if summarized_answer:
+                            answer_content, answer_source = summarized_answer, "web_search_summary"
+                            answer_complete = True
+                    else:
+                        debug.append("Serper لم يجد إجابة مباشرة أو مقتطفات كافية. اللجوء إلى LLM.")
+                except asyncio.TimeoutError:
+                    debug.append("انتهت مهلة البحث على الويب أو تلخيص نتائجه. اللجوء إلى LLM.")
+                except Exception as serper_e:
+                    debug.append(f"❌ حدث خطأ أثناء البحث على الويب: {serper_e}. اللجوء إلى LLM.")
+                if answer_content is None and partial_answer():
+                    answer_content, answer_source = partial_answer(), "web_search_summary"
+
+            # المرحلة 3: اللجوء إلى LLM (الذكاء الاصطناعي العام) كخيار أخير
+            if answer_content is None:
+                try:
+                    answer_content = await timed("llm", generate("llm", self.general_response_chain, {"question": user_question}), self.llm_timeout)
+                    answer_source = "llm"
+                    answer_complete = True
+                except asyncio.TimeoutError:
+                    debug.append("انتهت مهلة الذكاء الاصطناعي التوليدي.")
+                    if partial_answer():
+                        answer_content, answer_source = partial_answer(), "llm"
+                except Exception as llm_e:
+                    debug.append(f"❌ حدث خطأ أثناء الاتصال بالذكاء الاصطناعي التوليدي: {llm_e}")
+                    if not partial_answer():
+                        return result(LLM_ERROR_ANSWER, "error")
+                    answer_content, answer_source = partial_answer(), "llm"
+
+            if answer_content is None:
+                # انتهى الموعد النهائي: نعيد أفضل إجابة متاحة
+                return result(*self.best_available_answer(faq_hit, relevant_snippets, debug))
+
+            if answer_complete and faq_hit and faq_hit.embedding is not None and self.semantic_answer_cache is not None:
+                self.semantic_answer_cache.add(faq_hit.embedding, user_question, answer_content, answer_source)
+            return result(answer_content, answer_source)
+        finally:
+            cancel_web_task()
+
+    @staticmethod
+    def best_available_answer(faq_hit, relevant_snippets, debug):
+        if faq_hit and faq_hit.doc and faq_hit.doc.metadata.get("answer"):
+            debug.append(f"انتهى الوقت المحدد: إعادة أقرب إجابة FAQ (المسافة: {faq_hit.score:.2f}).")
+            return faq_hit.doc.metadata["answer"], "faq"
+        if relevant_snippets:
+            debug.append("انتهى الوقت المحدد: إعادة مقتطفات البحث على الويب دون تلخيص.")
+            return "\n".join(relevant_snippets), "web_search_summary"
+        debug.append("انتهى الوقت المحدد دون أي إجابة متاحة.")
+        return TIMEOUT_ANSWER, "error"
+
+    def answer_sync(self, user_question):
+        return asyncio.run(self.answer(user_question))
+
+    def stream_answer_sync(self, user_question):
+        """
+        مولّد متزامن (لواجهة Streamlit): يشغّل خط الإجابة في خيط مستقل ويعيد الأحداث فور وصولها:
+        ("source", المصدر)، ("token", نص)، ثم ("result", AnswerResult) أو ("error", الاستثناء) في النهاية.
+        """
+        events = queue.Queue()
+
+        def run():
+            try:
+                events.put(("result", asyncio.run(self.answer(user_question, lambda kind, value: events.put((kind, value))))))
+            except Exception as e:
+                events.put(("error", e))
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            kind, value = events.get()
+            yield kind, value
+            if kind in ("result", "error"):
+                return
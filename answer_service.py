@@ -0,0 +1,177 @@
+import os
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.web
+import tornado.netutil
+import tornado.process
+import tornado.httpserver
+from tornado.iostream import StreamClosedError
+from dotenv import load_dotenv
+
+# وحدات المشروع تقرأ إعداداتها من متغيرات البيئة، لذا تُستورد بعد load_dotenv
+load_dotenv()
+from answer_engine import AnswerEngine
+
+# --- خدمة HTTP مستقلة للإجابة (tornado، نفس الخادم الذي يعتمد عليه Streamlit) ---
+# POST /answer          {"question": "..."} -> {"answer", "source", "timings", "debug"}
+# POST /answer/stream   {"question": "..."} -> أسطر JSON (NDJSON): source / token ثم result أو error
+# GET  /health, /stats
+ANSWER_SERVICE_HOST = os.getenv("ANSWER_SERVICE_HOST", "127.0.0.1")
+ANSWER_SERVICE_PORT = int(os.getenv("ANSWER_SERVICE_PORT", "8600"))
+# أقصى عدد من الأسئلة قيد الإجابة في نفس الوقت لكل عملية (الباقي ينتظر دوره)
+ANSWER_SERVICE_CONCURRENCY = int(os.getenv("ANSWER_SERVICE_CONCURRENCY", "16"))
+# خيوط البحث في الـ FAQ (تضمين + FAISS) والعمليات المتزامنة الأخرى لكل عملية
+ANSWER_SERVICE_THREADS = int(os.getenv("ANSWER_SERVICE_THREADS", "4"))
+# عدد عمليات الخادم (0 = عملية لكل نواة)، كل عملية تحمّل نسختها من الموارد
+ANSWER_SERVICE_PROCESSES = int(os.getenv("ANSWER_SERVICE_PROCESSES", "1"))
+MAX_QUESTION_LENGTH = 1000
+
+def result_to_dict(result):
+    return {"answer": result.answer, "source": result.source, "timings": result.timings, "debug": result.debug}
+
+
+class BaseAnswerHandler(tornado.web.RequestHandler):
+    @property
+    def engine(self):
+        return self.application.settings["engine"]
+
+    @property
+    def semaphore(self):
+        return self.application.settings["semaphore"]
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(payload, ensure_ascii=False))
+
+    def read_question(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except json.JSONDecodeError:
+            raise tornado.web.HTTPError(400, reason="Invalid JSON body")
+        question = str(body.get("question", "")).strip()
+        if not question:
+            raise tornado.web.HTTPError(400, reason="Missing 'question'")
+        if len(question) > MAX_QUESTION_LENGTH:
+            raise tornado.web.HTTPError(413, reason="Question too long")
+        return question
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps({"error": self._reason}, ensure_ascii=False))
+
+
+class AnswerHandler(BaseAnswerHandler):
+    async def post(self):
+        question = self.read_question()
+        async with self.semaphore:
+            result = await self.engine.answer(question)
+        self.write_json(result_to_dict(result))
+
+
+class AnswerStreamHandler(BaseAnswerHandler):
+    """
+    يبث الأحداث فور وصولها كأسطر JSON. إذا أغلق العميل الاتصال (on_connection_close) تُلغى الإجابة
+    ويخرج الطلب فوراً فيُحرر مكانه في الـ semaphore، حتى لو كانت الإجابة لم ترسل أي حدث بعد.
+    """
+    def prepare(self):
+        self._task = None
+        self._events = asyncio.Queue()
+        self._connection_closed = False
+
+    def on_connection_close(self):
+        self._connection_closed = True
+        if self._task is not None:
+            self._task.cancel()
+        # يوقظ حلقة الانتظار حتى لو لم يصل أي حدث من الإجابة
+        self._events.put_nowait(("closed", None))
+
+    async def post(self):
+        question = self.read_question()
+        self.set_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+        events = self._events
+
+        def on_finished(task):
+            if task.cancelled():
+                return
+            error = task.exception()
+            events.put_nowait(("error", str(error)) if error else ("result", result_to_dict(task.result())))
+
+        # الـ semaphore يُحرر عند الخروج من async with مهما كان سبب الخروج (مرة واحدة فقط)
+        async with self.semaphore:
+            if self._connection_closed: # أُغلق الاتصال أثناء انتظار الدور
+                return
+            self._task = asyncio.ensure_future(self.engine.answer(question, lambda kind, value: events.put_nowait((kind, value))))
+            self._task.add_done_callback(on_finished)
+            try:
+                while True:
+                    kind, value = await events.get()
+                    if kind == "closed":
+                        return
+                    self.write(json.dumps({"event": kind, "data": value}, ensure_ascii=False) + "\n")
+                    await self.flush()
+                    if kind in ("result", "error"):
+                        break
+            except StreamClosedError:
+                self._task.cancel()
+                return
+        self.finish()
+
+
+class HealthHandler(BaseAnswerHandler):
+    def get(self):
+        self.write_json({"status": "ok", "embeddings_ready": self.engine.embeddings_ready()})
+
+
+class StatsHandler(BaseAnswerHandler):
+    def get(self):
+        self.write_json(self.engine.stats())
+
+
+def make_app(engine, concurrency=ANSWER_SERVICE_CONCURRENCY):
+    return tornado.web.Application(
+        [
+            (r"/answer", AnswerHandler),
+            (r"/answer/stream", AnswerStreamHandler),
+            (r"/health", HealthHandler),
+            (r"/stats", StatsHandler),
+        ],
+        engine=engine,
+        semaphore=asyncio.Semaphore(concurrency),
+    )
+
+async def serve(host, port, concurrency, threads, sockets=None):
+    # خيوط asyncio.to_thread (البحث في الـ FAQ، ذاكرة Serper) محدودة بـ threads لكل عملية
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+    engine = AnswerEngine()
+    server = tornado.httpserver.HTTPServer(make_app(engine, concurrency))
+    if sockets is not None:
+        server.add_sockets(sockets)
+    else:
+        server.listen(port, host)
+    print(f"خدمة الإجابة تعمل على http://{host}:{port} (التزامن: {concurrency}، الخيوط: {threads}).")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="خدمة HTTP للإجابة على أسئلة جامعة الشام (بدون واجهة).")
+    parser.add_argument("--host", default=ANSWER_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=ANSWER_SERVICE_PORT)
+    parser.add_argument("--concurrency", type=int, default=ANSWER_SERVICE_CONCURRENCY, help="أقصى عدد أسئلة متزامنة لكل عملية.")
+    parser.add_argument("--threads", type=int, default=ANSWER_SERVICE_THREADS, help="خيوط البحث في الـ FAQ لكل عملية.")
+    parser.add_argument("--processes", type=int, default=ANSWER_SERVICE_PROCESSES, help="عدد عمليات الخادم (0 = عملية لكل نواة).")
+    args = parser.parse_args()
+
+    sockets = None
+    if args.processes != 1:
+        # المقابس تُفتح قبل التفرع، وكل عملية ابنة تحمّل مواردها بعده (لا تُشارك الخيوط عبر fork)
+        sockets = tornado.netutil.bind_sockets(args.port, args.host)
+        tornado.process.fork_processes(args.processes)
+    asyncio.run(serve(args.host, args.port, args.concurrency, args.threads, sockets))
@@ -0,0 +1,29 @@
+import re
+
+# --- توحيد النص العربي قبل المقارنة أو البحث ---
+# التشكيل (الفتحة، الضمة، الكسرة، التنوين، الشدة، السكون، الألف الخنجرية) والتطويل
+TASHKEEL_PATTERN = re.compile(r"[\u064B-\u0652\u0670\u0640]")
+# كل ما ليس حرفاً أو رقماً أو مسافة (يشمل علامات الترقيم العربية مثل ، ؟ ؛)
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]|_")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+CHARACTER_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", # أشكال الألف والهمزة
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي", # الألف المقصورة
+    "ة": "ه", # التاء المربوطة
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+})
+
+def normalize_arabic(text):
+    """
+    توحيد أشكال الألف والهمزة والتاء المربوطة والألف المقصورة، وإزالة التشكيل وعلامات الترقيم.
+    """
+    if not text:
+        return ""
+    text = TASHKEEL_PATTERN.sub("", text)
+    text = text.translate(CHARACTER_MAP)
+    text = PUNCTUATION_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip().lower()
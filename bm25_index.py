@@ -0,0 +1,232 @@
+import os
+import json
+import math
+from collections import Counter
+
+import numpy as np
+
+from arabic_text import normalize_arabic
+from faq_lookup import get_faq_document
+
+# --- بحث لفظي (BM25) على أسئلة الـ FAQ، يُدمج مع البحث الدلالي عبر Reciprocal Rank Fusion ---
+BM25_INDEX_FILE_NAME = "bm25_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60 # الثابت المعتاد في RRF: يقلل أثر الفروق بين المراتب الأولى
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10")) # عدد المرشحين من كل طرف قبل الدمج
+# شروط التطابق اللفظي الواثق الذي يُجاب به دون الاعتماد على المسافة الدلالية:
+# نسبة وزن IDF لكلمات الاستعلام الموجودة في السؤال، وأقل عدد من الكلمات ذات المعنى المشتركة معه،
+# ونسبة درجة BM25 للنتيجة الأولى إلى الثانية (حتى لا يُختار أحد أسئلة متقاربة بلا تمييز)
+BM25_MIN_COVERAGE = float(os.getenv("BM25_MIN_COVERAGE", "0.8"))
+BM25_MIN_MATCHED_TERMS = int(os.getenv("BM25_MIN_MATCHED_TERMS", "2"))
+BM25_MIN_SCORE_MARGIN = float(os.getenv("BM25_MIN_SCORE_MARGIN", "1.2"))
+
+# كلمات وظيفية وأدوات استفهام (بعد التوحيد) وكلمات تتكرر في كل أسئلة الجامعة: لا تدخل الفهرس ولا الاستعلام
+ARABIC_STOPWORDS = frozenset((
+    "ما", "ماذا", "لماذا", "هل", "كيف", "متي", "اين", "كم", "اي", "من", "هو", "هي", "هم", "هذا", "هذه", "ذلك", "تلك",
+    "الذي", "التي", "الذين", "في", "الي", "علي", "عن", "مع", "او", "ثم", "ان", "لا", "كل", "بعد", "قبل", "عند", "هناك",
+    "يوجد", "توجد", "ماهو", "ماهي", "جامعه", "الجامعه", "الشام",
+))
+
+# تجذيع خفيف (light stemming): سوابق ولواحق شائعة فقط، على النص بعد التوحيد (ة ← ه، ى ← ي، أ ← ا)
+ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+ARABIC_SUFFIXES = ("هما", "كما", "ات", "ون", "ين", "ان", "يه", "ها", "هم", "ه", "ي")
+
+def light_stem(token):
+    if token.isdigit():
+        return token
+    if len(token) >= 4 and token.startswith("و"):
+        token = token[1:]
+    for prefix in ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            token = token[len(prefix):]
+            break
+    for suffix in ARABIC_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    return token
+
+def tokenize(text):
+    return [light_stem(token) for token in normalize_arabic(text).split() if token not in ARABIC_STOPWORDS]
+
+
+class BM25Index:
+    """
+    فهرس معكوس بسيط (Python فقط): لكل مصطلح قاموس من معرّف FAISS إلى عدد مرات الظهور.
+    معرّفات المستندات هي نفس معرّفات FAISS لتسهيل الدمج مع نتائج البحث الدلالي.
+    """
+    def __init__(self, postings, doc_lengths, k1=BM25_K1, b=BM25_B):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def from_texts(cls, texts, **kwargs):
+        postings = {}
+        doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            terms = tokenize(text)
+            doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, {})[doc_id] = frequency
+        return cls(postings, doc_lengths, **kwargs)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def _idf(self, term):
+        document_frequency = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query, k=HYBRID_CANDIDATES):
+        """
+        يعيد [(معرّف FAISS، درجة BM25)] مرتبة تنازلياً.
+        """
+        scores = {}
+        for term in set(tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = self._idf(term)
+            for doc_id, frequency in term_postings.items():
+                length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_doc_length or 1))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def matched_terms(self, query, doc_id):
+        # مصطلحات الاستعلام (بدون تكرار) الموجودة في المستند
+        return [term for term in set(tokenize(query)) if doc_id in self.postings.get(term, ())]
+
+    def coverage(self, query, doc_id):
+        """
+        نسبة وزن IDF لمصطلحات الاستعلام الموجودة في المستند إلى وزن كل مصطلحاته:
+        الكلمات النادرة تحدد التطابق، والكلمة الشائعة في معظم الأسئلة لا تكفي وحدها.
+        """
+        terms = set(tokenize(query))
+        total_weight = sum(self._idf(term) for term in terms)
+        if not total_weight:
+            return 0.0
+        return sum(self._idf(term) for term in self.matched_terms(query, doc_id)) / total_weight
+
+    def save(self, path):
+        # ملف مؤقت ثم استبدال، حتى لا تقرأ عملية تعيد التحميل ملفاً نصف مكتوب
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"postings": self.postings, "doc_lengths": self.doc_lengths}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # مفاتيح JSON نصية، نعيدها إلى أرقام (معرّفات FAISS)
+        postings = {term: {int(doc_id): frequency for doc_id, frequency in docs.items()} for term, docs in data["postings"].items()}
+        return cls(postings, data["doc_lengths"], **kwargs)
+
+
+def build_bm25_index(vector_db):
+    """
+    يبني الفهرس اللفظي من نصوص قاعدة بيانات الـ FAQ بترتيب معرّفات FAISS.
+    """
+    return BM25Index.from_texts(get_faq_document(vector_db, faiss_id).page_content for faiss_id in range(vector_db.index.ntotal))
+
+def write_bm25_index(vector_db, store_path):
+    bm25_index = build_bm25_index(vector_db)
+    bm25_index.save(os.path.join(store_path, BM25_INDEX_FILE_NAME))
+    return bm25_index
+
+def load_bm25_index(store_path, vector_db):
+    """
+    يحمّل الفهرس المحفوظ مع قاعدة البيانات، أو يبنيه في الذاكرة للمجلدات القديمة أو غير المتسقة.
+    """
+    index_path = os.path.join(store_path, BM25_INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        bm25_index = BM25Index.load(index_path)
+        if len(bm25_index) == vector_db.index.ntotal:
+            return bm25_index
+    return build_bm25_index(vector_db)
+
+def reciprocal_rank_fusion(*ranked_id_lists, k=RRF_K):
+    """
+    يدمج عدة قوائم مرتبة من المعرّفات: درجة كل معرّف = مجموع 1 / (k + الترتيب) عبر القوائم.
+    """
+    scores = {}
+    for ranked_ids in ranked_id_lists:
+        for rank, doc_id in enumerate(ranked_ids, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridFaqRetriever:
+    """
+    بحث هجين في الـ FAQ: BM25 على الأسئلة + بحث FAISS بالمتجه، مدموجان بـ RRF.
+    إذا لم يكن تضمين الاستعلام متاحاً (النموذج لم يُحمَّل بعد) يعمل البحث اللفظي وحده.
+    """
+    def __init__(self, faq_vector_db, bm25_index, candidates=HYBRID_CANDIDATES, min_coverage=BM25_MIN_COVERAGE,
+                 min_matched_terms=BM25_MIN_MATCHED_TERMS, min_score_margin=BM25_MIN_SCORE_MARGIN, rrf_k=RRF_K):
+        self.faq_vector_db = faq_vector_db
+        self.bm25_index = bm25_index
+        self.candidates = candidates
+        self.min_coverage = min_coverage
+        self.min_matched_terms = min_matched_terms
+        self.min_score_margin = min_score_margin
+        self.rrf_k = rrf_k
+
+    def vector_search_batch(self, query_embeddings):
+        """
+        بحث FAISS لعدة استعلامات في استدعاء واحد، يعيد لكل استعلام [(معرّف FAISS، المسافة)].
+        """
+        if self.faq_vector_db.index.ntotal == 0:
+            return [[] for _ in query_embeddings]
+        distances, ids = self.faq_vector_db.index.search(np.asarray(query_embeddings, dtype=np.float32), self.candidates)
+        return [
+            [(int(faiss_id), float(distance)) for faiss_id, distance in zip(row_ids, row_distances) if faiss_id != -1]
+            for row_ids, row_distances in zip(ids, distances)
+        ]
+
+    def vector_search(self, query_embedding):
+        return self.vector_search_batch([query_embedding])[0]
+
+    def search(self, user_question, query_embedding=None):
+        """
+        يعيد (المستند، المسافة الدلالية أو inf إن لم يظهر في نتائج المتجه، هل التطابق اللفظي واثق).
+        """
+        vector_results = self.vector_search(query_embedding) if query_embedding is not None else []
+        return self._fuse(user_question, vector_results)
+
+    def search_batch(self, user_questions, query_embeddings):
+        # تضمينات جاهزة لعدة أسئلة: بحث FAISS واحد ثم دمج كل سؤال مع نتائج BM25 الخاصة به
+        return [
+            self._fuse(user_question, vector_results)
+            for user_question, vector_results in zip(user_questions, self.vector_search_batch(query_embeddings))
+        ]
+
+    def _fuse(self, user_question, vector_results):
+        lexical_results = self.bm25_index.search(user_question, self.candidates)
+        fused = reciprocal_rank_fusion(
+            [faiss_id for faiss_id, _ in vector_results], [faiss_id for faiss_id, _ in lexical_results], k=self.rrf_k
+        )
+        if not fused:
+            return None, float("inf"), False
+
+        best_id = fused[0][0]
+        distance = dict(vector_results).get(best_id, float("inf"))
+        lexical_match = self.is_confident_lexical_match(user_question, best_id, lexical_results)
+        return get_faq_document(self.faq_vector_db, best_id), distance, lexical_match
+
+    def is_confident_lexical_match(self, user_question, best_id, lexical_results):
+        """
+        التطابق اللفظي يتجاوز عتبة المسافة فقط إذا كان المستند الأول في BM25 وفي الدمج معاً،
+        ويشترك مع الاستعلام في عدد كافٍ من الكلمات ذات المعنى تغطي معظم وزن IDF،
+        ودرجته أعلى بوضوح من المستند التالي.
+        """
+        if not lexical_results or lexical_results[0][0] != best_id:
+            return False
+        if len(self.bm25_index.matched_terms(user_question, best_id)) < self.min_matched_terms:
+            return False
+        if self.bm25_index.coverage(user_question, best_id) < self.min_coverage:
+            return False
+        return len(lexical_results) == 1 or lexical_results[0][1] >= self.min_score_margin * lexical_results[1][1]
@@ -1,96 +1,323 @@
 import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from tqdm import tqdm # استيراد tqdm
 
+from compact_store import has_compact_store, save_vector_db, temp_path_for, write_compact_store
+from bm25_index import BM25_INDEX_FILE_NAME, write_bm25_index
+from embedding_backends import (
+    EMBEDDINGS_BACKEND, EMBEDDINGS_BACKENDS, ONNX_AGREEMENT_THRESHOLD, check_top1_agreement, embeddings_backend_name,
+    get_embeddings,
+)
+from faiss_index_types import (
+    INDEX_TYPES, DEFAULT_NPROBE, DEFAULT_EF_SEARCH, build_faiss_index, evaluate_index, index_supports_removal,
+    print_index_report, save_index_params, search_parameters,
+)
+
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# --- الإعدادات الافتراضية لبناء قاعدة البيانات ---
+FAQ_FILE_PATH = "university_faq_qa.txt"
+VECTOR_DB_PATH_QA = "faiss_university_qa_db"
+# MODEL_NAME = "sentence-transformers/distiluse-base-multilingual-cased-v1"
+MODEL_NAME = "asafaya/bert-base-arabic" # نموذج عربي مناسب
+CHUNK_SIZE = 100
+CHUNK_OVERLAP = 10
+EMBED_BATCH_SIZE = 64 # عدد الأجزاء التي تُرسل للنموذج في كل تمريرة
+MANIFEST_FILE_NAME = "manifest.json" # يُحفظ داخل مجلد قاعدة البيانات ويسجل بصمة كل زوج سؤال-جواب
+
+def qa_pair_hash(question, answer):
+    return hashlib.sha256(f"{question}\n{answer}".encode("utf-8")).hexdigest()
+
+
 # 1. تحميل أزواج الأسئلة والأجوبة من ملف الـ FAQ
-faq_file_path = "university_faq_qa.txt" 
-qa_documents = []
-try:
-    with open(faq_file_path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-        entries = content.split("---")
-        for entry in entries:
-            entry = entry.strip()
-            if entry:
-                lines = entry.split('\n')
-                if len(lines) >= 2:
-                    question = lines[0].strip().replace("س:", "").strip()
-                    answer = lines[1].strip().replace("ج:", "").strip()
-                    if question and answer:
-                        qa_documents.append(Document(page_content=question, metadata={"answer": answer, "type": "qa_pair"}))
-    print(f"تم قراءة {len(qa_documents)} زوج سؤال-جواب من الملف '{faq_file_path}'.")
-except FileNotFoundError:
-    print(f"خطأ: ملف '{faq_file_path}' غير موجود. يرجى إنشاءه أولاً (عبر faq_generator.py والمراجعة).")
+def load_qa_documents(faq_file_path=FAQ_FILE_PATH):
     qa_documents = []
+    try:
+        with open(faq_file_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+            entries = content.split("---")
+            for entry in entries:
+                entry = entry.strip()
+                if entry:
+                    lines = entry.split('\n')
+                    if len(lines) >= 2:
+                        question = lines[0].strip().replace("س:", "").strip()
+                        answer = lines[1].strip().replace("ج:", "").strip()
+                        if question and answer:
+                            metadata = {"answer": answer, "type": "qa_pair", "content_hash": qa_pair_hash(question, answer)}
+                            qa_documents.append(Document(page_content=question, metadata=metadata))
+        print(f"تم قراءة {len(qa_documents)} زوج سؤال-جواب من الملف '{faq_file_path}'.")
+    except FileNotFoundError:
+        print(f"خطأ: ملف '{faq_file_path}' غير موجود. يرجى إنشاءه أولاً (عبر faq_generator.py والمراجعة).")
+    return qa_documents
 
-if not qa_documents:
-    print("لا توجد بيانات أسئلة وأجوبة لمعالجتها. يرجى التأكد من أن ملف الـ FAQ غير فارغ.")
-    exit()
 
 # 2. تقسيم النصوص إلى أجزاء (Chunks)
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=100,
-    chunk_overlap=10,
-    length_function=len,
-)
+def split_into_chunks(qa_documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    return text_splitter.split_documents(qa_documents)
+
+
+# 3. إنشاء تضمينات (Embeddings) على دفعات
+def load_embeddings(model_name=MODEL_NAME, batch_size=EMBED_BATCH_SIZE, backend=EMBEDDINGS_BACKEND, num_threads=0):
+    return get_embeddings(model_name, backend, batch_size, num_threads)
+
+def embed_in_batches(embeddings, texts, batch_size=EMBED_BATCH_SIZE, pbar=None):
+    """
+    تضمين النصوص على دفعات بحجم batch_size بدلاً من تمريرة مستقلة لكل جزء.
+    """
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        vectors.extend(embeddings.embed_documents(batch))
+        if pbar is not None:
+            pbar.update(len(batch))
+    return vectors
+
+# نموذج التضمين الخاص بكل عملية في مجمع العمليات (يُحمّل مرة واحدة لكل عملية)
+_worker_embeddings = None
+
+def _init_embedding_worker(model_name, batch_size, threads_per_worker, backend="torch"):
+    global _worker_embeddings
+    if backend == "torch":
+        try:
+            import torch
+            torch.set_num_threads(threads_per_worker) # تجنب تزاحم الخيوط بين العمليات
+        except ImportError:
+            pass
+    _worker_embeddings = load_embeddings(model_name, batch_size, backend, num_threads=threads_per_worker)
+
+def _embed_shard(shard_index, texts, batch_size):
+    return shard_index, embed_in_batches(_worker_embeddings, texts, batch_size)
+
+def embed_in_shards(texts, model_name=MODEL_NAME, batch_size=EMBED_BATCH_SIZE, num_workers=2, num_shards=None, pbar=None,
+                    backend="torch"):
+    """
+    تقسيم النصوص إلى أجزاء (shards) وتضمينها بالتوازي في مجمع عمليات، ثم دمج النتائج بنفس الترتيب الأصلي.
+    """
+    num_shards = num_shards or num_workers * 4
+    shard_size = max(1, -(-len(texts) // num_shards))
+    shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+    threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+    shard_vectors = [None] * len(shards)
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=_init_embedding_worker,
+        initargs=(model_name, batch_size, threads_per_worker, backend),
+    ) as executor:
+        futures = [executor.submit(_embed_shard, i, shard, batch_size) for i, shard in enumerate(shards)]
+        for future in as_completed(futures):
+            shard_index, vectors = future.result()
+            shard_vectors[shard_index] = vectors
+            if pbar is not None:
+                pbar.update(len(shards[shard_index]))
+
+    return [vector for vectors in shard_vectors for vector in vectors]
+
+
+# 4. بناء قاعدة بيانات المتجهات (Vector Database) باستخدام FAISS في عملية إضافة واحدة
+def assign_chunk_ids(chunks):
+    """
+    معرّف ثابت لكل جزء مشتق من بصمة زوج السؤال-الجواب، ليسهل حذف أجزاء الزوج لاحقاً.
+    """
+    ids = []
+    ids_by_hash = {}
+    for chunk in chunks:
+        content_hash = chunk.metadata["content_hash"]
+        pair_ids = ids_by_hash.setdefault(content_hash, [])
+        chunk_id = f"{content_hash}-{len(pair_ids)}"
+        pair_ids.append(chunk_id)
+        ids.append(chunk_id)
+    return ids, ids_by_hash
+
+def embed_chunks(chunks, embeddings, model_name=MODEL_NAME, batch_size=EMBED_BATCH_SIZE, num_workers=0, num_shards=None):
+    texts = [chunk.page_content for chunk in chunks]
+    with tqdm(total=len(texts), unit="chunk", desc="إنشاء التضمينات") as pbar:
+        if num_workers and num_workers > 1:
+            vectors = embed_in_shards(
+                texts, model_name, batch_size, num_workers, num_shards, pbar, embeddings_backend_name(embeddings)
+            )
+        else:
+            vectors = embed_in_batches(embeddings, texts, batch_size, pbar)
+    return list(zip(texts, vectors))
+
+def build_faq_vector_db(chunks, embeddings, model_name=MODEL_NAME, batch_size=EMBED_BATCH_SIZE, num_workers=0, num_shards=None):
+    ids, _ = assign_chunk_ids(chunks)
+    text_embeddings = embed_chunks(chunks, embeddings, model_name, batch_size, num_workers, num_shards)
+    metadatas = [chunk.metadata for chunk in chunks]
+    return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+
+
+# 5. التحديث التزايدي: إعادة تضمين الأزواج الجديدة أو المعدلة فقط
+def build_settings(model_name=MODEL_NAME, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, index_type="flat",
+                   embeddings_backend="torch"):
+    """
+    الإعدادات التي يتطلب تغيّرها إعادة بناء كاملة للفهرس.
+    """
+    return {
+        "model_name": model_name, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "index_type": index_type,
+        "embeddings_backend": embeddings_backend,
+    }
+
+def load_manifest(vector_db_path):
+    manifest_path = os.path.join(vector_db_path, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+def save_manifest(vector_db_path, settings, ids_by_hash):
+    manifest_path = os.path.join(vector_db_path, MANIFEST_FILE_NAME)
+    with open(temp_path_for(manifest_path), "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "entries": ids_by_hash}, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path_for(manifest_path), manifest_path)
+
+def sync_faq_vector_db(qa_documents, embeddings, vector_db_path=VECTOR_DB_PATH_QA, settings=None, batch_size=EMBED_BATCH_SIZE,
+                       num_workers=0, num_shards=None, full_rebuild=False, search_params=None, evaluate=True):
+    """
+    يحدّث قاعدة البيانات المحفوظة بحسب الفرق بين ملف الـ FAQ والبيان (manifest) المحفوظ:
+    يضمّن الأزواج الجديدة أو المعدلة فقط ويحذف الأزواج المحذوفة (FAISS.delete يستدعي remove_ids داخلياً).
+    تتم إعادة البناء الكاملة فقط عند تغيّر النموذج أو إعدادات التقسيم أو نوع الفهرس أو عند طلبها صراحةً.
+    يعيد (vector_db, عدد الأزواج المضافة، عدد الأزواج المحذوفة، تقرير الفهرس أو None عند التحديث التزايدي).
+    evaluate=False يتخطى تقرير الدقة والزمن (evaluate_index) عند البناء الكامل، فيعود التقرير None.
+    """
+    settings = settings or build_settings()
+    model_name = settings["model_name"]
+    index_type = settings.get("index_type", "flat")
+    search_params = search_params if search_params is not None else search_parameters(index_type)
+
+    # إزالة الأزواج المكررة حرفياً في الملف مع الحفاظ على الترتيب
+    documents_by_hash = {}
+    for document in qa_documents:
+        documents_by_hash.setdefault(document.metadata["content_hash"], document)
+
+    manifest = load_manifest(vector_db_path)
+    vector_db = None
+    if not full_rebuild and manifest and manifest.get("settings") == settings:
+        if not index_supports_removal(index_type) and any(h not in documents_by_hash for h in manifest["entries"]):
+            print(f"⚠️ الفهرس من نوع '{index_type}' لا يدعم الحذف، ستتم إعادة البناء بالكامل.")
+        else:
+            try:
+                vector_db = FAISS.load_local(vector_db_path, embeddings, allow_dangerous_deserialization=True)
+            except Exception as e:
+                print(f"⚠️ تعذر تحميل قاعدة البيانات الحالية ({e}). ستتم إعادة البناء بالكامل.")
+
+    if vector_db is None:
+        print("إعادة بناء كاملة لقاعدة بيانات المتجهات...")
+        chunks = split_into_chunks(list(documents_by_hash.values()), settings["chunk_size"], settings["chunk_overlap"])
+        print(f"تم تقسيم النصوص إلى {len(chunks)} جزءًا (chunk).")
+        if not chunks:
+            return None, 0, 0, None
+        vector_db = build_faq_vector_db(chunks, embeddings, model_name, batch_size, num_workers, num_shards)
+        # المتجهات الدقيقة من الفهرس المسطح، يُدرَّب عليها الفهرس المطلوب ثم يُقارن بها
+        vectors = vector_db.index.reconstruct_n(0, vector_db.index.ntotal)
+        if index_type != "flat":
+            vector_db.index = build_faiss_index(vectors, index_type, search_params)
+        report = evaluate_index(vector_db.index, vectors) if evaluate else None
+        _, ids_by_hash = assign_chunk_ids(chunks)
+        save_vector_db(vector_db, vector_db_path)
+        save_manifest(vector_db_path, settings, ids_by_hash)
+        save_index_params(vector_db_path, index_type, search_params)
+        return vector_db, len(ids_by_hash), 0, report
+
+    ids_by_hash = manifest["entries"]
+    removed_hashes = [h for h in ids_by_hash if h not in documents_by_hash]
+    added_documents = [doc for h, doc in documents_by_hash.items() if h not in ids_by_hash]
+
+    if removed_hashes:
+        ids_to_remove = [chunk_id for h in removed_hashes for chunk_id in ids_by_hash[h]]
+        vector_db.delete(ids_to_remove)
+        for h in removed_hashes:
+            del ids_by_hash[h]
+
+    if added_documents:
+        chunks = split_into_chunks(added_documents, settings["chunk_size"], settings["chunk_overlap"])
+        ids, added_ids_by_hash = assign_chunk_ids(chunks)
+        text_embeddings = embed_chunks(chunks, embeddings, model_name, batch_size, num_workers, num_shards)
+        vector_db.add_embeddings(text_embeddings, metadatas=[chunk.metadata for chunk in chunks], ids=ids)
+        ids_by_hash.update(added_ids_by_hash)
+
+    if removed_hashes or added_documents:
+        save_vector_db(vector_db, vector_db_path)
+        save_manifest(vector_db_path, settings, ids_by_hash)
+        save_index_params(vector_db_path, index_type, search_params)
+    return vector_db, len(added_documents), len(removed_hashes), None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="بناء قاعدة بيانات المتجهات للأسئلة والأجوبة (FAQ).")
+    parser.add_argument("--faq-file", default=FAQ_FILE_PATH, help="ملف الأسئلة والأجوبة المصدر.")
+    parser.add_argument("--output", default=VECTOR_DB_PATH_QA, help="مجلد حفظ قاعدة البيانات.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="عدد الأجزاء في كل دفعة تضمين.")
+    parser.add_argument("--workers", type=int, default=0, help="عدد العمليات المتوازية للتضمين (0 = عملية واحدة).")
+    parser.add_argument("--shards", type=int, default=None, help="عدد الأجزاء (shards) عند التضمين المتوازي (افتراضياً 4 لكل عملية).")
+    parser.add_argument("--full", action="store_true", help="إعادة بناء كاملة وتجاهل البيان (manifest) المحفوظ.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="نوع فهرس FAISS (تغييره يعيد البناء بالكامل).")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="عدد العناقيد التي يُبحث فيها لفهارس IVF.")
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH, help="عمق البحث لفهرس HNSW.")
+    parser.add_argument("--embeddings-backend", choices=EMBEDDINGS_BACKENDS, default=EMBEDDINGS_BACKEND,
+                        help="واجهة نموذج التضمين: torch أو onnx (int8). يجب أن تطابق واجهة التطبيق.")
+    parser.add_argument("--check-agreement", action="store_true",
+                        help=f"مع onnx: إيقاف البناء إذا قل تطابق top-1 مع PyTorch عن {ONNX_AGREEMENT_THRESHOLD}.")
+    args = parser.parse_args()
+
+    qa_documents = load_qa_documents(args.faq_file)
+    if not qa_documents:
+        print("لا توجد بيانات أسئلة وأجوبة لمعالجتها. يرجى التأكد من أن ملف الـ FAQ غير فارغ.")
+        exit()
+
+    if args.embeddings_backend == "onnx" and args.check_agreement:
+        _, passed = check_top1_agreement(MODEL_NAME, [doc.page_content for doc in qa_documents])
+        if not passed:
+            print("⚠️ النموذج المكمّم أقل من الحد المطلوب، أعد البناء باستخدام --embeddings-backend torch.")
+            exit(1)
+
+    print(f"جاري إنشاء تضمينات (embeddings) للنصوص باستخدام نموذج Hugging Face (واجهة {args.embeddings_backend}).")
+    embeddings = load_embeddings(MODEL_NAME, args.batch_size, args.embeddings_backend)
+
+    try:
+        print("بدء بناء قاعدة بيانات المتجهات (FAISS). قد يستغرق هذا بعض الوقت...")
+        vector_db, added_count, removed_count, index_report = sync_faq_vector_db(
+            qa_documents, embeddings, args.output, build_settings(MODEL_NAME, index_type=args.index_type, embeddings_backend=args.embeddings_backend),
+            args.batch_size, args.workers, args.shards, full_rebuild=args.full,
+            search_params=search_parameters(args.index_type, args.nprobe, args.ef_search),
+        )
+
+        if vector_db:
+            print(f"\nتمت إضافة/تحديث {added_count} زوج وحذف {removed_count} زوج.")
+            store_complete = has_compact_store(args.output) and os.path.exists(os.path.join(args.output, BM25_INDEX_FILE_NAME))
+            if added_count or removed_count or not store_complete:
+                # الفهرس اللفظي (BM25) بنفس معرّفات FAISS للبحث الهجين، قبل الصيغة المضغوطة
+                # لأن compact_info.json (آخر ما يُكتب) هو ما يدفع التطبيق لإعادة التحميل
+                write_bm25_index(vector_db, args.output)
+                # الصيغة المضغوطة التي يقرأها التطبيق عبر memory map (بدون pickle)
+                write_compact_store(vector_db, args.output, MODEL_NAME)
+            else:
+                # لا تغيير: نفس نسخة compact_info.json، فلا يعيد التطبيق تحميل فهرس مطابق
+                print("لا تغييرات في الأسئلة والأجوبة، الملفات المحفوظة كما هي.")
+            if index_report:
+                print_index_report(args.index_type, index_report)
+            print(f"قاعدة بيانات المتجهات محفوظة محلياً في: {args.output}")
+
+            print("\nأصبحت قاعدة بيانات المتجهات للأسئلة والأجوبة جاهزة للاستعلامات!")
+        else:
+            print("لم يتم بناء قاعدة بيانات المتجهات بسبب عدم وجود أجزاء نصية.")
 
-chunks = text_splitter.split_documents(qa_documents)
-
-print(f"تم تقسيم النصوص إلى {len(chunks)} جزءًا (chunk).")
-
-# 3. إنشاء تضمينات (Embeddings) باستخدام Hugging Face Model
-print("جاري إنشاء تضمينات (embeddings) للنصوص باستخدام نموذج Hugging Face.")
-# model_name = "sentence-transformers/distiluse-base-multilingual-cased-v1"
-model_name = "asafaya/bert-base-arabic" # نموذج عربي مناسب
-embeddings = HuggingFaceEmbeddings(model_name=model_name)
-
-# 4. بناء قاعدة بيانات المتجهات (Vector Database) باستخدام FAISS
-try:
-    # سيتم إنشاء التضمينات لـ chunks هنا
-    # نضيف شريط تقدم لعملية بناء قاعدة البيانات
-    print("بدء بناء قاعدة بيانات المتجهات (FAISS). قد يستغرق هذا بعض الوقت...")
-    
-    # يجب أن تكون chunks قائمة من Document objects.
-    # FAISS.from_documents() تقوم بتوليد التضمينات لكل مستند.
-    # يمكننا لف هذه العملية بـ tqdm.
-    # نظرًا لأن FAISS.from_documents تقوم بالعملية داخليًا، فإننا نستخدم tqdm لتتبع التقدم
-    # أثناء إرسال المستندات لإنشاء التضمينات.
-
-    # طريقة لتقدير التقدم: نكرر على الـ chunks ونضيفها تدريجياً لـ FAISS
-    # بدلاً من FAISS.from_documents() المباشرة التي لا توفر Hook للتقدم.
-    # أو يمكننا بناءها من المستند الأول ثم إضافة البقية.
-
-    if not chunks:
-        print("لا توجد أجزاء لإنشاء قاعدة البيانات منها.")
-        vector_db = None
-    else:
-        # إنشاء قاعدة البيانات من الجزء الأول
-        vector_db = FAISS.from_documents([chunks[0]], embeddings)
-        
-        # إضافة الأجزاء المتبقية مع شريط تقدم
-        if len(chunks) > 1:
-            # استخدام tqdm حول باقي الأجزاء
-            for i in tqdm(range(1, len(chunks)), unit="chunk", desc="إضافة تضمينات إلى DB"):
-                vector_db.add_documents([chunks[i]])
-
-    if vector_db:
-        print("\nتم بناء قاعدة بيانات المتجهات بنجاح!")
-
-        # 5. حفظ قاعدة بيانات المتجهات
-        vector_db_path_qa = "faiss_university_qa_db" 
-        vector_db.save_local(vector_db_path_qa)
-        print(f"تم حفظ قاعدة بيانات المتجهات محلياً في: {vector_db_path_qa}")
-
-        print("\nأصبحت قاعدة بيانات المتجهات للأسئلة والأجوبة جاهزة للاستعلامات!")
-    else:
-        print("لم يتم بناء قاعدة بيانات المتجهات بسبب عدم وجود أجزاء نصية.")
-
-except Exception as e:
-    print(f"حدث خطأ أثناء بناء قاعدة بيانات المتجهات: {e}")
-    print("الرجاء التأكد من أن نموذج التضمين يمكن تحميله ويعمل بشكل صحيح.")
\ No newline at end of file
+    except Exception as e:
+        print(f"حدث خطأ أثناء بناء قاعدة بيانات المتجهات: {e}")
+        print("الرجاء التأكد من أن نموذج التضمين يمكن تحميله ويعمل بشكل صحيح.")
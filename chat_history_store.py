@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# --- مخزن سجل المحادثات: SQLite بوضع WAL، إضافة فقط (بدون إعادة كتابة الملف كاملاً مع كل رسالة) ---
+CHAT_HISTORY_DB = os.getenv("CHAT_HISTORY_DB", "chat_history.db")
+# عند تجاوز هذا العدد تُنقل أقدم الرسائل إلى ملف أرشيف منفصل
+CHAT_HISTORY_MAX_ROWS = int(os.getenv("CHAT_HISTORY_MAX_ROWS", "100000"))
+COMPACT_EVERY_APPENDS = 500
+LEGACY_SESSION_ID = "legacy" # رسائل chat_history.json القديمة لا تحمل معرّف جلسة
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session_time ON messages (session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_time ON messages (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _row_to_message(row):
+    return {"id": row[0], "session_id": row[1], "role": row[2], "content": row[3], "timestamp": row[4]}
+
+class ChatHistoryStore:
+    """
+    سجل محادثات قائم على SQLite: إضافة بتكلفة ثابتة، واستعلامات مفهرسة حسب الجلسة والوقت،
+    وأرشفة دورية لأقدم الرسائل. آمن للاستخدام من عدة جلسات (خيوط) وعدة عمليات.
+    """
+    def __init__(self, db_path=CHAT_HISTORY_DB, max_rows=CHAT_HISTORY_MAX_ROWS):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self._appends_since_compact = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    # --- الكتابة ---
+    def append(self, session_id, role, content, timestamp=None):
+        self.append_many([(session_id, role, content, timestamp)])
+
+    def append_many(self, messages):
+        """
+        messages: قائمة من (session_id, role, content, timestamp) تُضاف في معاملة واحدة.
+        """
+        rows = [(session_id, role, content, timestamp or time.time()) for session_id, role, content, timestamp in messages]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)", rows
+            )
+        self._appends_since_compact += len(rows)
+        if self._appends_since_compact >= COMPACT_EVERY_APPENDS:
+            self.compact()
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM messages")
+
+    # --- القراءة ---
+    def recent(self, limit=None, session_id=None, before_id=None, before_timestamp=None):
+        """
+        أحدث الرسائل (مرتبة من الأقدم إلى الأحدث)، اختيارياً لجلسة محددة أو قبل معرّف رسالة أو وقت معين.
+        الرسائل بنفس الوقت (رسائل مرحّلة، أو سؤال وإجابة من append_many) تُرتب بمعرّفها، أي بترتيب إضافتها.
+        """
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        if before_timestamp is not None:
+            conditions.append("timestamp < ?")
+            params.append(before_timestamp)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT id, session_id, role, content, timestamp FROM messages {where} ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [_row_to_message(row) for row in reversed(rows)]
+
+    def between(self, start_timestamp, end_timestamp, session_id=None):
+        query = "SELECT id, session_id, role, content, timestamp FROM messages WHERE timestamp BETWEEN ? AND ?"
+        params = [start_timestamp, end_timestamp]
+        if session_id is not None:
+            query += " AND session_id = ?"
+            params.append(session_id)
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY timestamp, id", params).fetchall()
+        return [_row_to_message(row) for row in rows]
+
+    def count(self, session_id=None):
+        with self._lock:
+            if session_id is None:
+                return self._connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            return self._connection.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    # --- الصيانة ---
+    def compact(self):
+        """
+        ينقل الرسائل الزائدة عن max_rows إلى ملف أرشيف شهري (chat_history-YYYYMM.db) ثم يقلّص ملف WAL.
+        """
+        self._appends_since_compact = 0
+        with self._lock:
+            total = self._connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            overflow = total - self.max_rows
+            if overflow > 0:
+                cutoff_id = self._connection.execute(
+                    "SELECT id FROM messages ORDER BY id LIMIT 1 OFFSET ?", (overflow - 1,)
+                ).fetchone()[0]
+                archive_path = f"{os.path.splitext(self.db_path)[0]}-{time.strftime('%Y%m')}.db"
+                self._connection.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+                try:
+                    with self._connection:
+                        self._connection.execute(
+                            "CREATE TABLE IF NOT EXISTS archive.messages AS SELECT * FROM main.messages WHERE 0"
+                        )
+                        self._connection.execute("INSERT INTO archive.messages SELECT * FROM main.messages WHERE id <= ?", (cutoff_id,))
+                        self._connection.execute("DELETE FROM main.messages WHERE id <= ?", (cutoff_id,))
+                finally:
+                    self._connection.execute("DETACH DATABASE archive")
+            self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def migrate_from_json(self, json_path):
+        """
+        ترحيل لمرة واحدة من chat_history.json القديم (يُسجَّل في جدول meta حتى لا يتكرر).
+        """
+        with self._lock:
+            migrated = self._connection.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if migrated or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                legacy_history = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            legacy_history = []
+        rows = [
+            (LEGACY_SESSION_ID, msg["role"], msg["content"], msg.get("timestamp") or time.time())
+            for msg in legacy_history
+            if isinstance(msg, dict) and "role" in msg and "content" in msg
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)", rows
+            )
+            self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(time.time()),))
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,45 +1,169 @@
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_core.runnables import RunnablePassthrough
+import sys
+import json
+import time
+import argparse
+from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 
+from faq_lookup import build_exact_match_index, lookup_exact_match
+from compact_store import load_faq_store
+from bm25_index import HybridFaqRetriever, load_bm25_index
+from embedding_backends import get_embeddings
+from answer_pipeline import FAQ_DISTANCE_THRESHOLD
+
+BATCH_SIZE = 256 # عدد الأسئلة التي تُضمَّن ويُبحث عنها معاً في وضع الدفعات
+
+parser = argparse.ArgumentParser(description="شات بوت جامعة الشام (الأسئلة الشائعة) من سطر الأوامر.")
+parser.add_argument("--batch", nargs="?", const="-", default=None,
+                    help="وضع الدفعات: ملف أسئلة (سطر لكل سؤال أو JSONL بحقل question)، أو '-' للقراءة من stdin.")
+parser.add_argument("--output", default="-", help="ملف JSONL للنتائج في وضع الدفعات ('-' = stdout).")
+parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="عدد الأسئلة في كل دفعة تضمين وبحث.")
+args = parser.parse_args()
+# في وضع الدفعات قد تكون النتائج على stdout، لذا تُكتب رسائل الحالة على stderr
+status_stream = sys.stderr if args.batch else sys.stdout
+
 # 1. تحميل قاعدة بيانات المتجهات المحفوظة (الجديدة للـ FAQ)
 vector_db_path = "faiss_university_qa_db" # المسار الجديد لقاعدة بيانات الـ QA
 try:
     # model_name = "sentence-transformers/distiluse-base-multilingual-cased-v1"
     model_name = "asafaya/bert-base-arabic"
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    # الواجهة تُحدد عبر EMBEDDINGS_BACKEND (torch أو onnx) ويجب أن تطابق واجهة build_vector_db.py
+    embeddings = get_embeddings(model_name)
 
-    vector_db = FAISS.load_local(vector_db_path, embeddings, allow_dangerous_deserialization=True)
-    # سنسترجع مستنداً واحداً فقط (أفضل سؤال مطابق)
-    retriever = vector_db.as_retriever(search_kwargs={"k": 1}) 
-    print(f"تم تحميل قاعدة بيانات المتجهات من: {vector_db_path}")
+    # الصيغة المضغوطة (memory map بدون pickle)، مع الرجوع إلى index.pkl للمجلدات القديمة
+    vector_db = load_faq_store(vector_db_path, embeddings)
+    # فهرس التطابق الحرفي للأسئلة المنسوخة كما هي من الـ FAQ
+    exact_match_index = build_exact_match_index(vector_db)
+    # بحث هجين: BM25 على الأسئلة + البحث الدلالي، مدموجان بـ RRF
+    faq_retriever = HybridFaqRetriever(vector_db, load_bm25_index(vector_db_path, vector_db))
+    print(f"تم تحميل قاعدة بيانات المتجهات من: {vector_db_path}", file=status_stream)
 
 except Exception as e:
-    print(f"خطأ: لم يتمكن من تحميل قاعدة بيانات المتجهات. يرجى التأكد من أن المسار صحيح وأن الملفات موجودة. {e}")
-    print("قد تحتاج إلى إعادة تشغيل 'build_vector_db.py' مع ملف الـ FAQ الجديد.")
+    print(f"خطأ: لم يتمكن من تحميل قاعدة بيانات المتجهات. يرجى التأكد من أن المسار صحيح وأن الملفات موجودة. {e}", file=status_stream)
+    print("قد تحتاج إلى إعادة تشغيل 'build_vector_db.py' مع ملف الـ FAQ الجديد.", file=status_stream)
     exit()
 
 # 2. بناء سلسلة الشات بوت القائمة على الأسئلة والأجوبة (Retrieval only)
+NO_ANSWER_MESSAGE = "عذراً، لم أجد إجابة محددة لهذا السؤال في المعلومات المتوفرة."
+
 def get_answer_from_retrieved_docs(docs):
     if not docs:
-        return "عذراً، لم أجد إجابة محددة لهذا السؤال في المعلومات المتوفرة."
+        return NO_ANSWER_MESSAGE
 
     first_doc = docs[0]
     if "answer" in first_doc.metadata and first_doc.metadata["answer"]:
         return first_doc.metadata["answer"]
     else:
-        return "عذراً، لم أجد إجابة محددة لهذا السؤال في المعلومات المتوفرة."
+        return NO_ANSWER_MESSAGE
 
-qa_retrieval_chain = (
-    retriever 
-    | get_answer_from_retrieved_docs
-)
+def answer_question(user_question):
+    # التطابق الحرفي أولاً، ثم البحث الدلالي عند عدم وجوده
+    exact_match = lookup_exact_match(exact_match_index, user_question)
+    if exact_match:
+        return exact_match.answer
+    # سنسترجع مستنداً واحداً فقط (أفضل سؤال مطابق بعد الدمج)
+    best_doc, _, _ = faq_retriever.search(user_question, embeddings.embed_query(user_question))
+    return get_answer_from_retrieved_docs([best_doc] if best_doc else [])
 
-print("تم بناء سلسلة الشات بوت القائمة على الأسئلة والأجوبة (FAQ).")
+qa_retrieval_chain = RunnableLambda(answer_question)
+
+print("تم بناء سلسلة الشات بوت القائمة على الأسئلة والأجوبة (FAQ).", file=status_stream)
+
+
+# 3. وضع الدفعات: تضمين الأسئلة على دفعات كبيرة وبحث FAISS واحد لكل دفعة
+def read_questions(source):
+    """
+    يعيد الأسئلة واحداً تلو الآخر (دون تحميل الملف كاملاً): سطر نصي لكل سؤال، أو JSONL بحقل question.
+    """
+    if source == "-":
+        sys.stdin.reconfigure(encoding="utf-8")
+        lines = sys.stdin
+    else:
+        lines = open(source, "r", encoding="utf-8")
+    with lines:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    line = str(json.loads(line).get("question", "")).strip()
+                except json.JSONDecodeError:
+                    pass
+            if line:
+                yield line
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def answer_batch(questions):
+    """
+    سجل لكل سؤال: السؤال، الإجابة، سؤال الـ FAQ المطابق، المسافة، والمصدر
+    (exact_match / faq ضمن العتبة أو تطابق لفظي واثق / faq_low_confidence / none).
+    """
+    records = [None] * len(questions)
+    pending = []
+    for i, question in enumerate(questions):
+        exact_match = lookup_exact_match(exact_match_index, question)
+        if exact_match:
+            records[i] = {
+                "question": question, "answer": exact_match.answer, "matched_question": exact_match.question,
+                "distance": 0.0, "source": "exact_match",
+            }
+        else:
+            pending.append(i)
+
+    if pending:
+        pending_questions = [questions[i] for i in pending]
+        query_embeddings = embeddings.embed_documents(pending_questions)
+        for i, (best_doc, distance, lexical_match) in zip(pending, faq_retriever.search_batch(pending_questions, query_embeddings)):
+            if best_doc is None:
+                source = "none"
+            elif distance <= FAQ_DISTANCE_THRESHOLD or lexical_match:
+                source = "faq"
+            else:
+                source = "faq_low_confidence"
+            records[i] = {
+                "question": questions[i],
+                "answer": get_answer_from_retrieved_docs([best_doc] if best_doc else []),
+                "matched_question": best_doc.page_content if best_doc else None,
+                "distance": distance if distance != float("inf") else None,
+                "source": source,
+            }
+    return records
+
+def run_batch(source, output, batch_size=BATCH_SIZE):
+    output_file = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+    answered = 0
+    started = time.perf_counter()
+    try:
+        for questions in iter_batches(read_questions(source), batch_size):
+            for record in answer_batch(questions):
+                output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # النتائج تظهر بعد كل دفعة دون انتظار نهاية الملف
+            output_file.flush()
+            answered += len(questions)
+            print(f"تمت الإجابة على {answered} سؤال...", file=sys.stderr)
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    elapsed = time.perf_counter() - started
+    throughput = answered / elapsed if elapsed else 0.0
+    print(f"\nاكتمل وضع الدفعات: {answered} سؤال في {elapsed:.2f} ثانية ({throughput:.1f} سؤال/ثانية).", file=sys.stderr)
+
+if args.batch:
+    run_batch(args.batch, args.output, args.batch_size)
+    exit()
 
-# 3. حلقة التفاعل مع الشات بوت
+# 4. حلقة التفاعل مع الشات بوت
 print("\n--- مرحباً بك في شات بوت جامعة الشام! ---")
 print("يمكنك طرح أي سؤال عن الجامعة، أو اكتب 'exit' للخروج.")
 
@@ -54,4 +178,4 @@ while True:
         print(f"الروبوت: {response}")
     except Exception as e:
         print(f"حدث خطأ أثناء معالجة سؤالك: {e}")
-        print("الرجاء التأكد من أن قاعدة بيانات الأسئلة والأجوبة موجودة وصحيحة.")
\ No newline at end of file
+        print("الرجاء التأكد من أن قاعدة بيانات الأسئلة والأجوبة موجودة وصحيحة.")
@@ -1,29 +1,41 @@
 import re
 import os
+import time
+import argparse
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm # لاستخدام شريط التقدم
 
+from near_duplicates import NEAR_DUP_THRESHOLD, make_near_duplicate_filter, print_near_duplicate_report
+
+# عبارات الموقع المتكررة التي تُحذف من كل فقرة
+UNWANTED_PHRASES = [
+    "نهتم دوما بالاستماع إلى مقترحاتكم وآرائكم.",
+    "Copyright ©جميع الحقوق محفوظة لجامعة الشام",
+    "جامعة الشام",
+    "Sham university",
+    "المزيد", 
+    "Copyright ©جميع الحقوق محفوظة لمركز شام للدراسات والبحث العلمي",
+]
+# نمط واحد مُجمّع مسبقاً لكل العبارات (الأطول أولاً حتى تُحذف "Copyright ... لجامعة الشام" كاملة قبل "جامعة الشام")
+UNWANTED_PHRASES_PATTERN = re.compile("|".join(re.escape(phrase) for phrase in sorted(set(UNWANTED_PHRASES), key=len, reverse=True)))
+# الاحتفاظ بالحروف العربية، الإنجليزية، الأرقام، المسافات، النقطة، والفاصلة
+DISALLOWED_CHARS_PATTERN = re.compile(r'[^\u0600-\u06FF\sA-Za-z0-9\.\,]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", "0")) # 0 = عملية لكل نواة، 1 = بدون مجمع عمليات
+CLEAN_CHUNK_SIZE = int(os.getenv("CLEAN_CHUNK_SIZE", "2000")) # عدد الأسطر في كل مهمة تنظيف
+
 def clean_text_data_single_paragraph(text_input):
     """
     تقوم بتنظيف فقرة نصية واحدة.
     تم فصل هذه الدالة لتكون مستقلة ويمكن استدعاؤها بسهولة.
     """
-    unwanted_phrases = [
-        "نهتم دوما بالاستماع إلى مقترحاتكم وآرائكم.",
-        "Copyright ©جميع الحقوق محفوظة لجامعة الشام",
-        "جامعة الشام",
-        "Sham university",
-        "المزيد", 
-        "Copyright ©جميع الحقوق محفوظة لمركز شام للدراسات والبحث العلمي",
-        "Sham university"
-    ]
-
-    text = text_input.strip()
-    for phrase in unwanted_phrases:
-        text = text.replace(phrase, "")
-    
-    # الاحتفاظ بالحروف العربية، الإنجليزية، الأرقام، المسافات، النقطة، والفاصلة
-    text = re.sub(r'[^\u0600-\u06FF\sA-Za-z0-9\.\,]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    # حذف كل العبارات غير المرغوبة في مرور واحد على النص
+    text = UNWANTED_PHRASES_PATTERN.sub("", text_input.strip())
+    text = DISALLOWED_CHARS_PATTERN.sub("", text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
     text = text.lower() # توحيد الحروف (خاصة للإنجليزية)
 
     # إزالة الفقرات الفارغة أو القصيرة جداً
@@ -31,57 +43,172 @@ def clean_text_data_single_paragraph(text_input):
         return text
     return None
 
-# --- الجزء الخاص بتشغيل السكربت مباشرة ---
-if __name__ == "__main__":
-    # تعريف ملفات الإدخال الخام التي تريد تنظيفها ودمجها
-    input_files_to_clean = [
-        "all_university_paragraphs.txt",       # الناتج من scrape_sham_university.py
-        "university_texts_with_ocr.txt"        # الناتج من scrape_with_ocr.py
-    ]
-    
-    # الملف النهائي الذي سيحتوي على جميع الفقرات النظيفة والفريدة والمدمجة
-    final_output_cleaned_file = "all_cleaned_university_paragraphs.txt"
+# --- مراحل تدفقية (generators): كل فقرة تمر بالقراءة ثم التنظيف ثم إزالة التكرار ثم الكتابة دون تجميع النصوص ---
+def read_paragraphs(file_paths):
+    """
+    يعيد فقرات الملفات الخام سطراً سطراً دون تحميل أي ملف كاملاً في الذاكرة.
+    """
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            print(f"⚠️ تحذير: ملف '{file_path}' غير موجود. سيتم تخطيه في عملية التنظيف.")
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+
+def clean_paragraphs(paragraphs):
+    for paragraph in paragraphs:
+        cleaned_text = clean_text_data_single_paragraph(paragraph)
+        if cleaned_text:
+            yield cleaned_text
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def clean_chunk(paragraphs):
+    """
+    تنظيف مجموعة أسطر داخل عملية منفصلة، مع حذف التكرار داخل المجموعة نفسها (بترتيب أول ظهور) لتقليل النقل بين العمليات.
+    """
+    return list(dict.fromkeys(clean_paragraphs(paragraphs)))
+
+def clean_paragraphs_parallel(paragraphs, workers=CLEAN_WORKERS, chunk_size=CLEAN_CHUNK_SIZE):
+    """
+    مثل clean_paragraphs لكن على عدة أنوية: الأسطر تُقسم إلى مجموعات تُنظف في مجمع عمليات،
+    والنتائج تُعاد بنفس ترتيب الإدخال. عدد المجموعات قيد المعالجة محدود، فالذاكرة لا تكبر بحجم الملفات.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from clean_paragraphs(paragraphs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in iter_chunks(paragraphs, chunk_size):
+            in_flight.append(executor.submit(clean_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+class ParagraphDeduper:
+    """
+    فهرس التكرار: بصمة 16 بايت لكل فقرة بدلاً من النص نفسه، فالذاكرة تكبر بعدد الفقرات الفريدة فقط وليس بحجم النصوص.
+    """
+    def __init__(self):
+        self.seen = set()
 
-    all_raw_paragraphs_to_clean = []
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
 
-    print("بدء عملية قراءة الفقرات من ملفات الإدخال...")
+    def add(self, text):
+        # True إذا كانت الفقرة جديدة
+        key = self.key(text)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        return True
 
-    # قراءة الفقرات من جميع ملفات الإدخال
-    for file_path in input_files_to_clean:
+    def seed_from_file(self, file_path):
+        # الفقرات المكتوبة مسبقاً في ملف المخرجات (عند الإضافة أو الاستئناف) لا تُكتب مرة أخرى
         if os.path.exists(file_path):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    paragraphs_from_file = [line.strip() for line in f if line.strip()]
-                    all_raw_paragraphs_to_clean.extend(paragraphs_from_file)
-                print(f"تم قراءة {len(paragraphs_from_file)} فقرة من الملف '{file_path}'.")
-            except Exception as e:
-                print(f"خطأ: حدث مشكلة في قراءة الملف '{file_path}': {e}")
-        else:
-            print(f"⚠️ تحذير: ملف '{file_path}' غير موجود. سيتم تخطيه في عملية التنظيف.")
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.add(line)
+
+    def filter(self, paragraphs):
+        for paragraph in paragraphs:
+            if self.add(paragraph):
+                yield paragraph
+
+    def __len__(self):
+        return len(self.seen)
+
+
+def append_paragraphs(paragraphs, output):
+    """
+    يكتب كل فقرة فور وصولها إلى ملف مفتوح، ويعيد عدد الفقرات المكتوبة.
+    """
+    written = 0
+    for paragraph in paragraphs:
+        output.write(paragraph + "\n")
+        written += 1
+    return written
+
+def remove_duplicates(paragraphs, deduper, near_duplicate_filter=None):
+    """
+    التكرار الحرفي أولاً (بصمة سريعة)، ثم شبه المكرر (MinHash + LSH) على ما تبقى فقط.
+    """
+    unique_paragraphs = deduper.filter(paragraphs)
+    if near_duplicate_filter is None:
+        return unique_paragraphs
+    return near_duplicate_filter.filter(unique_paragraphs)
+
+def seed_duplicate_indexes(output_file, deduper, near_duplicate_filter=None):
+    # الفقرات الموجودة في ملف المخرجات (عند الإضافة أو الاستئناف) تدخل الفهارس دون أن تُكتب مرة أخرى
+    deduper.seed_from_file(output_file)
+    if near_duplicate_filter is not None and os.path.exists(output_file):
+        near_duplicate_filter.seed(read_paragraphs([output_file]))
+
+def clean_files(input_files, output_file, append=False, workers=CLEAN_WORKERS, chunk_size=CLEAN_CHUNK_SIZE,
+                near_dup_threshold=NEAR_DUP_THRESHOLD):
+    """
+    ينظف ملفات الفقرات الخام ويكتب الفقرات الفريدة (بترتيب أول ظهور) إلى output_file، ويطبع السرعة بالأسطر/ثانية.
+    مع append تُضاف الفقرات الجديدة فقط إلى نهاية الملف الحالي. near_dup_threshold = 0 يعطّل حذف شبه المكرر.
+    """
+    deduper = ParagraphDeduper()
+    near_duplicate_filter = make_near_duplicate_filter(near_dup_threshold)
+    if append:
+        seed_duplicate_indexes(output_file, deduper, near_duplicate_filter)
+    started = time.perf_counter()
+    with open(output_file, "a" if append else "w", encoding="utf-8") as output, \
+            tqdm(read_paragraphs(input_files), unit="فقرة", desc="تنظيف ودمج الفقرات") as raw_paragraphs:
+        cleaned_paragraphs = clean_paragraphs_parallel(raw_paragraphs, workers, chunk_size)
+        written = append_paragraphs(remove_duplicates(cleaned_paragraphs, deduper, near_duplicate_filter), output)
+    elapsed = time.perf_counter() - started
+    lines_per_second = raw_paragraphs.n / elapsed if elapsed else 0.0
+    print(f"\nتم تنظيف {raw_paragraphs.n} فقرة خام في {elapsed:.2f} ثانية ({lines_per_second:,.0f} سطر/ثانية).")
+    if near_duplicate_filter is not None:
+        print_near_duplicate_report(near_duplicate_filter)
+    print(f"فقرات نظيفة وفريدة جديدة: {written}.")
+    print(f"تم حفظ جميع الفقرات النظيفة والفريدة والمدمجة في الملف: {output_file}")
+    return raw_paragraphs.n, written
 
-    if not all_raw_paragraphs_to_clean:
+# --- الجزء الخاص بتشغيل السكربت مباشرة ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="تنظيف ودمج فقرات الزحف الخام وإزالة المكرر منها.")
+    # ملفات الإدخال الخام: الناتج من scrape_sham_university.py و scrape_with_ocr.py
+    parser.add_argument("--inputs", nargs="+", default=["all_university_paragraphs.txt", "university_texts_with_ocr.txt"],
+                        help="ملفات الفقرات الخام المراد تنظيفها ودمجها.")
+    # الملف النهائي الذي سيحتوي على جميع الفقرات النظيفة والفريدة والمدمجة
+    parser.add_argument("--output", default="all_cleaned_university_paragraphs.txt", help="ملف الفقرات النظيفة.")
+    parser.add_argument("--workers", type=int, default=CLEAN_WORKERS, help="عدد عمليات التنظيف (0 = عملية لكل نواة).")
+    parser.add_argument("--chunk-size", type=int, default=CLEAN_CHUNK_SIZE, help="عدد الأسطر في كل مهمة تنظيف.")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="تشابه Jaccard الأدنى لحذف الفقرات شبه المكررة، مثل 0.8 (الافتراضي 0 = تعطيل).")
+    args = parser.parse_args()
+    final_output_cleaned_file = args.output
+
+    print("بدء عملية قراءة وتنظيف ودمج الفقرات من ملفات الإدخال...")
+    raw_paragraphs_count, _ = clean_files(
+        args.inputs, final_output_cleaned_file, workers=args.workers, chunk_size=args.chunk_size,
+        near_dup_threshold=args.near_dup_threshold,
+    )
+    if not raw_paragraphs_count:
         print("لا توجد بيانات لمعالجتها من أي من ملفات الإدخال المحددة. تأكد من تشغيل سكربتات الزحف أولاً.")
         exit()
-
-    print(f"\nبدء عملية تنظيف ودمج {len(all_raw_paragraphs_to_clean)} فقرة خام...")
-    cleaned_unique_paragraphs_set = set() # استخدام مجموعة لضمان التفرد بعد التنظيف
-
-    # تطبيق التنظيف على كل فقرة وعرض شريط تقدم
-    with tqdm(total=len(all_raw_paragraphs_to_clean), unit="فقرة", desc="تنظيف ودمج الفقرات") as pbar:
-        for paragraph in all_raw_paragraphs_to_clean:
-            cleaned_text = clean_text_data_single_paragraph(paragraph)
-            if cleaned_text:
-                cleaned_unique_paragraphs_set.add(cleaned_text)
-            pbar.update(1) # تحديث شريط التقدم
-
-    cleaned_paragraphs_list = list(cleaned_unique_paragraphs_set)
-    print(f"\nتم تنظيف ودمج واستخراج {len(cleaned_paragraphs_list)} فقرة فريدة نهائية.")
-
-    # حفظ الفقرات النظيفة المدمجة في ملف جديد
-    with open(final_output_cleaned_file, "w", encoding="utf-8") as f:
-        for p in cleaned_paragraphs_list:
-            f.write(p + "\n")
-    print(f"تم حفظ جميع الفقرات النظيفة والفريدة والمدمجة في الملف: {final_output_cleaned_file}")
+    print("(أو شغّل 'python corpus_pipeline.py' للزحف والتنظيف والكتابة في أمر واحد.)")
 
     print("\n--- الخطوات التالية المقترحة: ---")
     print(f"1. الآن، ملف '{final_output_cleaned_file}' يحتوي على جميع النصوص النظيفة والفريدة من HTML و OCR.")
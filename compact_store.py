@@ -0,0 +1,172 @@
+import os
+import json
+import mmap
+import time
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from faiss_index_types import apply_search_parameters, load_index_params
+
+# --- صيغة تخزين مضغوطة لقاعدة بيانات الـ FAQ (بدون pickle) ---
+# index.faiss: متجهات FAISS (نفس الملف الذي يكتبه save_local)
+# answers.bin: نصوص الأسئلة والأجوبة متتالية بترميز UTF-8
+# answers_offsets.npy: مصفوفة إزاحات int64 بطول 2n+1 (السؤال i بين [2i, 2i+1) والإجابة بين [2i+1, 2i+2))
+# compact_info.json: يُكتب آخراً ويحمل نسخة الفهرس، فتغيّره يعني أن كل الملفات الأخرى جاهزة
+INDEX_FILE_NAME = "index.faiss"
+BLOB_FILE_NAME = "answers.bin"
+OFFSETS_FILE_NAME = "answers_offsets.npy"
+INFO_FILE_NAME = "compact_info.json"
+TEMP_SUFFIX = ".tmp"
+
+def temp_path_for(path):
+    # في نفس المجلد حتى يكون os.replace استبدالاً ذرياً على نفس نظام الملفات
+    return path + TEMP_SUFFIX
+
+def save_vector_db(vector_db, store_path):
+    """
+    بديل save_local: يكتب index.faiss و index.pkl بأسماء مؤقتة ثم يستبدلهما بـ os.replace.
+    العمليات التي فتحت الملف السابق عبر memory map تحتفظ بنسخته القديمة، فلا تقرأ ملفاً نصف مكتوب (SIGBUS).
+    """
+    os.makedirs(store_path, exist_ok=True)
+    vector_db.save_local(store_path, index_name="index" + TEMP_SUFFIX)
+    for extension in ("faiss", "pkl"):
+        os.replace(os.path.join(store_path, f"index{TEMP_SUFFIX}.{extension}"), os.path.join(store_path, f"index.{extension}"))
+
+def write_compact_store(vector_db, store_path, model_name=None):
+    """
+    يكتب نصوص قاعدة بيانات FAISS (langchain) بالصيغة المضغوطة بنفس ترتيب معرّفات FAISS.
+    كل الملفات تُكتب أولاً بأسماء مؤقتة ثم تُستبدل، وملف compact_info.json (النسخة) آخرها.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    index_path = os.path.join(store_path, INDEX_FILE_NAME)
+    blob_path = os.path.join(store_path, BLOB_FILE_NAME)
+    offsets_path = os.path.join(store_path, OFFSETS_FILE_NAME)
+    info_path = os.path.join(store_path, INFO_FILE_NAME)
+
+    faiss.write_index(vector_db.index, temp_path_for(index_path))
+    offsets = [0]
+    with open(temp_path_for(blob_path), "wb") as blob:
+        for faiss_id in range(vector_db.index.ntotal):
+            doc = vector_db.docstore.search(vector_db.index_to_docstore_id[faiss_id])
+            for text in (doc.page_content, doc.metadata.get("answer", "")):
+                encoded = text.encode("utf-8")
+                blob.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+    # np.save يضيف .npy إذا لم ينتهِ المسار بها، لذا نمرر ملفاً مفتوحاً
+    with open(temp_path_for(offsets_path), "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    with open(temp_path_for(info_path), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": vector_db.index.ntotal, "dimension": vector_db.index.d, "model_name": model_name,
+            "blob_bytes": offsets[-1], "version": time.time_ns(),
+        }, f, ensure_ascii=False)
+
+    for path in (index_path, blob_path, offsets_path, info_path):
+        os.replace(temp_path_for(path), path)
+
+def get_store_version(store_path):
+    """
+    نسخة قاعدة البيانات المحفوظة: حقل version في compact_info.json (يُستبدل آخراً بعد اكتمال كل الملفات)،
+    فلا يتغير بمجرد نسخ المجلد أو لمس الملف. للمجلدات القديمة بدون هذا الحقل: تاريخ تعديل ملف الفهرس،
+    و 0 إذا لم يوجد.
+    """
+    try:
+        with open(os.path.join(store_path, INFO_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    index_path = os.path.join(store_path, INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        return os.path.getmtime(index_path)
+    return 0
+
+def has_compact_store(store_path):
+    return all(
+        os.path.exists(os.path.join(store_path, file_name))
+        for file_name in (INDEX_FILE_NAME, BLOB_FILE_NAME, OFFSETS_FILE_NAME, INFO_FILE_NAME)
+    )
+
+
+class CompactAnswerStore:
+    """
+    قارئ الصيغة المضغوطة: النصوص تُقرأ عبر memory map عند الطلب فقط بحسب معرّف FAISS.
+    يوفّر نفس دوال البحث المستخدمة من قاعدة بيانات FAISS في langchain.
+    """
+    def __init__(self, store_path, embeddings=None):
+        self.store_path = store_path
+        self.embeddings = embeddings
+        self.index = self._read_index(os.path.join(store_path, INDEX_FILE_NAME))
+        # معاملات البحث المحفوظة مع الفهرس (nprobe لفهارس IVF و efSearch لـ HNSW)
+        apply_search_parameters(self.index, load_index_params(store_path)["search_params"])
+        self.offsets = np.load(os.path.join(store_path, OFFSETS_FILE_NAME), mmap_mode="r")
+        with open(os.path.join(store_path, INFO_FILE_NAME), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self._blob_file = open(os.path.join(store_path, BLOB_FILE_NAME), "rb")
+        blob_size = os.fstat(self._blob_file.fileno()).st_size
+        # ملفات من بناءين مختلفين (بناء جديد بدأ أثناء التحميل) لا تتطابق أعدادها أو أحجامها
+        if (self.info["count"] != self.index.ntotal or len(self.offsets) != 2 * self.index.ntotal + 1
+                or self.info.get("blob_bytes", blob_size) != blob_size or int(self.offsets[-1]) != blob_size):
+            self._blob_file.close()
+            raise ValueError(f"الصيغة المضغوطة في '{store_path}' غير متسقة مع ملف الفهرس. أعد تشغيل build_vector_db.py.")
+        self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ) if blob_size else b""
+
+    @staticmethod
+    def _read_index(index_path):
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        except Exception:
+            # بعض أنواع الفهارس لا تدعم القراءة عبر memory map
+            return faiss.read_index(index_path)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def _text(self, position):
+        return self._blob[int(self.offsets[position]):int(self.offsets[position + 1])].decode("utf-8")
+
+    def get(self, faiss_id):
+        """
+        يعيد (السؤال، الإجابة) لمعرّف FAISS.
+        """
+        return self._text(2 * faiss_id), self._text(2 * faiss_id + 1)
+
+    def get_document(self, faiss_id):
+        question, answer = self.get(faiss_id)
+        return Document(page_content=question, metadata={"answer": answer, "type": "qa_pair", "faiss_id": faiss_id})
+
+    def iter_documents(self):
+        for faiss_id in range(len(self)):
+            yield self.get_document(faiss_id)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        if len(self) == 0:
+            return []
+        query = np.asarray([embedding], dtype=np.float32)
+        distances, ids = self.index.search(query, k)
+        return [
+            (self.get_document(int(faiss_id)), float(distance))
+            for faiss_id, distance in zip(ids[0], distances[0])
+            if faiss_id != -1
+        ]
+
+    def similarity_search_with_score(self, query, k=4):
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k)
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob_file.close()
+
+
+def load_faq_store(store_path, embeddings):
+    """
+    يحمّل الصيغة المضغوطة إن وُجدت، وإلا يعود إلى FAISS.load_local (pickle) للمجلدات القديمة.
+    """
+    if has_compact_store(store_path):
+        return CompactAnswerStore(store_path, embeddings)
+
+    from langchain_community.vectorstores import FAISS
+    print(f"⚠️ لا توجد صيغة مضغوطة في '{store_path}'، سيتم تحميل index.pkl. أعد تشغيل build_vector_db.py لإنشائها.")
+    return FAISS.load_local(store_path, embeddings, allow_dangerous_deserialization=True)
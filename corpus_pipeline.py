@@ -0,0 +1,90 @@
+import argparse
+
+from clean_data import (
+    CLEAN_WORKERS, ParagraphDeduper, append_paragraphs, clean_files, clean_paragraphs, remove_duplicates, seed_duplicate_indexes,
+)
+from near_duplicates import NEAR_DUP_THRESHOLD, make_near_duplicate_filter, print_near_duplicate_report
+from crawler import HtmlExtractor, add_crawler_arguments, append_from_args, checkpoint_from_args, crawler_from_args
+
+# --- خط تدفقي واحد: زحف ← تنظيف ← إزالة التكرار ← إضافة إلى ملف الفقرات النظيفة ---
+# كل فقرة تُكتب فور وصولها؛ الذاكرة محدودة بفهرس التكرار (بصمات الفقرات الفريدة) وليس بحجم النصوص
+CLEANED_OUTPUT_FILE = "all_cleaned_university_paragraphs.txt"
+
+def crawled_paragraphs(crawler, start_urls, checkpoint=None, desc="الزحف والتنظيف"):
+    """
+    يعيد نصوص الصفحات واحداً تلو الآخر فور اكتمال كل صفحة.
+    نقطة الحفظ تُكتب عند طلب الصفحة التالية، أي بعد أن يكتب المستهلك كل نصوص الصفحات السابقة.
+    """
+    for _, texts, _ in crawler.crawl(start_urls, desc=desc, checkpoint=checkpoint):
+        yield from texts
+
+def run_pipeline(paragraphs, output, deduper, near_duplicate_filter=None):
+    """
+    يمرر الفقرات الخام عبر التنظيف وإزالة التكرار ويكتبها إلى output المفتوح، ويعيد عدد الفقرات الجديدة.
+    التنظيف هنا في نفس العملية: الزحف محدود بالشبكة، ونقطة الحفظ تفترض أن كل ما أُعيد قد كُتب.
+    """
+    return append_paragraphs(remove_duplicates(clean_paragraphs(paragraphs), deduper, near_duplicate_filter), output)
+
+def crawl_and_clean(mode, output_file=CLEANED_OUTPUT_FILE, append=False, args=None, near_dup_threshold=NEAR_DUP_THRESHOLD):
+    if mode == "ocr":
+        # الاستيراد هنا حتى لا يحتاج وضع HTML إلى Tesseract و Pillow
+        from scrape_with_ocr import OcrExtractor, initial_urls_for_ocr_crawl
+        from ocr_pool import OCR_CACHE_DB, OCR_WORKERS, OcrPool
+        extractor = OcrExtractor(OcrPool(args.ocr_workers or OCR_WORKERS, args.ocr_cache or OCR_CACHE_DB))
+        start_urls = initial_urls_for_ocr_crawl
+    else:
+        from scrape_sham_university import initial_urls_for_html_crawl
+        extractor = HtmlExtractor()
+        start_urls = initial_urls_for_html_crawl
+
+    crawler = crawler_from_args(args, extractor)
+    # مع --only-changed تُضاف نصوص الصفحات المتغيرة فوق الملف الحالي بدلاً من استبداله
+    append = append_from_args(args, append)
+    checkpoint = checkpoint_from_args(args, output_file)
+    resumed = checkpoint.load() is not None
+    if resumed:
+        print(f"استئناف الزحف من نقطة الحفظ: {checkpoint.path}")
+
+    written = 0
+    try:
+        with checkpoint.open_output(output_file, append=append) as output:
+            deduper = ParagraphDeduper()
+            near_duplicate_filter = make_near_duplicate_filter(near_dup_threshold)
+            if resumed or append:
+                # ما هو موجود في الملف (بعد قصّه إلى آخر نقطة حفظ) لا يُكتب مرة أخرى
+                output.flush()
+                seed_duplicate_indexes(output_file, deduper, near_duplicate_filter)
+            existing = len(deduper)
+            written = run_pipeline(crawled_paragraphs(crawler, start_urls, checkpoint), output, deduper, near_duplicate_filter)
+    finally:
+        crawler.close()
+        if mode == "ocr":
+            extractor.ocr_pool.close()
+
+    print(f"\nتمت زيارة {crawler.pages_crawled} صفحة (بدون تغيير: {crawler.unchanged_pages}، فشل تحميل {crawler.failed_urls}).")
+    if near_duplicate_filter is not None:
+        print_near_duplicate_report(near_duplicate_filter)
+    print(f"فقرات موجودة مسبقاً: {existing}، فقرات نظيفة جديدة: {written}.")
+    print(f"تم حفظ الفقرات النظيفة والفريدة في الملف: {output_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="زحف وتنظيف وإزالة تكرار فقرات موقع جامعة الشام في أمر واحد.")
+    parser.add_argument("--mode", choices=("html", "ocr", "files"), default="html",
+                        help="html أو ocr: الزحف على الموقع؛ files: تنظيف ملفات خام موجودة (--inputs).")
+    parser.add_argument("--inputs", nargs="+", default=["all_university_paragraphs.txt", "university_texts_with_ocr.txt"],
+                        help="ملفات الفقرات الخام في وضع files.")
+    parser.add_argument("--output", default=CLEANED_OUTPUT_FILE, help="ملف الفقرات النظيفة.")
+    parser.add_argument("--append", action="store_true",
+                        help="الإضافة إلى ملف المخرجات الحالي (مع تخطي ما فيه) بدلاً من إعادة كتابته.")
+    parser.add_argument("--clean-workers", type=int, default=CLEAN_WORKERS, help="عدد عمليات التنظيف في وضع files (0 = عملية لكل نواة).")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="تشابه Jaccard الأدنى لحذف الفقرات شبه المكررة، مثل 0.8 (الافتراضي 0 = تعطيل).")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="عدد عمليات OCR في وضع ocr (الافتراضي OCR_WORKERS).")
+    parser.add_argument("--ocr-cache", default=None, help="ملف ذاكرة نتائج OCR في وضع ocr (الافتراضي OCR_CACHE_DB).")
+    add_crawler_arguments(parser)
+    args = parser.parse_args()
+
+    if args.mode == "files":
+        clean_files(args.inputs, args.output, args.append, args.clean_workers, near_dup_threshold=args.near_dup_threshold)
+    else:
+        crawl_and_clean(args.mode, args.output, args.append, args, args.near_dup_threshold)
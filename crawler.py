@@ -0,0 +1,408 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from tqdm import tqdm # لاستخدام شريط التقدم
+
+from http_cache import CRAWLER_HTTP_CACHE_DB, HttpCache
+
+# إخفاء تحذير InsecureRequestWarning عند تعطيل التحقق من SSL
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# --- محرك زحف مشترك لسكربتات الجمع: جلسة HTTP واحدة بمجمع اتصالات، حدود لكل نطاق، وإعادة محاولة ---
+CRAWLER_MAX_WORKERS = int(os.getenv("CRAWLER_MAX_WORKERS", "8")) # عدد الصفحات قيد المعالجة في نفس الوقت
+CRAWLER_PER_HOST_CONCURRENCY = int(os.getenv("CRAWLER_PER_HOST_CONCURRENCY", "4")) # أقصى طلبات متزامنة لنفس النطاق
+CRAWLER_REQUESTS_PER_SECOND = float(os.getenv("CRAWLER_REQUESTS_PER_SECOND", "5")) # لكل نطاق (0 = بدون حد)
+CRAWLER_TIMEOUT_SECONDS = float(os.getenv("CRAWLER_TIMEOUT_SECONDS", "15"))
+CRAWLER_RETRIES = int(os.getenv("CRAWLER_RETRIES", "3"))
+CRAWLER_BACKOFF_SECONDS = float(os.getenv("CRAWLER_BACKOFF_SECONDS", "0.5")) # 0.5، 1، 2 ... بين المحاولات
+CRAWLER_USER_AGENT = os.getenv("CRAWLER_USER_AGENT", "ShamUniversityBot/1.0")
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# حفظ حالة الزحف (الطابور، الروابط المعروفة، موضع ملف المخرجات) كل هذا العدد من الصفحات
+CRAWLER_CHECKPOINT_EVERY = int(os.getenv("CRAWLER_CHECKPOINT_EVERY", "50"))
+# معاملات التتبع التي لا تغيّر محتوى الصفحة
+TRACKING_PARAMS = frozenset(["fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "_ga", "igshid", "ref"])
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonicalize_url(url):
+    """
+    شكل موحد للرابط حتى لا تُزار نفس الصفحة مرتين: بدون fragment أو / في النهاية أو معاملات التتبع (utm_* وغيرها)،
+    مع أحرف صغيرة للبروتوكول والنطاق، وحذف المنفذ الافتراضي، وترتيب معاملات الاستعلام الباقية.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class CrawlFrontier:
+    """
+    طابور الزحف بالعرض: deque للروابط المنتظرة (إضافة وسحب O(1)) ومجموعة لكل رابط سبق رؤيته (فحص O(1)).
+    """
+    def __init__(self, pending=(), seen=()):
+        self.pending = deque((url, depth) for url, depth in pending)
+        self.seen = set(seen)
+
+    def add(self, url, depth):
+        url = canonicalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.pending.append((url, depth))
+        return True
+
+    def pop(self):
+        return self.pending.popleft()
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class CrawlCheckpoint:
+    """
+    نقطة حفظ على القرص لزحف قابل للاستئناف: الروابط المنتظرة (بما فيها قيد المعالجة)، الروابط المعروفة،
+    وموضع ملف المخرجات عند الحفظ. عند الاستئناف يُقص ملف المخرجات إلى ذلك الموضع ثم يُكمل الزحف.
+    """
+    def __init__(self, path, every=CRAWLER_CHECKPOINT_EVERY):
+        self.path = path
+        self.every = every
+        self.output = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def open_output(self, output_file, append=False):
+        """
+        يفتح ملف المخرجات للكتابة التدريجية: متابعة من آخر نقطة حفظ إن وُجدت، وإلا ملف جديد
+        (أو الإضافة إلى نهاية الملف الحالي مع append).
+        """
+        state = self.load()
+        if state is not None and os.path.exists(output_file):
+            self.output = open(output_file, "r+", encoding="utf-8")
+            # ما كُتب بعد آخر نقطة حفظ يخص صفحات ستُزار مرة أخرى
+            self.output.truncate(state.get("output_offset", 0))
+            self.output.seek(0, os.SEEK_END)
+        else:
+            self.output = open(output_file, "a" if append else "w", encoding="utf-8")
+        return self.output
+
+    def save(self, pending, seen, pages_crawled, failed_urls):
+        state = {
+            "pending": [[url, depth] for url, depth in pending],
+            "seen": sorted(seen),
+            "pages_crawled": pages_crawled,
+            "failed_urls": failed_urls,
+            "output_offset": 0,
+        }
+        if self.output is not None:
+            self.output.flush()
+            state["output_offset"] = self.output.tell()
+        # كتابة ذرية: ملف مؤقت ثم استبدال، فلا تبقى نقطة حفظ نصف مكتوبة بعد انقطاع مفاجئ
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    pass
+
+
+class HostLimiter:
+    """
+    حد التزامن ومعدل الطلبات لنطاق واحد: سيمافور للطلبات المتزامنة، وفاصل زمني أدنى بين بدايات الطلبات.
+    """
+    def __init__(self, concurrency, requests_per_second):
+        self.semaphore = threading.BoundedSemaphore(max(1, concurrency))
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait_for_slot(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        self.wait_for_slot()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.semaphore.release()
+
+
+class HtmlExtractor:
+    """
+    وضع HTML فقط: روابط نفس النطاق + نصوص وسوم <p>.
+    الأوضاع الأخرى (مثل HTML + OCR) ترث هذا الصنف وتضيف نصوصها في extract_texts.
+    """
+    def extract_links(self, soup, page_url):
+        page_host = urlparse(page_url).netloc
+        links = []
+        for link_tag in soup.find_all('a', href=True):
+            href = link_tag.get('href')
+            if href and not href.startswith('#'):
+                full_url = urljoin(page_url, href)
+                if urlparse(full_url).netloc == page_host:
+                    links.append(full_url)
+        return links
+
+    def extract_texts(self, crawler, soup, page_url):
+        texts = []
+        for paragraph_tag in soup.find_all('p'):
+            text = paragraph_tag.get_text(strip=True)
+            if text:
+                texts.append(text)
+        return texts
+
+    def extract(self, crawler, page_url, response, include_texts=True):
+        """
+        يعيد (الروابط، النصوص) لصفحة تم تحميلها؛ بدون include_texts تُستخلص الروابط فقط لمتابعة الزحف.
+        الروابط النسبية تُحل مقابل الرابط الفعلي للرد (بعد التحويلات) وليس الرابط الموحد:
+        التوحيد يحذف / في النهاية، فيصبح page2 في الصفحة /dir/ رابطاً خاطئاً /page2.
+        التوحيد يتم فقط عند إضافة الرابط إلى طابور الزحف.
+        """
+        base_url = getattr(response, "url", None) or page_url
+        soup = BeautifulSoup(response.text, 'html.parser')
+        texts = self.extract_texts(crawler, soup, base_url) if include_texts else []
+        return self.extract_links(soup, base_url), texts
+
+
+def build_session(pool_size, retries=CRAWLER_RETRIES, backoff_seconds=CRAWLER_BACKOFF_SECONDS, user_agent=CRAWLER_USER_AGENT):
+    """
+    جلسة requests تعيد استخدام اتصالات TCP/TLS، مع إعادة المحاولة بتأخير متزايد للأخطاء المؤقتة.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_seconds,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = user_agent
+    return session
+
+
+class Crawler:
+    """
+    زاحف متزامن بالعرض (BFS) حتى max_depth: الصفحات تُجلب في مجمع خيوط عبر جلسة واحدة،
+    وكل نطاق محدود بعدد طلبات متزامنة ومعدل طلبات. استخلاص الروابط والنصوص يتم عبر extractor.
+    """
+    def __init__(self, extractor=None, max_depth=3, max_workers=CRAWLER_MAX_WORKERS,
+                 per_host_concurrency=CRAWLER_PER_HOST_CONCURRENCY, requests_per_second=CRAWLER_REQUESTS_PER_SECOND,
+                 timeout=CRAWLER_TIMEOUT_SECONDS, retries=CRAWLER_RETRIES, backoff_seconds=CRAWLER_BACKOFF_SECONDS,
+                 verify_ssl=False, http_cache=None, skip_unchanged=False):
+        self.extractor = extractor or HtmlExtractor()
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        self.per_host_concurrency = per_host_concurrency
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+        # مع http_cache تُرسل طلبات شرطية، ومع skip_unchanged لا تُستخلص نصوص الصفحات غير المتغيرة
+        self.http_cache = http_cache
+        self.skip_unchanged = skip_unchanged
+        # مجمع الاتصالات يتسع لكل الخيوط (الصفحات + تحميل الصور داخلها)
+        self.session = build_session(max_workers * 2, retries, backoff_seconds)
+        self.frontier = CrawlFrontier()
+        self.pages_crawled = 0
+        self.failed_urls = 0
+        self.unchanged_pages = 0
+        self._host_limiters = {}
+        self._lock = threading.Lock()
+
+    def host_limiter(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            limiter = self._host_limiters.get(host)
+            if limiter is None:
+                limiter = self._host_limiters[host] = HostLimiter(self.per_host_concurrency, self.requests_per_second)
+        return limiter
+
+    def fetch(self, url, max_bytes=None, **kwargs):
+        """
+        طلب GET عبر الجلسة المشتركة ضمن حدود النطاق؛ يرفع استثناء requests عند الفشل بعد المحاولات.
+        الرد يحمل دائماً from_cache و unchanged (صحيحة فقط عند وجود ذاكرة HTTP ومحتوى مطابق لما سبق).
+        مع max_bytes يُرفض الرد (ResponseTooLarge) من ترويسة Content-Length قبل تحميل المحتوى.
+        """
+        if max_bytes is not None:
+            kwargs["stream"] = True
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("verify", self.verify_ssl)
+        if self.http_cache is not None:
+            kwargs["headers"] = {**self.http_cache.conditional_headers(url), **kwargs.get("headers", {})}
+        with self.host_limiter(url):
+            response = self.session.get(url, **kwargs)
+        response.raise_for_status()
+        if max_bytes is not None and int(response.headers.get("Content-Length") or 0) > max_bytes:
+            response.close()
+            raise ResponseTooLarge(f"{url}: {response.headers['Content-Length']} بايت")
+        if self.http_cache is not None:
+            # 304 يُستبدل بالمحتوى المحفوظ، و 200 يُحفظ مع بصمته
+            return self.http_cache.resolve(url, response)
+        response.from_cache = False
+        response.unchanged = False
+        return response
+
+    def scrape_page(self, url):
+        """
+        يعيد (الروابط، النصوص، هل الصفحة بدون تغيير منذ الزحف السابق).
+        """
+        try:
+            response = self.fetch(url)
+            if "html" not in response.headers.get("Content-Type", "text/html"):
+                return [], [], response.unchanged # ملفات PDF والصور وغيرها ليست صفحات للزحف
+            include_texts = not (self.skip_unchanged and response.unchanged)
+            links, texts = self.extractor.extract(self, url, response, include_texts)
+            return links, texts, response.unchanged
+        except requests.exceptions.RequestException:
+            pass
+        except Exception:
+            pass
+        with self._lock:
+            self.failed_urls += 1
+        return [], [], False
+
+    def crawl(self, start_urls, desc="الزحف على الصفحات", checkpoint=None):
+        """
+        مولّد: يعيد (الرابط، النصوص المستخلصة، هل الصفحة بدون تغيير) لكل صفحة فور اكتمال معالجتها.
+        مع checkpoint تُحفظ الحالة دورياً، ويُستأنف الزحف منها إن وُجدت بدلاً من البدء من start_urls.
+        """
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is not None:
+            self.frontier = CrawlFrontier(state["pending"], state["seen"])
+            self.pages_crawled = state.get("pages_crawled", 0)
+            self.failed_urls = state.get("failed_urls", 0)
+        else:
+            self.frontier = CrawlFrontier()
+            self.pages_crawled = 0
+            self.failed_urls = 0
+            for url in start_urls:
+                self.frontier.add(url, 0)
+
+        self.unchanged_pages = 0
+        frontier = self.frontier
+        in_flight = {}
+        pages_since_checkpoint = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                tqdm(total=self.pages_crawled + len(frontier), initial=self.pages_crawled, unit="صفحة", desc=desc) as pbar:
+            while frontier or in_flight:
+                if checkpoint is not None and pages_since_checkpoint >= checkpoint.every:
+                    # كل الصفحات التي أُعيدت حتى الآن عالجها المستدعي؛ الصفحات قيد التحميل تُحفظ كمنتظرة
+                    checkpoint.save(list(in_flight.values()) + list(frontier.pending), frontier.seen,
+                                    self.pages_crawled, self.failed_urls)
+                    pages_since_checkpoint = 0
+
+                while frontier and len(in_flight) < self.max_workers:
+                    url, depth = frontier.pop()
+                    in_flight[executor.submit(self.scrape_page, url)] = (url, depth)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = in_flight.pop(future)
+                    links, texts, unchanged = future.result()
+                    if depth < self.max_depth:
+                        for link in links:
+                            if frontier.add(link, depth + 1):
+                                pbar.total += 1
+                    self.pages_crawled += 1
+                    self.unchanged_pages += unchanged
+                    pages_since_checkpoint += 1
+                    pbar.update(1)
+                    yield url, texts, unchanged
+
+        if checkpoint is not None:
+            # اكتمل الزحف: لا حاجة للاستئناف بعد الآن
+            checkpoint.clear()
+
+    def close(self):
+        self.session.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
+
+
+def add_crawler_arguments(parser):
+    parser.add_argument("--max-depth", type=int, default=3, help="أقصى عمق للزحف انطلاقاً من الروابط الأولية.")
+    parser.add_argument("--workers", type=int, default=CRAWLER_MAX_WORKERS, help="عدد الصفحات التي تُعالج في نفس الوقت.")
+    parser.add_argument("--per-host-concurrency", type=int, default=CRAWLER_PER_HOST_CONCURRENCY,
+                        help="أقصى عدد طلبات متزامنة لنفس النطاق.")
+    parser.add_argument("--requests-per-second", type=float, default=CRAWLER_REQUESTS_PER_SECOND,
+                        help="أقصى معدل طلبات لكل نطاق (0 = بدون حد).")
+    parser.add_argument("--checkpoint", default=None, help="ملف نقطة الحفظ (الافتراضي: اسم ملف المخرجات + .checkpoint.json).")
+    parser.add_argument("--checkpoint-every", type=int, default=CRAWLER_CHECKPOINT_EVERY, help="حفظ حالة الزحف كل N صفحة.")
+    parser.add_argument("--fresh", action="store_true", help="تجاهل نقطة الحفظ الموجودة والبدء من جديد.")
+    parser.add_argument("--http-cache", default=CRAWLER_HTTP_CACHE_DB, help="ملف ذاكرة HTTP للطلبات الشرطية.")
+    parser.add_argument("--no-http-cache", action="store_true", help="تحميل كل الصفحات كاملة دون ذاكرة HTTP.")
+    parser.add_argument("--only-changed", action="store_true",
+                        help="كتابة نصوص الصفحات الجديدة أو المتغيرة فقط منذ الزحف السابق (للتحديث الدوري)، "
+                             "بالإضافة إلى نهاية ملف المخرجات الحالي دون إعادة كتابته.")
+    return parser
+
+def skip_unchanged_from_args(args):
+    # بدون ذاكرة HTTP لا يمكن معرفة الصفحات غير المتغيرة
+    return args.only_changed and not args.no_http_cache
+
+def append_from_args(args, append=False):
+    """
+    هل يُضاف إلى ملف المخرجات بدلاً من إعادة كتابته. مع --only-changed لا تُستخلص نصوص الصفحات غير المتغيرة،
+    فإعادة كتابة الملف تحذف محتواها من المجموعة كلها: الصفحات غير المتغيرة تُتخطى ولا تُحذف،
+    وعلى الخطوات اللاحقة (clean_data.py وما بعدها) أن تعامل الملف كإضافات فوق الزحف السابق.
+    """
+    return append or skip_unchanged_from_args(args)
+
+def checkpoint_from_args(args, output_file):
+    checkpoint = CrawlCheckpoint(args.checkpoint or output_file + ".checkpoint.json", args.checkpoint_every)
+    if args.fresh:
+        checkpoint.clear()
+    return checkpoint
+
+def crawler_from_args(args, extractor=None):
+    return Crawler(
+        extractor,
+        max_depth=args.max_depth,
+        max_workers=args.workers,
+        per_host_concurrency=args.per_host_concurrency,
+        requests_per_second=args.requests_per_second,
+        http_cache=None if args.no_http_cache else HttpCache(args.http_cache),
+        skip_unchanged=skip_unchanged_from_args(args),
+    )
@@ -0,0 +1,218 @@
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from arabic_text import normalize_arabic
+
+# --- واجهات نموذج التضمين: PyTorch (HuggingFaceEmbeddings) أو ONNX Runtime مع تكميم int8 ---
+# torch: السلوك الأصلي عبر sentence-transformers
+# onnx: نفس النموذج مصدّراً إلى ONNX ومكمّماً ديناميكياً (int8)، يعمل دون PyTorch وقت التشغيل
+# hashing: تضمين حتمي بتجزئة مقاطع الحروف، بدون أوزان نموذج (للاختبارات والقياس في CI فقط)
+EMBEDDINGS_BACKENDS = ("torch", "onnx", "hashing")
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+ONNX_MODEL_FILE_NAME = "model.onnx"
+ONNX_QUANTIZED_FILE_NAME = "model_int8.onnx"
+ONNX_INFO_FILE_NAME = "onnx_info.json"
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0")) # 0 = اختيار onnxruntime التلقائي
+# أقل نسبة مقبولة لتطابق أفضل نتيجة (top-1) في الـ FAQ بين النموذج المكمّم والأصلي
+ONNX_AGREEMENT_THRESHOLD = float(os.getenv("ONNX_AGREEMENT_THRESHOLD", "0.95"))
+MAX_SEQUENCE_LENGTH = 512
+HASHING_DIMENSION = 256
+HASHING_NGRAM = 3
+
+def onnx_model_dir(model_name, base_dir=ONNX_MODEL_DIR):
+    return os.path.join(base_dir, model_name.replace("/", "__"))
+
+def export_onnx_model(model_name, model_dir=None, quantize=True):
+    """
+    يصدّر النموذج المخزن محلياً (Hugging Face) إلى ONNX مع محاور ديناميكية للدفعة وطول النص،
+    ثم يكمّمه ديناميكياً إلى int8. يتطلب PyTorch مرة واحدة وقت التصدير فقط.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model_dir = model_dir or onnx_model_dir(model_name)
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["ما هي الكليات الموجودة في الجامعة؟"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    output_names = ["last_hidden_state", "pooler_output"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    dynamic_axes["pooler_output"] = {0: "batch"}
+
+    fp32_path = os.path.join(model_dir, ONNX_MODEL_FILE_NAME)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=output_names, dynamic_axes=dynamic_axes, opset_version=14,
+        )
+    if quantize:
+        quantize_dynamic(fp32_path, os.path.join(model_dir, ONNX_QUANTIZED_FILE_NAME), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(model_dir)
+
+    with open(os.path.join(model_dir, ONNX_INFO_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "quantized": quantize, "input_names": input_names}, f, ensure_ascii=False)
+    return model_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    تضمين عبر onnxruntime بنفس المُجزّئ (tokenizer) ونفس التجميع (mean pooling) الذي يستخدمه
+    sentence-transformers افتراضياً مع asafaya/bert-base-arabic، لذا تبقى المتجهات قابلة للمقارنة.
+    """
+    backend = "onnx"
+
+    def __init__(self, model_dir, quantized=True, batch_size=32, max_length=MAX_SEQUENCE_LENGTH, num_threads=ONNX_NUM_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        model_file = ONNX_QUANTIZED_FILE_NAME if quantized else ONNX_MODEL_FILE_NAME
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), session_options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        last_hidden_state = self.session.run(["last_hidden_state"], feeds)[0]
+        # متوسط تضمينات الرموز مع تجاهل رموز الحشو (padding)
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        summed = (last_hidden_state * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def embed_documents(self, texts):
+        # نفس التهيئة التي يطبقها HuggingFaceEmbeddings و sentence-transformers على النصوص
+        texts = [text.replace("\n", " ").strip() for text in texts]
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    تضمين حتمي دون أي نموذج: مقاطع حروف (n-grams) من كل كلمة بعد التوحيد تُجزَّأ إلى متجه بإشارة ±1
+    ثم يُطبَّع المتجه. لا يفهم المعنى، لكنه يسمح بتشغيل البناء والقياس دون اتصال وبنتائج قابلة للتكرار.
+    """
+    backend = "hashing"
+
+    def __init__(self, dimension=HASHING_DIMENSION, ngram=HASHING_NGRAM):
+        self.dimension = dimension
+        self.ngram = ngram
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in normalize_arabic(text).split():
+            padded = f"#{word}#"
+            for start in range(max(1, len(padded) - self.ngram + 1)):
+                digest = hashlib.blake2b(padded[start:start + self.ngram].encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def embeddings_backend_name(embeddings):
+    return getattr(embeddings, "backend", "torch")
+
+def get_embeddings(model_name, backend=EMBEDDINGS_BACKEND, batch_size=None, num_threads=ONNX_NUM_THREADS):
+    """
+    يعيد كائن التضمين المطلوب بحسب الإعداد (EMBEDDINGS_BACKEND)، ويصدّر نموذج ONNX عند أول استخدام.
+    """
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        encode_kwargs = {"batch_size": batch_size} if batch_size else {}
+        return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs=encode_kwargs)
+    if backend == "onnx":
+        model_dir = onnx_model_dir(model_name)
+        if not os.path.exists(os.path.join(model_dir, ONNX_QUANTIZED_FILE_NAME)):
+            print(f"لا يوجد نموذج ONNX في '{model_dir}'، جاري التصدير والتكميم (مرة واحدة)...")
+            export_onnx_model(model_name, model_dir)
+        return OnnxEmbeddings(model_dir, batch_size=batch_size or 32, num_threads=num_threads)
+    if backend == "hashing":
+        return HashingEmbeddings()
+    raise ValueError(f"واجهة تضمين غير معروفة: '{backend}'. الواجهات المتاحة: {', '.join(EMBEDDINGS_BACKENDS)}")
+
+
+# --- فحص تطابق أفضل نتيجة بين النموذج المكمّم والنموذج الأصلي ---
+def perturb_question(question):
+    """
+    صيغة معدلة قليلاً من السؤال (توحيد الكتابة وحذف الكلمة الأخيرة) حتى لا يكون البحث تطابقاً ذاتياً.
+    """
+    words = normalize_arabic(question).split()
+    return " ".join(words[:-1]) if len(words) > 2 else " ".join(words)
+
+def _top1_ids(embeddings, questions, queries):
+    import faiss
+    question_vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+    index = faiss.IndexFlatL2(question_vectors.shape[1])
+    index.add(question_vectors)
+    _, ids = index.search(np.asarray(embeddings.embed_documents(queries), dtype=np.float32), 1)
+    return ids[:, 0]
+
+def top1_agreement(reference_embeddings, candidate_embeddings, questions, queries=None):
+    """
+    نسبة الاستعلامات التي يعيد فيها النموذج المرشح نفس أفضل سؤال FAQ الذي يعيده النموذج المرجعي.
+    """
+    queries = queries or [perturb_question(question) for question in questions]
+    reference_ids = _top1_ids(reference_embeddings, questions, queries)
+    candidate_ids = _top1_ids(candidate_embeddings, questions, queries)
+    return float(np.mean(reference_ids == candidate_ids))
+
+def check_top1_agreement(model_name, questions, threshold=ONNX_AGREEMENT_THRESHOLD):
+    """
+    يقارن واجهة ONNX المكمّمة بواجهة PyTorch على أسئلة الـ FAQ، ويعيد (النسبة، هل تجاوزت الحد).
+    """
+    agreement = top1_agreement(get_embeddings(model_name, "torch"), get_embeddings(model_name, "onnx"), questions)
+    print(f"تطابق أفضل نتيجة (top-1) بين ONNX int8 و PyTorch: {agreement:.3f} (الحد الأدنى {threshold:.3f})")
+    return agreement, agreement >= threshold
+
+
+if __name__ == "__main__":
+    from build_vector_db import FAQ_FILE_PATH, MODEL_NAME, load_qa_documents
+
+    parser = argparse.ArgumentParser(description="تصدير نموذج التضمين إلى ONNX (int8) وفحص تطابقه مع النموذج الأصلي.")
+    parser.add_argument("--model", default=MODEL_NAME, help="اسم نموذج Hugging Face.")
+    parser.add_argument("--faq-file", default=FAQ_FILE_PATH, help="ملف الأسئلة والأجوبة المستخدم في الفحص.")
+    parser.add_argument("--threshold", type=float, default=ONNX_AGREEMENT_THRESHOLD, help="أقل نسبة تطابق top-1 مقبولة.")
+    parser.add_argument("--skip-export", action="store_true", help="استخدام النموذج المصدّر مسبقاً دون إعادة التصدير.")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        print(f"تم تصدير النموذج إلى: {export_onnx_model(args.model)}")
+    questions = [doc.page_content for doc in load_qa_documents(args.faq_file)]
+    if questions:
+        _, passed = check_top1_agreement(args.model, questions, args.threshold)
+        if not passed:
+            print("⚠️ النموذج المكمّم أقل من الحد المطلوب، استخدم EMBEDDINGS_BACKEND=torch.")
+            exit(1)
@@ -0,0 +1,149 @@
+import os
+import json
+import math
+import time
+
+import faiss
+import numpy as np
+
+# --- أنواع فهارس FAISS المتاحة لقاعدة بيانات الـ FAQ ---
+# flat: بحث دقيق (الافتراضي، نفس ما ينشئه FAISS.from_documents)
+# hnsw: رسم بياني هرمي، سريع جداً ولا يدعم الحذف (remove_ids)
+# ivf-flat / ivf-pq: تقسيم إلى عناقيد (nlist) والبحث في nprobe منها فقط، مع ضغط PQ اختياري
+# sq8: تكميم كل بُعد إلى 8 بت (ربع الذاكرة)
+# كل الأنواع عدا flat تُعاد بناؤها بالكامل عند حذف أزواج من الـ FAQ (انظر index_supports_removal)
+INDEX_TYPES = ("flat", "hnsw", "ivf-flat", "ivf-pq", "sq8")
+INDEX_PARAMS_FILE_NAME = "index_params.json"
+DEFAULT_NPROBE = 8
+DEFAULT_EF_SEARCH = 64
+HNSW_M = 32
+# طول الضجيج المضاف لاستعلامات تقرير الدقة كنسبة من متوسط المسافة إلى أقرب جار
+EVAL_NOISE_SCALE = 0.5
+
+def index_factory_string(index_type, num_vectors, dimension):
+    """
+    يحوّل نوع الفهرس إلى نص index_factory مع معاملات مناسبة لحجم المجموعة.
+    """
+    # عدد العناقيد ~ 4√n مع 39 نقطة تدريب على الأقل لكل عنقود
+    nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivf-flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf-pq":
+        # عدد المقاطع يجب أن يقسم البُعد، و 8 بت لكل مقطع تتطلب 256 نقطة تدريب على الأقل
+        m = next((m for m in (48, 32, 24, 16, 12, 8, 4, 2) if dimension % m == 0 and dimension // m >= 8), 1)
+        nbits = 8 if num_vectors >= 256 * 39 else 4
+        return f"IVF{nlist},PQ{m}x{nbits}"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"نوع فهرس غير معروف: '{index_type}'. الأنواع المتاحة: {', '.join(INDEX_TYPES)}")
+
+def index_supports_removal(index_type):
+    """
+    FAISS.delete في langchain يعيد ترقيم index_to_docstore_id إلى 0..n-1 بعد remove_ids، وهذا لا يطابق
+    إلا الفهرس المسطح (يضغط المعرّفات بعد الحذف). فهارس IVF تحتفظ بمعرّفاتها الأصلية فتشير النتائج لمستندات خاطئة،
+    و HNSW لا يدعم الحذف أصلاً، والصيغة المضغوطة و BM25 تفترضان معرّفات متتالية من 0.
+    """
+    return index_type == "flat"
+
+def search_parameters(index_type, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH):
+    if index_type.startswith("ivf"):
+        return {"nprobe": nprobe}
+    if index_type == "hnsw":
+        return {"efSearch": ef_search}
+    return {}
+
+def apply_search_parameters(index, params):
+    if params:
+        faiss.ParameterSpace().set_index_parameters(index, ",".join(f"{key}={value}" for key, value in params.items()))
+
+def build_faiss_index(vectors, index_type, params=None):
+    """
+    يبني الفهرس المطلوب ويدرّبه على متجهات المجموعة نفسها ثم يضيفها بنفس الترتيب (نفس معرّفات FAISS).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], index_factory_string(index_type, len(vectors), vectors.shape[1]), faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_parameters(index, params)
+    return index
+
+def save_index_params(store_path, index_type, params):
+    params_path = os.path.join(store_path, INDEX_PARAMS_FILE_NAME)
+    with open(params_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"index_type": index_type, "search_params": params}, f, ensure_ascii=False)
+    os.replace(params_path + ".tmp", params_path)
+
+def load_index_params(store_path):
+    params_path = os.path.join(store_path, INDEX_PARAMS_FILE_NAME)
+    if not os.path.exists(params_path):
+        return {"index_type": "flat", "search_params": {}}
+    with open(params_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- تقرير الدقة والزمن مقارنة بالبحث الدقيق ---
+def _latencies_ms(index, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query[None, :], 5)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def _exclude_sources(ids, sources, k):
+    # حذف المتجه الذي اشتُق منه الاستعلام من النتائج، ثم أول k نتيجة متبقية
+    return np.array([[faiss_id for faiss_id in row if faiss_id != source][:k] for row, source in zip(ids, sources)])
+
+def evaluate_index(index, vectors, num_queries=1000, seed=0, noise_scale=EVAL_NOISE_SCALE):
+    """
+    يقارن الفهرس بفهرس دقيق (Flat) على استعلامات مشتقة من عينة من متجهات المجموعة مع ضجيج غاوسي
+    (طوله noise_scale من متوسط المسافة إلى أقرب جار)، مع استبعاد المتجه الأصلي من نتائج الفهرسين:
+    الاستعلام المطابق لمتجه مفهرس يجد نفسه دائماً فيصبح recall@1 قرابة 1.0 مهما كان الفهرس.
+    يعيد recall@1 و recall@5 (نسبة نتائج البحث الدقيق الموجودة في نتائج الفهرس) وزمن الاستعلام p50/p99.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    exact_index = faiss.IndexFlatL2(vectors.shape[1])
+    exact_index.add(vectors)
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[sample]
+    # مع متجه واحد فقط لا يوجد جار آخر لقياسه
+    exclude_source = len(vectors) > 1
+    if exclude_source:
+        neighbor_distances, _ = exact_index.search(queries, 2)
+        neighbor_distance = float(np.sqrt(np.median(neighbor_distances[:, 1]))) # مسافات IndexFlatL2 مربّعة
+        noise = rng.standard_normal(queries.shape).astype(np.float32)
+        noise *= noise_scale * neighbor_distance / np.maximum(np.linalg.norm(noise, axis=1, keepdims=True), 1e-12)
+        queries = np.ascontiguousarray(queries + noise, dtype=np.float32)
+
+    k = min(5, len(vectors) - 1) if exclude_source else 1
+    _, exact_ids = exact_index.search(queries, k + exclude_source)
+    _, approx_ids = index.search(queries, k + exclude_source)
+    if exclude_source:
+        exact_ids = _exclude_sources(exact_ids, sample, k)
+        approx_ids = _exclude_sources(approx_ids, sample, k)
+    recall_at_1 = float(np.mean(exact_ids[:, 0] == approx_ids[:, 0]))
+    recall_at_5 = float(np.mean([len(set(e) & set(a)) / k for e, a in zip(exact_ids, approx_ids)]))
+
+    exact_latencies = _latencies_ms(exact_index, queries)
+    latencies = _latencies_ms(index, queries)
+    return {
+        "recall@1": recall_at_1,
+        "recall@5": recall_at_5,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "exact_p50_ms": float(np.percentile(exact_latencies, 50)),
+        "exact_p99_ms": float(np.percentile(exact_latencies, 99)),
+    }
+
+def print_index_report(index_type, report):
+    print(f"\n--- تقرير الفهرس ({index_type}) مقارنة بالبحث الدقيق ---")
+    print(f"recall@1: {report['recall@1']:.3f} | recall@5: {report['recall@5']:.3f}")
+    print(f"زمن الاستعلام: p50 = {report['p50_ms']:.3f}ms, p99 = {report['p99_ms']:.3f}ms")
+    print(f"(البحث الدقيق: p50 = {report['exact_p50_ms']:.3f}ms, p99 = {report['exact_p99_ms']:.3f}ms)")
@@ -0,0 +1,256 @@
+import os
+
+# القياس يعمل دون اتصال بالكامل: النماذج تُقرأ من ذاكرة Hugging Face المحلية فقط
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import json
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+from arabic_text import normalize_arabic
+from answer_pipeline import FAQ_DISTANCE_THRESHOLD
+from bm25_index import HybridFaqRetriever, load_bm25_index, write_bm25_index
+from build_vector_db import (
+    CHUNK_OVERLAP, CHUNK_SIZE, EMBED_BATCH_SIZE, FAQ_FILE_PATH, MODEL_NAME, build_settings, load_qa_documents,
+    sync_faq_vector_db,
+)
+from compact_store import load_faq_store, write_compact_store
+from embedding_backends import EMBEDDINGS_BACKENDS, get_embeddings
+from faiss_index_types import INDEX_TYPES
+from faq_lookup import build_exact_match_index, lookup_exact_match
+
+# --- قياس دون اتصال لسرعة ودقة طبقة الـ FAQ (البناء، الحجم، التحميل، زمن الاستعلام، hit@1) ---
+QUERY_SETS = ("exact", "perturbed", "paraphrase")
+PARAPHRASE_FRACTION = 0.3 # نسبة الأسئلة المحجوزة لتوليد صيغ معاد صياغتها
+TASHKEEL_MARKS = ("\u064E", "\u064F", "\u0650", "\u0651", "\u0652") # فتحة، ضمة، كسرة، شدة، سكون
+TATWEEL = "\u0640"
+
+# قواعد إعادة صياغة بسيطة لأدوات الاستفهام الشائعة في ملف الـ FAQ
+PARAPHRASE_RULES = (
+    ("ما هو ", ("ماهو ", "شو هو ", "ما ")),
+    ("ما هي ", ("ماهي ", "شو هي ", "ما ")),
+    ("كم عدد ", ("ما عدد ", "ما هو عدد ")),
+    ("متى ", ("في أي وقت ", "ما هو موعد ")),
+    ("هل ", ("", "يا ترى هل ")),
+    ("أين ", ("وين ", "ما هو مكان ")),
+)
+PARAPHRASE_PREFIXES = ("", "أريد أن أعرف ", "من فضلك، ", "سؤال: ")
+
+# --- بناء مجموعة الاستعلامات الموسومة ---
+def perturb_with_typo(question, rng):
+    """
+    خطأ إملائي واحد (حذف أو تبديل أو تكرار حرف) في كلمة عشوائية، مع تشكيل وتطويل عشوائيين.
+    """
+    words = question.split()
+    candidates = [i for i, word in enumerate(words) if len(word) >= 4]
+    if candidates:
+        i = rng.choice(candidates)
+        word = words[i]
+        position = rng.randrange(1, len(word) - 1)
+        operation = rng.choice(("delete", "swap", "duplicate"))
+        if operation == "delete":
+            word = word[:position] + word[position + 1:]
+        elif operation == "swap":
+            word = word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+        else:
+            word = word[:position] + word[position] + word[position:]
+        words[i] = word
+
+    perturbed = []
+    for char in " ".join(words):
+        perturbed.append(char)
+        if "ء" <= char <= "ي":
+            if rng.random() < 0.3:
+                perturbed.append(rng.choice(TASHKEEL_MARKS))
+            elif rng.random() < 0.05:
+                perturbed.append(TATWEEL)
+    return "".join(perturbed)
+
+def paraphrase(question, rng):
+    rewritten = question
+    for pattern, replacements in PARAPHRASE_RULES:
+        if pattern in rewritten:
+            rewritten = rewritten.replace(pattern, rng.choice(replacements), 1)
+            break
+    rewritten = rng.choice(PARAPHRASE_PREFIXES) + rewritten
+    return rewritten.rstrip("؟?").strip() if rng.random() < 0.5 else rewritten
+
+def build_query_set(qa_documents, seed=0, paraphrase_fraction=PARAPHRASE_FRACTION, paraphrase_file=None):
+    """
+    يعيد قائمة من {"set", "query", "question", "answer"}: الأسئلة كما هي، وصيغ مشوهة (أخطاء إملائية وتشكيل)،
+    وصيغ معاد صياغتها لعينة محجوزة من الأسئلة (أو من ملف JSONL بصيغ بشرية: {"query", "question"}).
+    """
+    rng = random.Random(seed)
+    answers_by_question = {normalize_arabic(doc.page_content): doc.metadata["answer"] for doc in qa_documents}
+    queries = []
+    for doc in qa_documents:
+        question, answer = doc.page_content, doc.metadata["answer"]
+        queries.append({"set": "exact", "query": question, "question": question, "answer": answer})
+        queries.append({"set": "perturbed", "query": perturb_with_typo(question, rng), "question": question, "answer": answer})
+
+    if paraphrase_file:
+        with open(paraphrase_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    answer = entry.get("answer") or answers_by_question.get(normalize_arabic(entry["question"]))
+                    if answer:
+                        queries.append({"set": "paraphrase", "query": entry["query"], "question": entry["question"], "answer": answer})
+    else:
+        held_out = rng.sample(qa_documents, max(1, int(len(qa_documents) * paraphrase_fraction)))
+        for doc in held_out:
+            queries.append({
+                "set": "paraphrase", "query": paraphrase(doc.page_content, rng),
+                "question": doc.page_content, "answer": doc.metadata["answer"],
+            })
+    return queries
+
+
+# --- تشغيل القياس ---
+def _directory_size(path):
+    return {file_name: os.path.getsize(os.path.join(path, file_name)) for file_name in sorted(os.listdir(path))}
+
+def _is_hit(doc, expected):
+    if doc is None:
+        return False
+    return doc.metadata.get("answer") == expected["answer"] or normalize_arabic(doc.page_content) == normalize_arabic(expected["question"])
+
+class FaqTier:
+    """
+    نفس خطوات طبقة الـ FAQ في AnswerPipeline.search_faq دون LLM أو Serper:
+    تطابق حرفي ← بحث هجين (BM25 + FAISS) أو دلالي فقط.
+    """
+    def __init__(self, faq_vector_db, embeddings, exact_match_index=None, bm25_index=None, threshold=FAQ_DISTANCE_THRESHOLD):
+        self.faq_vector_db = faq_vector_db
+        self.embeddings = embeddings
+        self.exact_match_index = exact_match_index
+        self.hybrid_retriever = HybridFaqRetriever(faq_vector_db, bm25_index) if bm25_index is not None else None
+        self.threshold = threshold
+
+    def search(self, query):
+        """
+        يعيد (المستند، المسافة، هل تُقبل الإجابة من الـ FAQ، إجابة التطابق الحرفي إن وُجدت).
+        """
+        exact_match = lookup_exact_match(self.exact_match_index, query)
+        if exact_match:
+            return None, 0.0, True, exact_match.answer
+        query_embedding = self.embeddings.embed_query(query)
+        if self.hybrid_retriever is not None:
+            doc, distance, lexical_match = self.hybrid_retriever.search(query, query_embedding)
+        else:
+            docs_with_scores = self.faq_vector_db.similarity_search_with_score_by_vector(query_embedding, k=1)
+            doc, distance = docs_with_scores[0] if docs_with_scores else (None, float("inf"))
+            lexical_match = False
+        return doc, distance, distance <= self.threshold or lexical_match, None
+
+def run_benchmark(faq_file=FAQ_FILE_PATH, embeddings_backend="hashing", index_type="flat", chunk_size=CHUNK_SIZE,
+                  chunk_overlap=CHUNK_OVERLAP, use_bm25=True, use_exact_match=True, threshold=FAQ_DISTANCE_THRESHOLD,
+                  seed=0, paraphrase_file=None, work_dir=None):
+    qa_documents = load_qa_documents(faq_file)
+    if not qa_documents:
+        raise ValueError(f"لا توجد أزواج سؤال-جواب في '{faq_file}'.")
+    queries = build_query_set(qa_documents, seed, paraphrase_file=paraphrase_file)
+    embeddings = get_embeddings(MODEL_NAME, embeddings_backend, EMBED_BATCH_SIZE)
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as store_path:
+        # البناء: نفس مسار build_vector_db.py (إعادة بناء كاملة + الصيغة المضغوطة + BM25)
+        started = time.perf_counter()
+        settings = build_settings(MODEL_NAME, chunk_size, chunk_overlap, index_type, embeddings_backend)
+        # بدون تقرير evaluate_index: زمن البناء لا يشمل مقارنة الفهرس بالبحث الدقيق
+        vector_db, _, _, _ = sync_faq_vector_db(qa_documents, embeddings, store_path, settings, full_rebuild=True, evaluate=False)
+        write_bm25_index(vector_db, store_path)
+        write_compact_store(vector_db, store_path, MODEL_NAME)
+        build_seconds = time.perf_counter() - started
+        file_sizes = _directory_size(store_path)
+
+        started = time.perf_counter()
+        faq_vector_db = load_faq_store(store_path, embeddings)
+        bm25_index = load_bm25_index(store_path, faq_vector_db) if use_bm25 else None
+        exact_match_index = build_exact_match_index(faq_vector_db) if use_exact_match else None
+        load_seconds = time.perf_counter() - started
+
+        tier = FaqTier(faq_vector_db, embeddings, exact_match_index, bm25_index, threshold)
+        # تسخين: أول استدعاء للنموذج يتحمل تكلفة تهيئته. استدعاء مباشر لأن الاستعلام الأول قد يكون تطابقاً
+        # حرفياً يعود قبل تشغيل النموذج
+        embeddings.embed_query(queries[0]["query"])
+        latencies = []
+        results_by_set = {query_set: {"queries": 0, "hit@1": 0, "hit@1_at_threshold": 0} for query_set in QUERY_SETS}
+        started = time.perf_counter()
+        for expected in queries:
+            query_started = time.perf_counter()
+            doc, _, accepted, exact_answer = tier.search(expected["query"])
+            latencies.append((time.perf_counter() - query_started) * 1000)
+            hit = exact_answer == expected["answer"] if exact_answer else _is_hit(doc, expected)
+            counts = results_by_set[expected["set"]]
+            counts["queries"] += 1
+            counts["hit@1"] += hit
+            counts["hit@1_at_threshold"] += hit and accepted
+        total_seconds = time.perf_counter() - started
+        if hasattr(faq_vector_db, "close"):
+            faq_vector_db.close()
+
+    for counts in results_by_set.values():
+        for metric in ("hit@1", "hit@1_at_threshold"):
+            counts[metric] = counts[metric] / counts["queries"] if counts["queries"] else 0.0
+    return {
+        "config": {
+            "faq_file": faq_file, "embeddings_backend": embeddings_backend, "index_type": index_type,
+            "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "bm25": use_bm25, "exact_match": use_exact_match,
+            "threshold": threshold, "seed": seed,
+        },
+        "qa_pairs": len(qa_documents),
+        "vectors": vector_db.index.ntotal,
+        "build_seconds": build_seconds,
+        "index_bytes": sum(file_sizes.values()),
+        "index_files": file_sizes,
+        "load_seconds": load_seconds,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+        },
+        "qps": len(queries) / total_seconds if total_seconds else 0.0,
+        "results": results_by_set,
+    }
+
+def print_benchmark_report(report):
+    config = report["config"]
+    print(f"\n--- قياس طبقة الـ FAQ ({config['embeddings_backend']}, {config['index_type']}, BM25={'نعم' if config['bm25'] else 'لا'}) ---")
+    print(f"أزواج سؤال-جواب: {report['qa_pairs']} | متجهات: {report['vectors']}")
+    print(f"زمن البناء: {report['build_seconds']:.2f}s | حجم الفهرس: {report['index_bytes'] / 1024:.1f}KB | زمن التحميل: {report['load_seconds'] * 1000:.1f}ms")
+    latency = report["latency_ms"]
+    print(f"زمن الاستعلام: p50 = {latency['p50']:.2f}ms, p95 = {latency['p95']:.2f}ms, p99 = {latency['p99']:.2f}ms | QPS: {report['qps']:.1f}")
+    for query_set, counts in report["results"].items():
+        print(f"  {query_set:<10} ({counts['queries']} استعلام): hit@1 = {counts['hit@1']:.3f}, hit@1 ضمن العتبة {config['threshold']} = {counts['hit@1_at_threshold']:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس دون اتصال لسرعة ودقة البحث في الأسئلة الشائعة (FAQ).")
+    parser.add_argument("--faq-file", default=FAQ_FILE_PATH, help="ملف الأسئلة والأجوبة المصدر.")
+    parser.add_argument("--embeddings-backend", choices=EMBEDDINGS_BACKENDS, default="hashing",
+                        help="واجهة التضمين (hashing لا تحتاج أوزان نموذج، مناسبة لـ CI).")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="نوع فهرس FAISS.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--no-bm25", action="store_true", help="بحث دلالي فقط (بدون الدمج مع BM25).")
+    parser.add_argument("--no-exact-match", action="store_true", help="تعطيل التطابق الحرفي قبل البحث.")
+    parser.add_argument("--threshold", type=float, default=FAQ_DISTANCE_THRESHOLD, help="عتبة المسافة لقبول إجابة الـ FAQ.")
+    parser.add_argument("--seed", type=int, default=0, help="بذرة توليد الاستعلامات المشوهة والمعاد صياغتها.")
+    parser.add_argument("--paraphrase-file", default=None, help="ملف JSONL بصيغ بشرية: {\"query\": ..., \"question\": ...}.")
+    parser.add_argument("--output", default=None, help="حفظ التقرير بصيغة JSON.")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        args.faq_file, args.embeddings_backend, args.index_type, args.chunk_size, args.chunk_overlap,
+        use_bm25=not args.no_bm25, use_exact_match=not args.no_exact_match, threshold=args.threshold,
+        seed=args.seed, paraphrase_file=args.paraphrase_file,
+    )
+    print_benchmark_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,46 @@
+from collections import namedtuple
+
+from arabic_text import normalize_arabic
+
+# --- فهرس التطابق الحرفي لأسئلة الـ FAQ (يتجاوز نموذج التضمين و FAISS بالكامل) ---
+# question: سؤال الـ FAQ كما هو في الملف (وليس سؤال المستخدم بعد التوحيد)
+ExactMatch = namedtuple("ExactMatch", ["question", "answer"])
+
+def iter_faq_documents(vector_db):
+    """
+    يمر على مستندات الـ FAQ سواء كانت قاعدة البيانات بالصيغة المضغوطة أو FAISS من langchain.
+    """
+    if hasattr(vector_db, "iter_documents"):
+        yield from vector_db.iter_documents()
+        return
+    for docstore_id in vector_db.index_to_docstore_id.values():
+        doc = vector_db.docstore.search(docstore_id)
+        if hasattr(doc, "metadata"):
+            yield doc
+
+def get_faq_document(vector_db, faiss_id):
+    """
+    يعيد مستند الـ FAQ لمعرّف FAISS من أي من الصيغتين.
+    """
+    if hasattr(vector_db, "get_document"):
+        return vector_db.get_document(faiss_id)
+    return vector_db.docstore.search(vector_db.index_to_docstore_id[faiss_id])
+
+def build_exact_match_index(vector_db):
+    """
+    يبني قاموساً من السؤال الموحّد إلى ExactMatch (سؤال الـ FAQ الأصلي والإجابة) انطلاقاً من مستندات قاعدة البيانات المحملة.
+    """
+    exact_match_index = {}
+    for doc in iter_faq_documents(vector_db):
+        if not doc.metadata.get("answer"):
+            continue
+        key = normalize_arabic(doc.page_content)
+        if key:
+            exact_match_index.setdefault(key, ExactMatch(doc.page_content, doc.metadata["answer"]))
+    return exact_match_index
+
+def lookup_exact_match(exact_match_index, user_question):
+    # يعيد ExactMatch أو None
+    if not exact_match_index:
+        return None
+    return exact_match_index.get(normalize_arabic(user_question))
@@ -0,0 +1,125 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+import requests
+
+# --- ذاكرة HTTP على القرص للزاحف (SQLite): طلبات شرطية (ETag / Last-Modified) وبصمة المحتوى لكل رابط ---
+CRAWLER_HTTP_CACHE_DB = os.getenv("CRAWLER_HTTP_CACHE_DB", "crawler_http_cache.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash TEXT NOT NULL,
+    body BLOB NOT NULL,
+    content_type TEXT,
+    encoding TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+def body_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class HttpCache:
+    """
+    يحفظ لكل رابط آخر محتوى مع ETag و Last-Modified وبصمة SHA-256 للمحتوى.
+    conditional_headers تضيف If-None-Match / If-Modified-Since للطلب التالي، و resolve تحوّل رد 304
+    إلى المحتوى المحفوظ وتحدد هل تغيّرت الصفحة فعلاً (response.unchanged).
+    """
+    def __init__(self, db_path=CRAWLER_HTTP_CACHE_DB):
+        self.not_modified = 0 # ردود 304: لم يُنقل المحتوى
+        self.unchanged = 0 # ردود 200 بنفس البصمة السابقة
+        self.changed = 0 # صفحات جديدة أو تغيّر محتواها
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def _get(self, url):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT etag, last_modified, body_hash, body, content_type, encoding FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _get_hash(self, url):
+        with self._lock:
+            row = self._connection.execute("SELECT body_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def _put(self, url, response, content_hash):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body_hash, body, content_type, encoding, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, response.headers.get("ETag"), response.headers.get("Last-Modified"), content_hash,
+                 sqlite3.Binary(response.content), response.headers.get("Content-Type"), response.encoding, time.time()),
+            )
+
+    def _touch(self, url):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def conditional_headers(self, url):
+        with self._lock:
+            row = self._connection.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row:
+            etag, last_modified = row
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def resolve(self, url, response):
+        """
+        يعيد رداً بمحتوى كامل دائماً، مع الخاصيتين from_cache و unchanged.
+        """
+        if response.status_code == 304:
+            row = self._get(url)
+            if row is not None:
+                self._touch(url)
+                with self._lock:
+                    self.not_modified += 1
+                # الرابط الفعلي للرد (بعد التحويلات) هو أساس الروابط النسبية في الصفحة
+                return self._cached_response(response.url or url, row)
+            # لا يوجد محتوى محفوظ (حُذفت الذاكرة بين الطلبين): يُعامل كفشل ويُعاد الطلب في الزحف التالي
+            raise requests.exceptions.RequestException(f"304 بدون محتوى محفوظ: {url}")
+
+        content_hash = body_hash(response.content)
+        response.from_cache = False
+        response.unchanged = self._get_hash(url) == content_hash
+        self._put(url, response, content_hash)
+        with self._lock:
+            if response.unchanged:
+                self.unchanged += 1
+            else:
+                self.changed += 1
+        return response
+
+    def _cached_response(self, url, row):
+        _, _, _, body, content_type, encoding = row
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response._content = bytes(body)
+        if content_type:
+            response.headers["Content-Type"] = content_type
+        response.encoding = encoding
+        response.from_cache = True
+        response.unchanged = True
+        return response
+
+    def stats(self):
+        return {"not_modified": self.not_modified, "unchanged": self.unchanged, "changed": self.changed}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,191 @@
+import os
+import time
+import argparse
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from arabic_text import normalize_arabic
+
+# --- إزالة الفقرات شبه المكررة (نصوص OCR ومقاطع الموقع المتكررة) قبل توليد الأسئلة: MinHash + LSH ---
+# مرحلة التنظيف معطلة افتراضياً (0) حتى تُراجع العتبة على بيانات الجامعة: 0.8 تحذف 100 من 1422 فقرة
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0")) # تشابه Jaccard الأدنى في clean_data/corpus_pipeline (0 = تعطيل المرحلة)
+NEAR_DUP_SIMILARITY = 0.8 # العتبة الافتراضية عند استخدام المرشح مباشرة (هذا السكريبت أو NearDuplicateFilter)
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128")) # طول بصمة MinHash
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "5")) # عدد الأحرف في كل مقطع (shingle)
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+SHINGLE_HASH_BASE = np.uint64(1000003)
+SEED = 1
+LSH_INTEGRATION_STEPS = 100
+# وزن السلبيات الكاذبة عند اختيار الحزم: كل مرشح يُتحقق منه بالبصمة كاملة، فالمرشح الزائد يكلف مقارنة فقط
+# أما التكرار الذي لا يصبح مرشحاً فيبقى في الملف (0.95 مع 128 خانة: 16 حزمة × 8 صفوف)
+NEAR_DUP_FALSE_NEGATIVE_WEIGHT = float(os.getenv("NEAR_DUP_FALSE_NEGATIVE_WEIGHT", "0.95"))
+
+def _integrate(probability, start, end, steps=LSH_INTEGRATION_STEPS):
+    # تكامل عددي بقاعدة النقطة الوسطى
+    width = (end - start) / steps
+    return float(probability(start + width * (np.arange(steps) + 0.5)).sum() * width)
+
+def lsh_params(threshold, num_perm, false_negative_weight=0.5):
+    """
+    يختار (عدد الحزم b، عدد الصفوف r) مع b*r <= num_perm بأقل مجموع موزون لمساحتي الخطأ تحت منحنى LSH
+    (احتمال أن يصبح زوج مرشحاً = 1 - (1 - s^r)^b): الإيجابيات الكاذبة تحت العتبة والسلبيات الكاذبة فوقها،
+    بنفس طريقة datasketch. قد تبقى خانات في آخر البصمة خارج الحزم، وهي تُستخدم في تقدير التشابه فقط.
+    """
+    false_positive_weight = 1.0 - false_negative_weight
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = _integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+            false_negative = _integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+            error = false_positive_weight * false_positive + false_negative_weight * false_negative
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+def shingle_hashes(text, shingle_size=NEAR_DUP_SHINGLE_SIZE):
+    """
+    بصمات 32 بت لمقاطع الأحرف المتتالية (بدون تكرار)، محسوبة دفعة واحدة بـ NumPy دون حلقة على الأحرف.
+    """
+    normalized = normalize_arabic(text) or text
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < shingle_size:
+        windows = codes[None, :]
+        powers = SHINGLE_HASH_BASE ** np.arange(len(codes) - 1, -1, -1, dtype=np.uint64)
+    else:
+        windows = sliding_window_view(codes, shingle_size)
+        powers = SHINGLE_HASH_BASE ** np.arange(shingle_size - 1, -1, -1, dtype=np.uint64)
+    # تجاوز uint64 مقصود (حساب باقي القسمة على 2^64)، ثم خلط البتات العليا في 32 بت
+    hashes = windows @ powers
+    hashes = (hashes ^ (hashes >> np.uint64(29))) & MAX_HASH
+    return np.unique(hashes)
+
+
+class MinHasher:
+    """
+    بصمة MinHash: لكل تبديل عشوائي (a*x + b) mod p أصغر قيمة بين مقاطع النص. احتمال تساوي خانتين = تشابه Jaccard.
+    """
+    def __init__(self, num_perm=NEAR_DUP_NUM_PERM, shingle_size=NEAR_DUP_SHINGLE_SIZE, seed=SEED):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        # a و b أصغر من 2^32، فـ a*x + b يبقى ضمن uint64 دون تجاوز
+        self.a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, text):
+        hashes = shingle_hashes(text, self.shingle_size)[None, :]
+        return (((self.a * hashes + self.b) % MERSENNE_PRIME) & MAX_HASH).min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateFilter:
+    """
+    فهرس LSH تدفقي: كل فقرة تُقارن فقط بممثلي المجموعات الذين يشاركونها حزمة واحدة على الأقل (لا مقارنة لكل زوج).
+    الفقرة التي يبلغ تشابهها التقديري مع ممثل ما العتبة تُحذف وتُنسب لمجموعته، وإلا تصبح ممثلاً لمجموعة جديدة.
+    الممثل هو أول فقرة ظهرت من المجموعة، فالنتيجة حتمية وبنفس ترتيب الإدخال، والذاكرة تكبر بعدد الممثلين فقط.
+    """
+    def __init__(self, threshold=NEAR_DUP_SIMILARITY, num_perm=NEAR_DUP_NUM_PERM, shingle_size=NEAR_DUP_SHINGLE_SIZE,
+                 false_negative_weight=NEAR_DUP_FALSE_NEGATIVE_WEIGHT):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = lsh_params(threshold, num_perm, false_negative_weight)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = [] # بصمة كل ممثل بترتيب ظهوره
+        self.cluster_sizes = [] # عدد الفقرات في مجموعة كل ممثل
+        self.removed = 0
+
+    def _band_keys(self, signature):
+        # الحزم من أول b*r خانة فقط
+        return [band.tobytes() for band in signature[:self.bands * self.rows].reshape(self.bands, self.rows)]
+
+    def find_representative(self, signature, band_keys):
+        """
+        يعيد رقم الممثل الأكثر تشابهاً إذا بلغ العتبة، وإلا None.
+        """
+        candidates = set()
+        for band_buckets, key in zip(self.buckets, band_keys):
+            candidates.update(band_buckets.get(key, ()))
+        best_id, best_similarity = None, self.threshold
+        for candidate_id in sorted(candidates):
+            similarity = float(np.mean(self.signatures[candidate_id] == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate_id, similarity
+                if similarity == 1.0:
+                    break
+        return best_id
+
+    def add(self, text):
+        """
+        True إذا كانت الفقرة ممثلاً جديداً (تُكتب)، و False إذا كانت شبه مكررة لممثل سابق.
+        """
+        signature = self.hasher.signature(text)
+        band_keys = self._band_keys(signature)
+        representative_id = self.find_representative(signature, band_keys)
+        if representative_id is not None:
+            self.cluster_sizes[representative_id] += 1
+            self.removed += 1
+            return False
+        representative_id = len(self.signatures)
+        self.signatures.append(signature)
+        self.cluster_sizes.append(1)
+        for band_buckets, key in zip(self.buckets, band_keys):
+            band_buckets.setdefault(key, []).append(representative_id)
+        return True
+
+    def seed(self, paragraphs):
+        # فقرات موجودة مسبقاً في ملف المخرجات تصبح ممثلين دون أن تُكتب مرة أخرى
+        for paragraph in paragraphs:
+            self.add(paragraph)
+
+    def filter(self, paragraphs):
+        for paragraph in paragraphs:
+            if self.add(paragraph):
+                yield paragraph
+
+    def stats(self):
+        return {
+            "representatives": len(self.signatures),
+            "removed": self.removed,
+            "clusters_with_duplicates": sum(1 for size in self.cluster_sizes if size > 1),
+            "largest_cluster": max(self.cluster_sizes, default=0),
+        }
+
+
+def make_near_duplicate_filter(threshold=NEAR_DUP_THRESHOLD):
+    # العتبة 0 (أو أقل) تعطّل المرحلة
+    return NearDuplicateFilter(threshold) if threshold > 0 else None
+
+def print_near_duplicate_report(near_duplicate_filter):
+    stats = near_duplicate_filter.stats()
+    print(
+        f"الفقرات شبه المكررة (Jaccard >= {near_duplicate_filter.threshold}): حُذفت {stats['removed']}، "
+        f"وبقي {stats['representatives']} ممثلاً ({stats['clusters_with_duplicates']} مجموعة فيها تكرار، "
+        f"أكبرها {stats['largest_cluster']} فقرة)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="إزالة الفقرات شبه المكررة من ملف فقرات نظيفة (MinHash + LSH).")
+    parser.add_argument("--input", default="all_cleaned_university_paragraphs.txt", help="ملف الفقرات (سطر لكل فقرة).")
+    parser.add_argument("--output", default=None, help="ملف النتيجة (الافتراضي: استبدال ملف الإدخال).")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD or NEAR_DUP_SIMILARITY, help="تشابه Jaccard الأدنى لاعتبار فقرتين مكررتين.")
+    parser.add_argument("--num-perm", type=int, default=NEAR_DUP_NUM_PERM, help="طول بصمة MinHash.")
+    parser.add_argument("--shingle-size", type=int, default=NEAR_DUP_SHINGLE_SIZE, help="عدد الأحرف في كل مقطع.")
+    args = parser.parse_args()
+
+    output_file = args.output or args.input
+    # الكتابة إلى ملف مؤقت ثم الاستبدال، فيمكن أن يكون الإخراج هو ملف الإدخال نفسه
+    temp_file = output_file + ".tmp"
+    near_duplicate_filter = NearDuplicateFilter(args.threshold, args.num_perm, args.shingle_size)
+    started = time.perf_counter()
+    kept = 0
+    with open(args.input, "r", encoding="utf-8") as source, open(temp_file, "w", encoding="utf-8") as target:
+        for paragraph in near_duplicate_filter.filter(line.strip() for line in source if line.strip()):
+            target.write(paragraph + "\n")
+            kept += 1
+    os.replace(temp_file, output_file)
+    elapsed = time.perf_counter() - started
+    print(f"تمت معالجة {kept + near_duplicate_filter.removed} فقرة في {elapsed:.2f} ثانية.")
+    print_near_duplicate_report(near_duplicate_filter)
+    print(f"تم حفظ {kept} فقرة في الملف: {output_file}")
@@ -0,0 +1,156 @@
+import io
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pytesseract
+from PIL import Image, UnidentifiedImageError
+
+# --- OCR في مجمع عمليات مع ذاكرة نتائج على القرص مفتاحها بصمة SHA-256 لمحتوى الصورة ---
+# مسار Tesseract (تأكد من تعديل هذا المسار، أو اتركه فارغاً إذا كان tesseract ضمن PATH)
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", r'C:\Users\ALWAFER\AppData\Local\Programs\Tesseract-OCR\tesseract.exe')
+OCR_LANG = os.getenv("OCR_LANG", "ara+eng")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) # 0 = عملية لكل نواة
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", "ocr_cache.db")
+# فلترة الصور قبل OCR: الحجم بالبايت (من Content-Length أو المحتوى) والأبعاد بعد قراءة ترويسة الصورة
+OCR_MIN_IMAGE_BYTES = int(os.getenv("OCR_MIN_IMAGE_BYTES", str(2 * 1024))) # الأيقونات والفواصل
+OCR_MAX_IMAGE_BYTES = int(os.getenv("OCR_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+OCR_MIN_IMAGE_DIMENSION = int(os.getenv("OCR_MIN_IMAGE_DIMENSION", "50"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_results (
+    image_hash TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (image_hash, lang)
+);
+"""
+
+def image_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def image_too_small(width, height, min_dimension=OCR_MIN_IMAGE_DIMENSION):
+    # نفس شرط السمات width/height في HTML: الصورة صغيرة إذا كان البعدان معاً أصغر من الحد
+    return width < min_dimension and height < min_dimension
+
+def passes_size_filter(size, min_bytes=OCR_MIN_IMAGE_BYTES, max_bytes=OCR_MAX_IMAGE_BYTES):
+    return min_bytes <= size <= max_bytes
+
+def passes_dimension_filter(image_bytes, min_dimension=OCR_MIN_IMAGE_DIMENSION):
+    """
+    يقرأ ترويسة الصورة فقط (Image.open كسول لا يفك البكسلات) للحصول على الأبعاد الحقيقية.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+    except Exception:
+        return False # ليست صورة يمكن قراءتها
+    return not image_too_small(width, height, min_dimension)
+
+
+class TesseractUnavailable(RuntimeError):
+    # بديل قابل للنقل بين العمليات لـ TesseractNotFoundError (لا تُحفظ نتيجته في الذاكرة)
+    pass
+
+
+# --- داخل عمليات المجمع ---
+def init_ocr_worker(tesseract_cmd):
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+def ocr_image_bytes(image_bytes, lang=OCR_LANG):
+    """
+    النص الفارغ فقط لصورة لا يمكن فك ترميزها (نتيجة نهائية تُحفظ في الذاكرة).
+    أخطاء Tesseract (غير موجود، حزمة لغة ناقصة، انهيار) تُرفع ولا تُحفظ، فتُعاد محاولة الصورة بعد إصلاح البيئة.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+    except UnidentifiedImageError:
+        return "" # ليست صورة أو بصيغة غير مدعومة
+    # تحويل الصورة إلى وضع تدرج رمادي لتحسين OCR
+    image = image.convert('L')
+    try:
+        return pytesseract.image_to_string(image, lang=lang).strip()
+    except pytesseract.TesseractNotFoundError:
+        raise TesseractUnavailable("خطأ: Tesseract OCR غير موجود. تأكد من تثبيته وإضافته إلى PATH.")
+
+
+class OcrPool:
+    """
+    يستقبل محتوى الصور من خيوط الزاحف ويوزع OCR على عمليات منفصلة (Tesseract يستخدم نواة واحدة لكل صورة).
+    النتيجة تُحفظ على القرص بمفتاح SHA-256 للمحتوى، فالصورة نفسها من روابط مختلفة أو في زحف لاحق تُقرأ مرة واحدة.
+    """
+    def __init__(self, workers=OCR_WORKERS, cache_path=OCR_CACHE_DB, lang=OCR_LANG, tesseract_cmd=TESSERACT_CMD):
+        self.lang = lang
+        self.cache_hits = 0
+        self.recognized = 0
+        self._in_flight = {} # بصمة ← Future، حتى لا تُرسل نفس الصورة مرتين في نفس الوقت
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(), initializer=init_ocr_worker, initargs=(tesseract_cmd,)
+        )
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def _get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT text FROM ocr_results WHERE image_hash = ? AND lang = ?", (key, self.lang)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _put(self, key, text):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ocr_results (image_hash, lang, text, created_at) VALUES (?, ?, ?, ?)",
+                (key, self.lang, text, time.time()),
+            )
+
+    def submit(self, image_bytes, key=None):
+        """
+        يعيد Future بنص الصورة: من الذاكرة مباشرة، أو من OCR جارٍ لنفس المحتوى، أو من مهمة جديدة في المجمع.
+        """
+        key = key or image_hash(image_bytes)
+        cached_text = self._get(key)
+        if cached_text is not None:
+            with self._lock:
+                self.cache_hits += 1
+            future = Future()
+            future.set_result(cached_text)
+            return future
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(ocr_image_bytes, image_bytes, self.lang)
+            self._in_flight[key] = future
+
+        def on_done(done_future):
+            # الفشل (خطأ Tesseract أو انهيار عملية) لا يُحفظ، فتُعاد محاولة الصورة لاحقاً
+            succeeded = not done_future.cancelled() and done_future.exception() is None
+            if succeeded:
+                # النص الفارغ يُحفظ أيضاً: صورة بلا نص (أو لا يمكن فك ترميزها) لا تستحق OCR مرة أخرى
+                self._put(key, done_future.result())
+            # الحذف بعد الحفظ، حتى يجد أي طلب لاحق للبصمة نفسها النتيجة في الذاكرة
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if succeeded:
+                    self.recognized += 1
+
+        future.add_done_callback(on_done)
+        return future
+
+    def stats(self):
+        return {"cache_hits": self.cache_hits, "recognized": self.recognized}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,79 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from arabic_text import normalize_arabic
+
+# --- ذاكرة مؤقتة (LRU) لتضمينات الاستعلامات وأفضل تطابق FAQ لكل استعلام ---
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "4096"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+CachedQuery = namedtuple("CachedQuery", ["embedding", "doc", "score", "lexical_match"], defaults=(False,))
+
+def _estimate_entry_size(key, entry):
+    # التضمين مخزن كمصفوفة float32 (4 بايت لكل بُعد) بدلاً من قائمة Python (~32 بايت لكل عنصر)
+    size = len(key.encode("utf-8")) + entry.embedding.nbytes
+    if entry.doc is not None:
+        size += len(entry.doc.page_content.encode("utf-8"))
+        size += len(str(entry.doc.metadata.get("answer", "")).encode("utf-8"))
+    return size
+
+class QueryCache:
+    """
+    ذاكرة LRU آمنة للاستخدام من عدة خيوط (جلسات Streamlit)، مفتاحها الاستعلام بعد التوحيد.
+    """
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        key = normalize_arabic(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, query, embedding, doc=None, score=float("inf"), lexical_match=False):
+        key = normalize_arabic(query)
+        entry = CachedQuery(np.asarray(embedding, dtype=np.float32), doc, score, lexical_match)
+        size = _estimate_entry_size(key, entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = entry
+            self._sizes[key] = size
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(evicted_key)
+
+    def invalidate(self):
+        # تُستدعى عند إعادة تحميل فهرس الـ FAQ لأن التطابقات المخزنة لم تعد صالحة
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,159 +1,124 @@
+import argparse
+import threading
+from urllib.parse import urljoin
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-import urllib3
-import pytesseract
-from PIL import Image
-import io
-import os
-import time
-from tqdm import tqdm # لاستخدام شريط التقدم
-
-# --- إعداد Tesseract OCR في بايثون (تأكد من تعديل هذا المسار) ---
-pytesseract.pytesseract.tesseract_cmd = r'C:\Users\ALWAFER\AppData\Local\Programs\Tesseract-OCR\tesseract.exe' 
-
-# إخفاء تحذير InsecureRequestWarning عند تعطيل التحقق من SSL
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# قائمة لتخزين جميع الفقرات النصية المستخلصة
-all_extracted_ocr_texts = []
-# مجموعة لتتبع الروابط التي تمت زيارتها لتجنب التكرار في الزحف
-visited_urls_ocr = set() # اسم مختلف لتجنب التداخل مع سكربت آخر إذا تم تشغيلهما بالتوازي
-# مجموعة لتتبع صور تم معالجتها بـ OCR لتجنب تكرار معالجة نفس الصورة
+
+from crawler import (
+    Crawler, CrawlCheckpoint, HtmlExtractor, add_crawler_arguments, append_from_args, checkpoint_from_args, crawler_from_args,
+)
+from ocr_pool import (
+    OCR_CACHE_DB, OCR_MAX_IMAGE_BYTES, OCR_MIN_IMAGE_DIMENSION, OCR_WORKERS, OcrPool, TesseractUnavailable,
+    image_hash, image_too_small, passes_dimension_filter, passes_size_filter,
+)
+
+# مجموعة لتتبع صور تم معالجتها بـ OCR لتجنب تكرار معالجة نفس الصورة (بالرابط وببصمة المحتوى)
 processed_image_urls = set()
-# قائمة انتظار للزحف (URL, depth)
-crawl_queue_ocr = []
+processed_image_hashes = set()
+processed_images_lock = threading.Lock() # الصفحات تُعالج في عدة خيوط
 
-def extract_text_from_image(image_url):
+def html_dimension(img_tag, attribute):
+    try:
+        return int(img_tag.get(attribute))
+    except (TypeError, ValueError):
+        return None
+
+def load_image_for_ocr(crawler, image_url):
     """
-    يقوم بتحميل صورة من عنوان URL ويستخلص النص منها باستخدام Tesseract OCR.
+    يحمّل الصورة (عبر جلسة الزاحف المشتركة) ويعيد (المحتوى، البصمة) إذا كانت تستحق OCR، وإلا None.
+    الفلترة: الحجم من Content-Length قبل التحميل، ثم حجم المحتوى، ثم الأبعاد الحقيقية من ترويسة الصورة.
     """
-    if image_url in processed_image_urls: # تجنب معالجة نفس الصورة
-        return ""
-    processed_image_urls.add(image_url)
+    with processed_images_lock:
+        if image_url in processed_image_urls: # تجنب معالجة نفس الصورة
+            return None
+        processed_image_urls.add(image_url)
 
     try:
-        img_response = requests.get(image_url, stream=True, timeout=10, verify=False)
-        img_response.raise_for_status()
-        image = Image.open(io.BytesIO(img_response.content))
-        
-        # تحويل الصورة إلى وضع تدرج رمادي لتحسين OCR
-        image = image.convert('L') 
-        
-        text = pytesseract.image_to_string(image, lang='ara+eng')
-        
-        return text.strip()
-    except requests.exceptions.RequestException as e:
-        # print(f"خطأ في تحميل الصورة {image_url}: {e}")
-        return ""
-    except pytesseract.TesseractNotFoundError:
-        print("خطأ: Tesseract OCR غير موجود. تأكد من تثبيته وإضافته إلى PATH.")
-        return ""
-    except Exception as e:
-        # print(f"حدث خطأ أثناء معالجة الصورة {image_url}: {e}")
-        return ""
-
-def scrape_single_page_with_ocr(url):
+        image_bytes = crawler.fetch(image_url, max_bytes=OCR_MAX_IMAGE_BYTES).content
+    except requests.exceptions.RequestException:
+        return None # فشل تحميل الصورة
+    if not passes_size_filter(len(image_bytes)):
+        return None
+
+    key = image_hash(image_bytes)
+    with processed_images_lock:
+        if key in processed_image_hashes: # نفس الصورة من رابط آخر
+            return None
+        processed_image_hashes.add(key)
+
+    if not passes_dimension_filter(image_bytes):
+        return None
+    return image_bytes, key
+
+
+class OcrExtractor(HtmlExtractor):
     """
-    يقوم بجمع الفقرات النصية من HTML والنصوص من الصور من صفحة ويب واحدة.
+    وضع HTML + OCR: نفس روابط ونصوص وضع HTML، مع النصوص المستخلصة من صور الصفحة.
+    خيط الزاحف يحمّل الصور ويفلترها فقط، و OCR نفسه يتم في مجمع العمليات (OcrPool).
     """
-    if url in visited_urls_ocr:
-        return [] # تم زيارة هذه الصفحة من قبل
-
-    visited_urls_ocr.add(url)
+    def __init__(self, ocr_pool=None):
+        self.ocr_pool = ocr_pool or OcrPool()
 
-    page_texts_raw = []
-    new_links_to_crawl = []
+    def extract_texts(self, crawler, soup, page_url):
+        page_texts_raw = super().extract_texts(crawler, soup, page_url)
 
-    try:
-        response = requests.get(url, timeout=15, verify=False) 
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # استخلاص الروابط لمتابعة الزحف
-        for link_tag in soup.find_all('a', href=True):
-            href = link_tag.get('href')
-            if href and not href.startswith('#'):
-                full_url = urljoin(url, href)
-                if urlparse(full_url).netloc == urlparse(url).netloc:
-                    new_links_to_crawl.append(full_url)
-
-        # استخلاص الفقرات النصية العادية من HTML
-        for paragraph_tag in soup.find_all('p'):
-            text = paragraph_tag.get_text(strip=True)
-            if text:
-                page_texts_raw.append(text)
-
-        # استخلاص النصوص من الصور باستخدام OCR
+        # إرسال كل صور الصفحة إلى مجمع OCR أولاً، ثم جمع النتائج بالترتيب
+        pending_ocr = []
         for img_tag in soup.find_all('img'):
             img_src = img_tag.get('src')
             if img_src:
-                full_img_url = urljoin(url, img_src)
-                # فلترة الصور الصغيرة جدًا أو الأيقونات لتجنب OCR غير الضروري
-                # يمكنك تعديل هذه الشروط بناءً على تحليل موقعك
-                if img_tag.get('width') and int(img_tag['width']) < 50 and img_tag.get('height') and int(img_tag['height']) < 50:
+                full_img_url = urljoin(page_url, img_src)
+                # فلترة الصور الصغيرة جدًا أو الأيقونات من سمات HTML قبل التحميل
+                width, height = html_dimension(img_tag, 'width'), html_dimension(img_tag, 'height')
+                if width is not None and height is not None and image_too_small(width, height, OCR_MIN_IMAGE_DIMENSION):
                     continue # تخطي الصور الصغيرة جداً
-                
-                extracted_img_text = extract_text_from_image(full_img_url)
-                if extracted_img_text:
-                    page_texts_raw.append(extracted_img_text)
-                    # print(f"  - تم استخلاص نص من صورة: {full_img_url[:60]}...") 
-
-        return new_links_to_crawl, page_texts_raw # ارجاع الروابط والنصوص الخام
-
-    except requests.exceptions.Timeout:
-        # print(f"انتهت مهلة الاتصال عند {url}")
-        pass
-    except requests.exceptions.RequestException as e:
-        # print(f"حدث خطأ أثناء الاتصال بالخادم عند {url}: {e}")
-        pass
-    except Exception as e:
-        # print(f"حدث خطأ غير متوقع عند {url}: {e}")
-        pass
-    return [], []
-
-def crawl_ocr_website(start_urls, max_depth=3, output_file="university_texts_with_ocr.txt"):
-    global crawl_queue_ocr, visited_urls_ocr, all_extracted_ocr_texts, processed_image_urls # للوصول للمتغيرات العالمية
-
-    # إعادة تهيئة في حال تم التشغيل أكثر من مرة
-    crawl_queue_ocr = [(url, 0) for url in start_urls if url not in visited_urls_ocr]
-    visited_urls_ocr.clear() 
-    all_extracted_ocr_texts.clear()
-    processed_image_urls.clear()
 
-    initial_queue_size = len(crawl_queue_ocr)
-    
-    print("\nبدء عملية الزحف واستخلاص النصوص من HTML والصور (OCR)...")
+                image = load_image_for_ocr(crawler, full_img_url)
+                if image is not None:
+                    image_bytes, key = image
+                    pending_ocr.append(self.ocr_pool.submit(image_bytes, key))
 
-    with tqdm(total=initial_queue_size, unit="صفحة", desc="الزحف ومعالجة الصور") as pbar:
-        while crawl_queue_ocr:
-            current_url, current_depth = crawl_queue_ocr.pop(0)
-
-            if current_url in visited_urls_ocr:
-                pbar.update(1)
+        for future in pending_ocr:
+            try:
+                extracted_img_text = future.result()
+            except TesseractUnavailable as e:
+                print(e)
                 continue
+            except Exception:
+                continue # فشل OCR لهذه الصورة (لا يُحفظ في الذاكرة، فتُعاد محاولتها في الزحف التالي)
+            if extracted_img_text:
+                page_texts_raw.append(extracted_img_text)
 
-            links_from_page, texts_from_page = scrape_single_page_with_ocr(current_url)
-            all_extracted_ocr_texts.extend(texts_from_page)
-            
-            pbar.update(1)
-            pbar.set_postfix_str(f"فقرات OCR مجمعة: {len(all_extracted_ocr_texts)}")
+        return page_texts_raw
 
 
-            if current_depth < max_depth:
-                for link in links_from_page:
-                    if link not in visited_urls_ocr and (link, current_depth + 1) not in crawl_queue_ocr:
-                        crawl_queue_ocr.append((link, current_depth + 1))
-                        pbar.total += 1
-                        pbar.refresh()
+def crawl_ocr_website(start_urls, max_depth=3, output_file="university_texts_with_ocr.txt", crawler=None, checkpoint=None,
+                      append=False):
+    # نفس محرك الزحف المشترك في وضع HTML + OCR
+    crawler = crawler or Crawler(OcrExtractor(), max_depth=max_depth)
+    ocr_pool = crawler.extractor.ocr_pool
+    # النصوص تُكتب فور وصولها، وحالة الزحف تُحفظ دورياً للاستئناف بعد أي انقطاع
+    checkpoint = checkpoint or CrawlCheckpoint(output_file + ".checkpoint.json")
+    processed_image_urls.clear()
+    processed_image_hashes.clear()
+    texts_count = 0
 
-    print("\nعملية الزحف واستخلاص النصوص من الصور انتهت!")
-    print(f"تم جمع {len(all_extracted_ocr_texts)} فقرة نصية (من HTML و OCR).")
+    print("\nبدء عملية الزحف واستخلاص النصوص من HTML والصور (OCR)...")
+    if checkpoint.load() is not None:
+        print(f"استئناف الزحف من نقطة الحفظ: {checkpoint.path}")
+    try:
+        with checkpoint.open_output(output_file, append=append) as f:
+            for _, texts_from_page, _ in crawler.crawl(start_urls, desc="الزحف ومعالجة الصور", checkpoint=checkpoint):
+                for text_item in texts_from_page:
+                    f.write(text_item + "\n")
+                texts_count += len(texts_from_page)
+    finally:
+        crawler.close()
+        ocr_pool.close()
 
-    # حفظ جميع الفقرات المستخلصة في ملف
-    with open(output_file, "w", encoding="utf-8") as f:
-        for text_item in all_extracted_ocr_texts:
-            f.write(text_item + "\n")
+    print("\nعملية الزحف واستخلاص النصوص من الصور انتهت!")
+    print(f"تمت زيارة {crawler.pages_crawled} صفحة (بدون تغيير: {crawler.unchanged_pages}، فشل تحميل {crawler.failed_urls}).")
+    print(f"تم جمع {texts_count} فقرة نصية (من HTML و OCR) في هذا التشغيل.")
+    print(f"OCR: {ocr_pool.recognized} صورة جديدة، {ocr_pool.cache_hits} من ذاكرة النتائج.")
     print(f"تم حفظ نصوص OCR الخام في الملف: {output_file}")
 
 
@@ -177,5 +142,13 @@ initial_urls_for_ocr_crawl = [
 
 # --- كيفية الاستخدام (تشغيل السكربت) ---
 if __name__ == "__main__":
-    output_ocr_file = "university_texts_with_ocr.txt"
-    crawl_ocr_website(initial_urls_for_ocr_crawl, max_depth=3, output_file=output_ocr_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="جمع نصوص HTML والصور (OCR) من موقع جامعة الشام.")
+    parser.add_argument("--output", default="university_texts_with_ocr.txt", help="ملف النصوص الخام.")
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS, help="عدد عمليات OCR (0 = عملية لكل نواة).")
+    parser.add_argument("--ocr-cache", default=OCR_CACHE_DB, help="ملف ذاكرة نتائج OCR (مفتاحها SHA-256 للصورة).")
+    add_crawler_arguments(parser)
+    args = parser.parse_args()
+    ocr_extractor = OcrExtractor(OcrPool(args.ocr_workers, args.ocr_cache))
+    crawl_ocr_website(initial_urls_for_ocr_crawl, max_depth=args.max_depth, output_file=args.output,
+                      crawler=crawler_from_args(args, ocr_extractor), checkpoint=checkpoint_from_args(args, args.output),
+                      append=append_from_args(args))
@@ -0,0 +1,205 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+
+import faiss
+import numpy as np
+
+# --- ذاكرة دلالية دائمة لإجابات طبقات البحث على الويب والذكاء الاصطناعي التوليدي ---
+# سؤال جديد قريب بما يكفي من سؤال سبقت الإجابة عنه يحصل على نفس الإجابة دون طلب Serper أو Gemini جديد.
+SEMANTIC_CACHE_DB = os.getenv("SEMANTIC_CACHE_DB", "semantic_answer_cache.db")
+SEMANTIC_CACHE_DISTANCE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_DISTANCE_THRESHOLD", "0.1"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+# التغييرات تُكتب إلى القرص دفعة واحدة من خيط في الخلفية كل هذه المدة (وعند الإغلاق)، لا في مسار الطلب؛
+# الإجابة الجديدة تصبح قابلة للبحث بعد كتابتها (0 = كتابة فورية داخل add)
+SEMANTIC_CACHE_FLUSH_SECONDS = float(os.getenv("SEMANTIC_CACHE_FLUSH_SECONDS", "5"))
+# مصادر الإجابات التي تستحق التخزين (الإجابات الخاطئة "error" لا تُخزن)
+SEMANTIC_CACHE_SOURCES = ("web_search_answer_box", "web_search_summary", "llm")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_name TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    source TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+CachedAnswer = namedtuple("CachedAnswer", ["question", "answer", "source", "timestamp", "distance"])
+CacheEntry = namedtuple("CacheEntry", ["question", "answer", "source", "created_at"])
+
+class SemanticAnswerCache:
+    """
+    فهرس FAISS صغير في الذاكرة (IndexIDMap2 بمعرّفات ثابتة) لأسئلة أجابت عنها الطبقات الاحتياطية،
+    والإجابة والمصدر والتضمين محفوظة في SQLite (بدون pickle)، ويُعاد بناء الفهرس منها عند التشغيل.
+    تنتهي صلاحية المدخلات بعد TTL، ويُحذف الأقل استخداماً عند تجاوز الحد الأقصى؛ كلاهما من بداية
+    قوائم مرتبة، فلا يمر الحذف على كل المدخلات.
+    معرّفات المدخلات تُسندها SQLite (AUTOINCREMENT) عند الكتابة، فعدة عمليات (answer_service.py --processes)
+    تتشارك نفس الملف دون أن تستبدل أو تحذف إحداها مدخلات الأخرى.
+    """
+    def __init__(self, embeddings, model_name, db_path=SEMANTIC_CACHE_DB,
+                 distance_threshold=SEMANTIC_CACHE_DISTANCE_THRESHOLD, ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES, flush_interval=SEMANTIC_CACHE_FLUSH_SECONDS):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.distance_threshold = distance_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.index = None # يُنشأ عند أول تضمين (البُعد غير معروف قبله)
+        self._entries = {} # معرّف المدخل -> CacheEntry
+        self._created = OrderedDict() # بترتيب الإنشاء (لانتهاء الصلاحية)
+        self._last_used = OrderedDict() # بترتيب آخر استخدام (لترتيب LRU)
+        # تغييرات لم تُكتب بعد إلى القرص
+        self._pending_inserts = []
+        self._pending_touches = {}
+        self._pending_deletes = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+        self._load()
+
+        self._stop_flusher = threading.Event()
+        if self.flush_interval > 0:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _load(self):
+        with self._flush_lock, self._connection:
+            # تضمينات نموذج آخر غير قابلة للمقارنة
+            self._connection.execute("DELETE FROM entries WHERE model_name != ?", (self.model_name,))
+            rows = self._connection.execute(
+                "SELECT entry_id, question, answer, source, embedding, created_at, last_used FROM entries "
+                "WHERE model_name = ? ORDER BY created_at", (self.model_name,)
+            ).fetchall()
+        if not rows:
+            return
+        entry_ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        vectors = np.frombuffer(b"".join(row[4] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+        self.index.add_with_ids(vectors, entry_ids)
+        for entry_id, question, answer, source, _, created_at, _ in rows:
+            self._entries[entry_id] = CacheEntry(question, answer, source, created_at)
+            self._created[entry_id] = created_at
+        for entry_id, last_used in sorted(((row[0], row[6]) for row in rows), key=lambda item: item[1]):
+            self._last_used[entry_id] = last_used
+        with self._lock:
+            self._evict(time.time())
+
+    # --- الحذف (يُستدعى والقفل مأخوذ) ---
+    def _delete(self, entry_ids):
+        if not entry_ids:
+            return
+        self.index.remove_ids(np.asarray(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            del self._entries[entry_id]
+            del self._created[entry_id]
+            del self._last_used[entry_id]
+            self._pending_touches.pop(entry_id, None)
+            self._pending_deletes.add(entry_id)
+
+    def _evict(self, now):
+        expired_ids = []
+        for entry_id, created_at in self._created.items():
+            if now - created_at <= self.ttl_seconds:
+                break
+            expired_ids.append(entry_id)
+        self._delete(expired_ids)
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            self._delete([entry_id for entry_id, _ in zip(self._last_used, range(overflow))])
+
+    def lookup(self, query_embedding):
+        """
+        يعيد CachedAnswer لأقرب سؤال مخزن إذا كانت مسافته ضمن العتبة وما زال صالحاً، وإلا None.
+        """
+        with self._lock:
+            if self.index is None or not self._entries:
+                return None
+            distances, ids = self.index.search(np.asarray([query_embedding], dtype=np.float32), 1)
+            entry_id, distance = int(ids[0][0]), float(distances[0][0])
+            if entry_id == -1 or distance > self.distance_threshold:
+                return None
+            now = time.time()
+            entry = self._entries[entry_id]
+            if now - entry.created_at > self.ttl_seconds:
+                self._evict(now)
+                return None
+            self._last_used[entry_id] = now
+            self._last_used.move_to_end(entry_id)
+            self._pending_touches[entry_id] = now
+            return CachedAnswer(entry.question, entry.answer, entry.source, entry.created_at, distance)
+
+    def add(self, query_embedding, question, answer, source):
+        if source not in SEMANTIC_CACHE_SOURCES or not answer:
+            return
+        vector = np.asarray([query_embedding], dtype=np.float32)
+        with self._lock:
+            self._pending_inserts.append((vector, question, answer, source, time.time()))
+        if self.flush_interval <= 0:
+            self.flush()
+
+    # --- الكتابة إلى القرص في الخلفية ---
+    def flush(self):
+        """
+        يكتب كل التغييرات المعلقة في معاملة SQLite واحدة، ثم يضيف الإجابات الجديدة إلى الفهرس
+        بالمعرّفات التي أسندتها SQLite (lastrowid).
+        """
+        with self._flush_lock:
+            with self._lock:
+                inserts = self._pending_inserts
+                touches = [(last_used, entry_id) for entry_id, last_used in self._pending_touches.items()]
+                deletes = [(entry_id,) for entry_id in self._pending_deletes]
+                self._pending_inserts = []
+                self._pending_touches.clear()
+                self._pending_deletes.clear()
+            if not (inserts or touches or deletes):
+                return
+            entry_ids = []
+            with self._connection:
+                for vector, question, answer, source, created_at in inserts:
+                    cursor = self._connection.execute(
+                        "INSERT INTO entries (model_name, question, answer, source, embedding, created_at, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (self.model_name, question, answer, source, vector.tobytes(), created_at, created_at),
+                    )
+                    entry_ids.append(cursor.lastrowid)
+                self._connection.executemany("UPDATE entries SET last_used = ? WHERE entry_id = ?", touches)
+                self._connection.executemany("DELETE FROM entries WHERE entry_id = ?", deletes)
+            if not inserts:
+                return
+            with self._lock:
+                if self.index is None:
+                    self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(inserts[0][0].shape[1]))
+                self.index.add_with_ids(np.concatenate([insert[0] for insert in inserts]), np.asarray(entry_ids, dtype=np.int64))
+                for entry_id, (_, question, answer, source, created_at) in zip(entry_ids, inserts):
+                    self._entries[entry_id] = CacheEntry(question, answer, source, created_at)
+                    self._created[entry_id] = created_at
+                    self._last_used[entry_id] = created_at
+                # الحذف الناتج يُكتب في الدفعة التالية
+                self._evict(time.time())
+
+    def _flush_loop(self):
+        while not self._stop_flusher.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ تعذر حفظ الذاكرة الدلالية: {e}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        self._stop_flusher.set()
+        self.flush()
+        with self._flush_lock:
+            self._connection.close()
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+
+from arabic_text import normalize_arabic
+
+# --- ذاكرة دائمة على القرص لنتائج Google Serper (SQLite) ---
+SERPER_CACHE_DB = os.getenv("SERPER_CACHE_DB", "serper_cache.db")
+SERPER_CACHE_TTL_SECONDS = int(os.getenv("SERPER_CACHE_TTL_SECONDS", str(24 * 3600)))
+# بعد انتهاء الـ TTL تبقى النتيجة صالحة للعرض (قديمة) خلال هذه المدة بينما تُحدَّث في الخلفية
+SERPER_CACHE_STALE_SECONDS = int(os.getenv("SERPER_CACHE_STALE_SECONDS", str(7 * 24 * 3600)))
+SERPER_CACHE_MAX_BYTES = int(os.getenv("SERPER_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    response TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+"""
+
+class CachedSerperSearch:
+    """
+    غلاف حول GoogleSerperAPIWrapper (أو أي كائن بنفس الواجهة results/aresults) يخزن النتائج الخام على القرص.
+    المفتاح: الاستعلام بعد التوحيد مع إعدادات gl و hl و k.
+    """
+    def __init__(self, serper_search, db_path=SERPER_CACHE_DB, ttl_seconds=SERPER_CACHE_TTL_SECONDS,
+                 stale_seconds=SERPER_CACHE_STALE_SECONDS, max_bytes=SERPER_CACHE_MAX_BYTES):
+        self.serper_search = serper_search
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._refreshing = set() # مفاتيح قيد التحديث في الخلفية
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def cache_key(self, query):
+        settings = (
+            getattr(self.serper_search, "gl", ""),
+            getattr(self.serper_search, "hl", ""),
+            getattr(self.serper_search, "k", ""),
+        )
+        raw_key = "|".join(str(value) for value in settings) + "|" + normalize_arabic(query)
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    # --- التخزين ---
+    def _get(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT response, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                with self._connection:
+                    self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        if not row:
+            return None, None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def _put(self, key, query, response):
+        payload = json.dumps(response, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, query, response, fetched_at, last_access, size) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, payload, now, now, size),
+            )
+            self._evict()
+
+    def _evict(self):
+        # حذف النتائج المنتهية تماماً، ثم الأقل استخداماً حتى يعود الحجم تحت الحد
+        self._connection.execute(
+            "DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.ttl_seconds - self.stale_seconds,)
+        )
+        total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        freed = 0
+        evicted_keys = []
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if total_bytes - freed <= self.max_bytes:
+                break
+            evicted_keys.append((key,))
+            freed += size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+
+    # --- التحديث في الخلفية (stale-while-revalidate) ---
+    def _refresh_in_background(self, key, query):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._put(key, query, self.serper_search.results(query))
+            except Exception:
+                pass # نحتفظ بالنتيجة القديمة حتى المحاولة التالية
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _lookup(self, key, query):
+        response, age = self._get(key)
+        if response is None or age > self.ttl_seconds + self.stale_seconds:
+            self.misses += 1
+            return None
+        if age > self.ttl_seconds:
+            self.stale_hits += 1
+            self._refresh_in_background(key, query)
+        else:
+            self.hits += 1
+        return response
+
+    # --- نفس واجهة GoogleSerperAPIWrapper ---
+    def results(self, query):
+        key = self.cache_key(query)
+        response = self._lookup(key, query)
+        if response is None:
+            response = self.serper_search.results(query)
+            self._put(key, query, response)
+        return response
+
+    async def aresults(self, query):
+        key = self.cache_key(query)
+        response = await asyncio.to_thread(self._lookup, key, query)
+        if response is None:
+            response = await self.serper_search.aresults(query)
+            await asyncio.to_thread(self._put, key, query, response)
+        return response
+
+    def stats(self):
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class StubSerperSearch:
+    """
+    بديل محلي لـ GoogleSerperAPIWrapper للاختبارات: يعيد ردوداً محددة مسبقاً دون اتصال بالشبكة ويعدّ الطلبات.
+    responses: قاموس من الاستعلام إلى الرد الخام، أو دالة تستقبل الاستعلام وتعيد الرد.
+    """
+    def __init__(self, responses=None, gl="sa", hl="ar", k=3):
+        self.responses = responses or {}
+        self.gl = gl
+        self.hl = hl
+        self.k = k
+        self.calls = []
+
+    def results(self, query):
+        self.calls.append(query)
+        if callable(self.responses):
+            return self.responses(query)
+        return self.responses.get(query, {"organic": []})
+
+    async def aresults(self, query):
+        return self.results(query)
@@ -1,26 +1,18 @@
 import streamlit as st
-import os
-import json 
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI 
-from langchain_core.prompts import ChatPromptTemplate 
-from langchain_core.output_parsers import StrOutputParser
+import atexit
+import itertools
+import uuid
 import time 
 
-# استيراد أدوات البحث
-from langchain_community.tools import tool
-from langchain_community.utilities import GoogleSerperAPIWrapper # أداة البحث في جوجل Serper
-
 # --- استيراد مكتبة dotenv لتحميل المتغيرات من ملف .env ---
 from dotenv import load_dotenv
 
 # --- تحميل المتغيرات من ملف .env (يجب أن تكون في بداية الكود) ---
 load_dotenv()
 
-
-# --- تعريف عتبة المسافة لأسئلة الـ FAQ ---
-FAQ_DISTANCE_THRESHOLD = 0.2 
+# وحدات المشروع تقرأ إعداداتها من متغيرات البيئة، لذا تُستورد بعد load_dotenv
+from chat_history_store import ChatHistoryStore, CHAT_HISTORY_DB
+from answer_client import ANSWER_SERVICE_URL, AnswerServiceClient
 
 
 # --- إعدادات صفحة Streamlit (يجب أن تكون في البداية) ---
@@ -238,23 +230,43 @@ st.markdown(
 )
 
 
-# --- اسم ملف سجل المحادثات الدائم ---
+# --- ملف سجل المحادثات القديم (يُرحّل مرة واحدة إلى مخزن SQLite) ---
 CHAT_HISTORY_FILE = "chat_history.json"
 
-# --- دالة لتحميل سجل المحادثات من الملف ---
-def load_chat_history():
-    if os.path.exists(CHAT_HISTORY_FILE):
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError: 
-                return []
-    return []
-
-# --- دالة لحفظ سجل المحادثات في الملف ---
-def save_chat_history(history):
-    with open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(history, f, ensure_ascii=False, indent=4)
+# --- مخزن سجل المحادثات الدائم (مشترك بين جميع الجلسات) ---
+@st.cache_resource
+def load_chat_history_store():
+    store = ChatHistoryStore(CHAT_HISTORY_DB)
+    store.migrate_from_json(CHAT_HISTORY_FILE)
+    atexit.register(store.close)
+    return store
+
+chat_history_store = load_chat_history_store()
+
+# --- معرّف الجلسة الحالية لفهرسة رسائلها في المخزن ---
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# --- حدود العرض والذاكرة لسجل المحادثات ---
+CHAT_WINDOW_SIZE = 30 # عدد الرسائل المعروضة في المحادثة الرئيسية لكل صفحة
+MAX_SESSION_MESSAGES = 60 # الحد الأقصى للرسائل المحفوظة في st.session_state (الأقدم تبقى في المخزن فقط)
+HISTORY_PAGE_SIZE = 20 # عدد الرسائل في كل صفحة من السجل الكامل في الشريط الجانبي
+
+# --- دالة لتحميل سجل المحادثات من المخزن (أحدث رسائل الجلسة الحالية فقط، كما في "تحميل رسائل أقدم") ---
+def load_chat_history(limit=MAX_SESSION_MESSAGES):
+    return chat_history_store.recent(limit=limit, session_id=st.session_state.session_id)
+
+def trim_session_messages():
+    # الرسائل الأقدم محفوظة مسبقاً في المخزن، لذا يكفي حذفها من الذاكرة
+    overflow = len(st.session_state.messages) - MAX_SESSION_MESSAGES
+    if overflow > 0:
+        del st.session_state.messages[:overflow]
+
+# --- دالة لإضافة رسائل جديدة إلى السجل (إضافة فقط، بدون إعادة كتابة السجل) ---
+def append_chat_history(*messages):
+    chat_history_store.append_many(
+        [(st.session_state.session_id, msg["role"], msg["content"], msg.get("timestamp")) for msg in messages]
+    )
 
 # --- تهيئة سجل المحادثات في Streamlit's session_state ---
 if "messages" not in st.session_state:
@@ -300,11 +312,16 @@ with st.sidebar:
         st.session_state.messages.append(
             {"role": "assistant", "content": "أهلاً بك! أنا شات بوت جامعة الشام. كيف يمكنني مساعدتك اليوم؟", "timestamp": time.time()} 
         )
+        # محادثة جديدة = جلسة جديدة في المخزن، حتى لا تظهر رسائل المحادثة السابقة عند تحميل الأقدم
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state.chat_window_pages = 1
         st.rerun() 
 
     if st.button("🗑️ مسح جميع المحادثات (دائم)", help="مسح سجل المحادثات بالكامل من الذاكرة والملف بشكل دائم.", key="clear_all_chats_button"):
         st.session_state.messages = [] 
-        save_chat_history([]) 
+        chat_history_store.clear() 
+        st.session_state.chat_window_pages = 1
+        st.session_state.history_pages = 1
         st.rerun() 
 
     st.markdown("---")
@@ -317,8 +334,15 @@ with st.sidebar:
         st.session_state.show_history_expanded = not st.session_state.show_history_expanded
 
     if st.session_state.show_history_expanded:
+        if "history_pages" not in st.session_state:
+            st.session_state.history_pages = 1
         with st.expander("السجل الكامل للمحادثات", expanded=True):
-            full_history_data = load_chat_history()
+            # نعرض آخر الصفحات المطلوبة فقط عبر استعلام مفهرس بدلاً من تحميل السجل كاملاً
+            full_history_data = chat_history_store.recent(limit=HISTORY_PAGE_SIZE * st.session_state.history_pages)
+            if len(full_history_data) == HISTORY_PAGE_SIZE * st.session_state.history_pages:
+                if st.button("⬆️ تحميل رسائل أقدم", key="load_older_history_button"):
+                    st.session_state.history_pages += 1
+                    st.rerun()
             if full_history_data:
                 for i, msg in enumerate(full_history_data):
                     if "role" in msg and "content" in msg and "timestamp" in msg:
@@ -349,28 +373,39 @@ if len(st.session_state.messages) == 1 and st.session_state.messages[0]["role"]
 
 
 # --- 1. تهيئة الشات بوت والأدوات ---
-qa_vector_db_path = "faiss_university_qa_db" 
+# منطق الإجابة في answer_engine.py؛ الواجهة إما عميل لخدمة الإجابة (ANSWER_SERVICE_URL)
+# أو تشغّل نفس المحرك داخل عملية Streamlit عند عدم تحديد الخدمة
+@st.cache_resource(show_spinner="جاري تحميل محرك الإجابة...")
+def load_answer_backend(service_url, enable_web_search):
+    if service_url:
+        answer_backend = AnswerServiceClient(service_url)
+    else:
+        from answer_engine import AnswerEngine
+        answer_backend = AnswerEngine(enable_web_search=enable_web_search)
+    # الموارد مشتركة بين جميع الجلسات، تُغلق مرة واحدة عند إيقاف العملية
+    atexit.register(answer_backend.close)
+    return answer_backend
+
 try:
-    # model_name = "sentence-transformers/distiluse-base-multilingual-cased-v1"
-    model_name = "asafaya/bert-base-arabic" # نموذج عربي من Hugging Face
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
-    
-    if "GOOGLE_API_KEY" not in st.secrets:
-        st.error("❌ خطأ: متغير البيئة 'GOOGLE_API_KEY' غير موجود في ملف .env أو البيئة. يرجى تعيينه لتشغيل الذكاء الاصطناعي التوليدي.")
-        st.stop()
-    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0) # استخدام نموذج Google Gemini
-    st.success("✔ تم تهيئة نموذج Google Gemini LLM (للذكاء الاصطناعي التوليدي).")
-
-    faq_vector_db = FAISS.load_local(qa_vector_db_path, embeddings, allow_dangerous_deserialization=True)
-    st.success("✔ تم تحميل قاعدة بيانات الأسئلة والأجوبة (FAQ) بنجاح.")
-
-    # --- تهيئة أداة البحث على الويب (Google Serper) ---
-    if "SERPER_API_KEY" not in st.secrets:
-        st.warning("⚠️ تحذير: متغير البيئة 'SERPER_API_KEY' غير موجود. لن يتم تفعيل أداة البحث على الويب.")
-        serper_search = None
+    if ANSWER_SERVICE_URL:
+        answer_backend = load_answer_backend(ANSWER_SERVICE_URL, False)
+        st.success(f"✔ متصل بخدمة الإجابة: {ANSWER_SERVICE_URL}")
     else:
-        serper_search = GoogleSerperAPIWrapper(gl="sa", hl="ar", k=3) # البحث باللغة العربية، أول 3 نتائج
-        st.success("✔ تم تهيئة أداة البحث على الويب (Google Serper).")
+        if "GOOGLE_API_KEY" not in st.secrets:
+            st.error("❌ خطأ: متغير البيئة 'GOOGLE_API_KEY' غير موجود في ملف .env أو البيئة. يرجى تعيينه لتشغيل الذكاء الاصطناعي التوليدي.")
+            st.stop()
+        # --- أداة البحث على الويب (Google Serper) ---
+        web_search_enabled = "SERPER_API_KEY" in st.secrets
+        if not web_search_enabled:
+            st.warning("⚠️ تحذير: متغير البيئة 'SERPER_API_KEY' غير موجود. لن يتم تفعيل أداة البحث على الويب.")
+        answer_backend = load_answer_backend("", web_search_enabled)
+        st.success("✔ تم تهيئة نموذج Google Gemini LLM (للذكاء الاصطناعي التوليدي).")
+        st.success("✔ تم تحميل قاعدة بيانات الأسئلة والأجوبة (FAQ) بنجاح.")
+        if web_search_enabled:
+            st.success("✔ تم تهيئة أداة البحث على الويب (Google Serper).")
+
+    if not answer_backend.embeddings_ready():
+        st.info("⏳ جاري تحميل نموذج التضمين في الخلفية، البحث في الأسئلة الشائعة لفظي مؤقتاً.")
 
 except Exception as e:
     st.error(f"❌ خطأ فادح: لم يتمكن من تحميل قواعد بيانات المعرفة أو تهيئة LLM/الأدوات. يرجى التأكد من أن المسار صحيح وأن المفاتيح API صحيحة. ({e})")
@@ -378,106 +413,86 @@ except Exception as e:
 
 
 # --- 2. دالة البحث عن المعلومات (Multilayered Search) ---
-def get_bot_response(user_question):
-    # المرحلة 1: البحث في قاعدة بيانات الأسئلة والأجوبة (FAQ) الخاصة بنا
-    docs_with_scores = faq_vector_db.similarity_search_with_score(user_question, k=1)
-    
-    best_faq_doc = None
-    best_faq_score = float('inf') 
-    
-    if docs_with_scores:
-        best_faq_doc, best_faq_score = docs_with_scores[0]
-        st.sidebar.markdown(f"**<span style='color:#9cc6e4;'>أفضل مسافة في الـ FAQ:</span> {best_faq_score:.2f}**", unsafe_allow_html=True) 
-        st.sidebar.write(f"DEBUG: أفضل تطابق FAQ (سؤال): '{best_faq_doc.page_content}'") 
-
-    if best_faq_doc and best_faq_score <= FAQ_DISTANCE_THRESHOLD: 
-        if "answer" in best_faq_doc.metadata:
-            st.sidebar.write(f"DEBUG: تم الإجابة من FAQ مباشرة (المسافة: {best_faq_score:.2f} <= {FAQ_DISTANCE_THRESHOLD}).") 
-            return best_faq_doc.metadata["answer"], "faq" 
-        else:
-            st.sidebar.warning("⚠️ تم العثور على سؤال FAQ، لكنه لا يحتوي على إجابة. سيتم اللجوء للبحث على الويب أو LLM.")
-    
-    # المرحلة 2: البحث في المواقع التعريفية للجامعة (عبر Google Serper)
-    # نستخدم أداة بحث الويب للبحث عن معلومات تتعلق بالجامعة
-    # يمكننا تضييق نطاق البحث على نطاق الجامعة (site:shamuniversity.com)
-    # أو تضمين روابط الفيسبوك والتليجرام (ولكن البحث داخلها ليس مباشرا)
-    
-    # نختبر ما إذا كانت الأداة متاحة
-    if serper_search:
-        # بناء استعلام البحث: نركز على نطاق الجامعة أو الأسئلة العامة حول الجامعة
-        search_query_base = f"جامعة الشام {user_question}"
-        # يمكن تحديد نطاقات محددة للبحث:
-        # search_query_site_specific = f"{user_question} site:shamuniversity.com OR site:t.me/InterShamUniv OR site:www.facebook.com/SHAM.UNIV"
-        # لكن البحث داخل التليجرام والفيسبوك مباشرة صعب عبر Serper
-
-        st.sidebar.write(f"DEBUG: لا يوجد تطابق FAQ بثقة عالية. جاري البحث على الويب عن '{search_query_base}'...")
-        try:
-            # استخدام أداة البحث
-            search_results = serper_search.run(search_query_base)
-            if search_results and "answer_box" in search_results and search_results["answer_box"]:
-                answer_from_serper = search_results["answer_box"].get("snippet", search_results["answer_box"].get("answer"))
-                if answer_from_serper:
-                    st.sidebar.write(f"DEBUG: تم العثور على إجابة من Serper (صندوق الإجابة).")
-                    return answer_from_serper, "web_search_answer_box"
-            
-            # إذا لم يكن هناك صندوق إجابة مباشر، حاول تلخيص النتائج العادية
-            if search_results and "snippets" in search_results:
-                relevant_snippets = []
-                for snippet in search_results["snippets"]:
-                    # فلترة النتائج لتكون ذات صلة بالجامعة قدر الإمكان
-                    if "shamuniversity.com" in snippet.get("link", "") or "SHAM.UNIV" in snippet.get("link", ""):
-                        relevant_snippets.append(snippet.get("snippet"))
-                
-                if relevant_snippets:
-                    combined_snippets = "\n".join(relevant_snippets[:3]) # خذ أول 3 مقتطفات ذات صلة
-                    st.sidebar.write(f"DEBUG: جاري تلخيص نتائج البحث من Serper.")
-                    
-                    # استخدام LLM لتلخيص النتائج
-                    summary_prompt = ChatPromptTemplate.from_template(
-                        """
-                        أنت مساعد ذكي. لخص المعلومات التالية للإجابة على السؤال التالي.
-                        إذا كانت المعلومات غير كافية، اذكر ذلك بوضوح.
-                        السؤال: {question}
-                        المعلومات المسترجعة:
-                        {snippets}
-                        
-                        الإجابة الملخصة:
-                        """
-                    )
-                    summary_chain = summary_prompt | llm | StrOutputParser()
-                    summarized_answer = summary_chain.invoke({"question": user_question, "snippets": combined_snippets})
-                    if summarized_answer:
-                        return summarized_answer, "web_search_summary"
-            
-            st.sidebar.write("DEBUG: Serper لم يجد إجابة مباشرة أو مقتطفات كافية. اللجوء إلى LLM.")
-
-        except Exception as serper_e:
-            st.sidebar.error(f"❌ حدث خطأ أثناء البحث على الويب: {serper_e}")
-            st.sidebar.write("DEBUG: حدث خطأ في Serper. اللجوء إلى LLM.")
+SOURCE_INDICATOR_MESSAGES = {
+    "faq": "<p style='font-size: 0.8em; color: #b9955c; margin-bottom: 5px;'><i>(الإجابة من قاعدة بيانات الأسئلة الشائعة 📚)</i></p>",
+    "web_search_answer_box": "<p style='font-size: 0.8em; color: #66CCFF; margin-bottom: 5px;'><i>(الإجابة من بحث الويب 🌐)</i></p>",
+    "web_search_summary": "<p style='font-size: 0.8em; color: #66CCFF; margin-bottom: 5px;'><i>(الإجابة ملخصة من نتائج بحث الويب 🌐)</i></p>",
+    "llm": "<p style='font-size: 0.8em; color: #9cc6e4; margin-bottom: 5px;'><i>(الذكاء الاصطناعي التوليدي قام بالإجابة ✨)</i></p>",
+    "error": "<p style='font-size: 0.8em; color: red; margin-bottom: 5px;'><i>(حدث خطأ أثناء الحصول على الإجابة 🚫)</i></p>",
+}
 
+def get_bot_response(user_question):
+    """
+    يعرض الإجابة داخل فقاعة المساعد الحالية ويعيد (الإجابة، المصدر).
+    خط الإجابة غير المتزامن (محلياً أو عبر خدمة الإجابة) يبحث في الـ FAQ و Serper بالتوازي،
+    وطبقتا التلخيص و LLM تبثان الرموز فور توليدها.
+    """
+    source_indicator = st.empty()
+    events = answer_backend.stream_answer(user_question)
+    with st.spinner("جاري البحث عن الإجابة... من فضلك انتظر ⏳"): 
+        first_event = next(events)
+
+    result_holder = {}
+
+    def handle_event(kind, value):
+        if kind == "source":
+            source_indicator.markdown(SOURCE_INDICATOR_MESSAGES[value], unsafe_allow_html=True)
+        elif kind == "result":
+            result_holder["result"] = value
+        elif kind == "error":
+            raise value
+
+    def token_stream():
+        for kind, value in itertools.chain([first_event], events):
+            if kind == "token":
+                yield value
+            else:
+                handle_event(kind, value)
 
-    # المرحلة 3: اللجوء إلى LLM (الذكاء الاصطناعي العام) كخيار أخير
-    general_llm_prompt = ChatPromptTemplate.from_template(
-        """
-        أنت مساعد ذكي. أجب على السؤال بأسلوب مهذب وواضح.
-        إذا كان السؤال يتعلق بمعلومات محددة جداً لا تعرفها ولم تجدها في مصادر البحث، اذكر بوضوح أنك لا تعرف.
-        لا تحاول اختلاق إجابات.
+    if first_event[0] in ("source", "token"):
+        streamed_text = st.write_stream(token_stream())
+    else:
+        streamed_text = ""
+        for kind, value in itertools.chain([first_event], events):
+            handle_event(kind, value)
+
+    result = result_holder["result"]
+    source_indicator.markdown(SOURCE_INDICATOR_MESSAGES.get(result.source, ""), unsafe_allow_html=True)
+    if streamed_text != result.answer:
+        st.markdown(result.answer)
+
+    for debug_line in result.debug:
+        st.sidebar.write(f"DEBUG: {debug_line}")
+    backend_stats = answer_backend.stats()
+    cache_stats = backend_stats["query_cache"]
+    st.sidebar.write(f"DEBUG: ذاكرة الاستعلامات: {cache_stats['hits']} إصابة / {cache_stats['misses']} إخفاق ({cache_stats['entries']} مدخل).")
+    if backend_stats["serper_cache"]:
+        st.sidebar.write(f"DEBUG: ذاكرة نتائج Serper: {backend_stats['serper_cache']}")
+    st.sidebar.write(f"DEBUG: أزمنة الطبقات (ms): {result.timings}")
+    return result.answer, result.source
+
+# --- 3. عرض سجل المحادثات السابق (آخر CHAT_WINDOW_SIZE رسالة، مع تحميل الأقدم عند الطلب) ---
+if "chat_window_pages" not in st.session_state:
+    st.session_state.chat_window_pages = 1
+
+visible_count = CHAT_WINDOW_SIZE * st.session_state.chat_window_pages
+visible_messages = st.session_state.messages[-visible_count:]
+older_messages = []
+missing_count = visible_count - len(visible_messages)
+if missing_count > 0 and st.session_state.messages:
+    # رسائل هذه الجلسة التي خرجت من الذاكرة تُقرأ من المخزن فقط عند طلبها
+    older_messages = chat_history_store.recent(
+        limit=missing_count,
+        session_id=st.session_state.session_id,
+        before_timestamp=st.session_state.messages[0]["timestamp"],
+    )
 
-        سؤال المستخدم: {question}
+if len(visible_messages) < len(st.session_state.messages) or len(older_messages) == missing_count > 0:
+    if st.button("⬆️ تحميل رسائل أقدم", key="load_older_messages_button"):
+        st.session_state.chat_window_pages += 1
+        st.rerun()
 
-        الإجابة:
-        """
-    )
-    general_response_chain = general_llm_prompt | llm | StrOutputParser()
-    try:
-        llm_answer = general_response_chain.invoke({"question": user_question})
-        return llm_answer, "llm" 
-    except Exception as llm_e:
-        st.error(f"❌ حدث خطأ أثناء الاتصال بالذكاء الاصطناعي التوليدي: {llm_e}")
-        return "عذراً، حدث خطأ أثناء محاولة الإجابة من الذكاء الاصطناعي. يرجى المحاولة لاحقاً.", "error" 
-
-# --- 3. عرض سجل المحادثات السابق (كما هو) ---
-for message in st.session_state.messages:
+for message in older_messages + visible_messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -488,37 +503,18 @@ if user_question := st.chat_input("اطرح سؤالك هنا..."):
         st.markdown(user_question)
 
     with st.chat_message("assistant"):
-        with st.spinner("جاري البحث عن الإجابة... من فضلك انتظر ⏳"): 
-            try:
-                answer_content, answer_source = get_bot_response(user_question) 
-
-                source_indicator_message = ""
-                if answer_source == "faq":
-                    source_indicator_message = "<p style='font-size: 0.8em; color: #b9955c; margin-bottom: 5px;'><i>(الإجابة من قاعدة بيانات الأسئلة الشائعة 📚)</i></p>"
-                elif answer_source == "web_search_answer_box":
-                    source_indicator_message = "<p style='font-size: 0.8em; color: #66CCFF; margin-bottom: 5px;'><i>(الإجابة من بحث الويب 🌐)</i></p>"
-                elif answer_source == "web_search_summary":
-                    source_indicator_message = "<p style='font-size: 0.8em; color: #66CCFF; margin-bottom: 5px;'><i>(الإجابة ملخصة من نتائج بحث الويب 🌐)</i></p>"
-                elif answer_source == "llm":
-                    source_indicator_message = "<p style='font-size: 0.8em; color: #9cc6e4; margin-bottom: 5px;'><i>(الذكاء الاصطناعي التوليدي قام بالإجابة ✨)</i></p>"
-                elif answer_source == "error":
-                    source_indicator_message = "<p style='font-size: 0.8em; color: red; margin-bottom: 5px;'><i>(حدث خطأ أثناء الحصول على الإجابة 🚫)</i></p>"
-
-                if source_indicator_message:
-                    st.markdown(source_indicator_message, unsafe_allow_html=True)
-                
-                st.markdown(answer_content) 
-
-                st.session_state.messages.append({"role": "assistant", "content": answer_content, "timestamp": time.time()})
-                
-                full_history = load_chat_history()
-                full_history.append({"timestamp": time.time(), "role": "user", "content": user_question})
-                full_history.append({"timestamp": time.time(), "role": "assistant", "content": answer_content})
-                save_chat_history(full_history)
-
-            except Exception as e:
-                st.error(f"حدث خطأ أثناء معالجة سؤالك: {e}")
-                st.error("الرجاء التأكد من أن مفتاح Google API الخاص بك صحيح ويعمل، وأن قاعدة بيانات الأسئلة والأجوبة موجودة وصحيحة، وأن مفتاح Serper API صحيح إذا كنت تستخدمه.")
+        try:
+            # الإجابة تُعرض (وتُبث) داخل get_bot_response، ثم يُحفظ النص الكامل في السجل
+            answer_content, answer_source = get_bot_response(user_question) 
+
+            st.session_state.messages.append({"role": "assistant", "content": answer_content, "timestamp": time.time()})
+            
+            append_chat_history(*st.session_state.messages[-2:])
+            trim_session_messages()
+
+        except Exception as e:
+            st.error(f"حدث خطأ أثناء معالجة سؤالك: {e}")
+            st.error("الرجاء التأكد من أن مفتاح Google API الخاص بك صحيح ويعمل، وأن قاعدة بيانات الأسئلة والأجوبة موجودة وصحيحة، وأن مفتاح Serper API صحيح إذا كنت تستخدمه.")
 
 
 # --- قسم تذييل الصفحة (Footer) ---
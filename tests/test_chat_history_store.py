@@ -0,0 +1,108 @@
+import json
+import time
+import sqlite3
+
+import pytest
+
+from chat_history_store import LEGACY_SESSION_ID, ChatHistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    chat_history_store = ChatHistoryStore(str(tmp_path / "chat_history.db"))
+    yield chat_history_store
+    chat_history_store.close()
+
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+
+def test_recent_is_oldest_first_and_filtered_by_session(store):
+    store.append_many([
+        ("a", "user", "a1", 1.0),
+        ("b", "user", "b1", 2.0),
+        ("a", "assistant", "a2", 3.0),
+        ("a", "user", "a3", 4.0),
+    ])
+
+    assert contents(store.recent(limit=2, session_id="a")) == ["a2", "a3"]
+    assert contents(store.recent(limit=3)) == ["b1", "a2", "a3"]
+    assert contents(store.recent(session_id="a", before_timestamp=4.0)) == ["a1", "a2"]
+
+
+def test_messages_with_equal_timestamps_keep_insertion_order(store):
+    store.append_many([("a", "user", "question", 5.0), ("a", "assistant", "answer", 5.0)])
+    store.append("a", "user", "next question", 5.0)
+
+    assert contents(store.recent(limit=2)) == ["answer", "next question"]
+    assert contents(store.between(0, 10)) == ["question", "answer", "next question"]
+
+
+def test_migrate_from_json_imports_valid_messages_once(store, tmp_path):
+    json_path = tmp_path / "chat_history.json"
+    json_path.write_text(json.dumps([
+        {"role": "user", "content": "مرحبا", "timestamp": 10.0},
+        {"role": "assistant", "content": "أهلاً بك"},
+        {"role": "user"}, # بدون محتوى، يُتجاهل
+        "ليست رسالة",
+    ], ensure_ascii=False), encoding="utf-8")
+
+    assert store.migrate_from_json(str(json_path)) == 2
+    assert store.migrate_from_json(str(json_path)) == 0
+
+    messages = store.recent()
+    assert contents(messages) == ["مرحبا", "أهلاً بك"]
+    assert {message["session_id"] for message in messages} == {LEGACY_SESSION_ID}
+    assert messages[0]["timestamp"] == 10.0
+    assert messages[1]["timestamp"] > 10.0 # الرسالة بدون وقت تأخذ وقت الترحيل
+
+
+def test_migrate_from_json_marks_unreadable_file_as_migrated(store, tmp_path):
+    json_path = tmp_path / "chat_history.json"
+    json_path.write_text("{not json", encoding="utf-8")
+
+    assert store.migrate_from_json(str(json_path)) == 0
+    json_path.write_text(json.dumps([{"role": "user", "content": "متأخرة"}]), encoding="utf-8")
+    assert store.migrate_from_json(str(json_path)) == 0
+    assert store.count() == 0
+
+
+def test_migrate_from_missing_file_can_run_later(store, tmp_path):
+    json_path = tmp_path / "chat_history.json"
+
+    assert store.migrate_from_json(str(json_path)) == 0
+    json_path.write_text(json.dumps([{"role": "user", "content": "رسالة"}]), encoding="utf-8")
+    assert store.migrate_from_json(str(json_path)) == 1
+
+
+def test_compact_moves_oldest_messages_to_monthly_archive(tmp_path):
+    db_path = tmp_path / "chat_history.db"
+    store = ChatHistoryStore(str(db_path), max_rows=3)
+    store.append_many([("a", "user", f"m{i}", float(i)) for i in range(5)])
+
+    store.compact()
+
+    assert contents(store.recent()) == ["m2", "m3", "m4"]
+    archive_paths = list(tmp_path.glob("chat_history-??????.db"))
+    assert [path.name for path in archive_paths] == [f"chat_history-{time.strftime('%Y%m')}.db"]
+    archive_path = archive_paths[0]
+    with sqlite3.connect(str(archive_path)) as archive:
+        archived = archive.execute("SELECT content FROM messages ORDER BY id").fetchall()
+    assert [row[0] for row in archived] == ["m0", "m1"]
+
+    # أرشفة ثانية في نفس الشهر تُضاف إلى نفس الملف
+    store.append("a", "user", "m5", 5.0)
+    store.compact()
+    assert store.count() == 3
+    with sqlite3.connect(str(archive_path)) as archive:
+        assert archive.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 3
+    store.close()
+
+
+def test_compact_under_limit_keeps_everything(store):
+    store.append_many([("a", "user", f"m{i}", float(i)) for i in range(3)])
+
+    store.compact()
+
+    assert store.count() == 3
@@ -0,0 +1,69 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from clean_data import (
+    UNWANTED_PHRASES, ParagraphDeduper, clean_paragraphs, clean_paragraphs_parallel,
+    clean_text_data_single_paragraph, read_paragraphs, remove_duplicates,
+)
+
+RAW_FILES = [
+    Path(__file__).resolve().parent.parent / "all_university_paragraphs.txt",
+    Path(__file__).resolve().parent.parent / "university_texts_with_ocr.txt",
+]
+
+
+def reference_clean(text_input):
+    # التنظيف الأصلي (استبدال كل عبارة على حدة ثم re.sub بدون أنماط مُجمّعة)، للمقارنة فقط
+    text = text_input.strip()
+    for phrase in UNWANTED_PHRASES:
+        text = text.replace(phrase, "")
+    text = re.sub(r'[^\u0600-\u06FF\sA-Za-z0-9\.\,]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = text.lower()
+    if text and len(text) > 10:
+        return text
+    return None
+
+
+@pytest.mark.parametrize("text", [
+    "  مرحباً بكم في جامعة الشام الخاصة  ",
+    "Copyright ©جميع الحقوق محفوظة لجامعة الشام",
+    "Copyright ©جميع الحقوق محفوظة لمركز شام للدراسات والبحث العلمي - 2024",
+    "كلية الطب البشري المزيد",
+    "Sham university: Faculty of Medicine!!",
+    "نهتم دوما بالاستماع إلى مقترحاتكم وآرائكم. تواصل معنا عبر البريد info@sham.edu.sy",
+    "سطر\tفيه\n\nمسافات    كثيرة، وفواصل.",
+    "قصير",
+    "",
+])
+def test_cleaner_matches_reference(text):
+    assert clean_text_data_single_paragraph(text) == reference_clean(text)
+
+
+def test_cleaner_matches_reference_on_raw_corpus():
+    paragraphs = list(read_paragraphs(RAW_FILES))
+    assert paragraphs
+    assert [clean_text_data_single_paragraph(p) for p in paragraphs] == [reference_clean(p) for p in paragraphs]
+
+
+def test_parallel_cleaning_matches_serial_after_deduplication():
+    # clean_chunk يحذف التكرار داخل كل مجموعة، فالمقارنة بعد إزالة التكرار الكاملة
+    paragraphs = list(read_paragraphs(RAW_FILES))
+    serial = list(remove_duplicates(clean_paragraphs(paragraphs), ParagraphDeduper()))
+    parallel = list(remove_duplicates(clean_paragraphs_parallel(paragraphs, workers=2, chunk_size=100), ParagraphDeduper()))
+
+    assert parallel == serial
+
+
+def test_deduper_keeps_first_occurrence_in_order(tmp_path):
+    output_file = tmp_path / "cleaned.txt"
+    output_file.write_text("فقرة موجودة مسبقاً في الملف\n", encoding="utf-8")
+    deduper = ParagraphDeduper()
+    deduper.seed_from_file(str(output_file))
+
+    paragraphs = ["فقرة جديدة أولى", "فقرة موجودة مسبقاً في الملف", "فقرة جديدة ثانية", "فقرة جديدة أولى"]
+
+    assert list(remove_duplicates(paragraphs, deduper)) == ["فقرة جديدة أولى", "فقرة جديدة ثانية"]
+    assert len(deduper) == 3
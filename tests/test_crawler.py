@@ -0,0 +1,51 @@
+import pytest
+
+from crawler import CrawlFrontier, canonicalize_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://sham.edu.sy/ar/news/", "https://sham.edu.sy/ar/news"),
+    ("https://sham.edu.sy/ar/news#top", "https://sham.edu.sy/ar/news"),
+    ("HTTPS://Sham.EDU.sy/ar/News", "https://sham.edu.sy/ar/News"), # المسار حساس لحالة الأحرف
+    ("https://sham.edu.sy:443/ar", "https://sham.edu.sy/ar"),
+    ("http://sham.edu.sy:80/ar", "http://sham.edu.sy/ar"),
+    ("https://sham.edu.sy:8443/ar", "https://sham.edu.sy:8443/ar"),
+    ("https://sham.edu.sy/news?page=2&id=7", "https://sham.edu.sy/news?id=7&page=2"),
+    ("https://sham.edu.sy/news?id=7&utm_source=fb&UTM_Medium=x&fbclid=abc&ref=home", "https://sham.edu.sy/news?id=7"),
+    ("https://sham.edu.sy/search?q=", "https://sham.edu.sy/search?q="),
+    ("  https://sham.edu.sy/  ", "https://sham.edu.sy"),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_canonicalize_url_is_idempotent():
+    url = canonicalize_url("https://Sham.edu.sy:443/ar/news/?b=2&a=1&utm_campaign=x#section")
+    assert canonicalize_url(url) == url
+
+
+def test_frontier_is_fifo_and_skips_seen_urls():
+    frontier = CrawlFrontier()
+
+    assert frontier.add("https://sham.edu.sy/a", 0)
+    assert frontier.add("https://sham.edu.sy/b/", 1)
+    assert not frontier.add("https://sham.edu.sy/a/#contact", 1)
+    assert not frontier.add("https://sham.edu.sy/b?utm_source=x", 2)
+
+    assert len(frontier) == 2
+    assert frontier.pop() == ("https://sham.edu.sy/a", 0)
+    assert frontier.pop() == ("https://sham.edu.sy/b", 1)
+    assert len(frontier) == 0
+    # الرابط الذي سُحب من الطابور يبقى معروفاً
+    assert not frontier.add("https://sham.edu.sy/a", 3)
+
+
+def test_frontier_restored_from_checkpoint_state():
+    frontier = CrawlFrontier(
+        pending=[("https://sham.edu.sy/c", 2)],
+        seen=["https://sham.edu.sy/a", "https://sham.edu.sy/c"],
+    )
+
+    assert not frontier.add("https://sham.edu.sy/a/", 1)
+    assert frontier.add("https://sham.edu.sy/d", 3)
+    assert [frontier.pop(), frontier.pop()] == [("https://sham.edu.sy/c", 2), ("https://sham.edu.sy/d", 3)]
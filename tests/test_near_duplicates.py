@@ -0,0 +1,57 @@
+import pytest
+
+from near_duplicates import NearDuplicateFilter, lsh_params, make_near_duplicate_filter
+
+BASE = "تأسست جامعة الشام الخاصة عام 2011 وتضم كليات الطب البشري وطب الأسنان والصيدلة والهندسة المعلوماتية وإدارة الأعمال"
+NEAR_DUPLICATE = BASE + " والحقوق"
+DIFFERENT = "يبدأ التسجيل في الفصل الدراسي الثاني في شهر شباط ويستمر حتى نهاية الشهر مع إمكانية التسجيل المتأخر برسوم إضافية"
+
+
+def test_lsh_params_defaults():
+    # العتبة 0.8 مع بصمة 128 خانة ووزن 0.95 للسلبيات الكاذبة: 16 حزمة × 8 صفوف
+    assert lsh_params(0.8, 128, 0.95) == (16, 8)
+
+
+@pytest.mark.parametrize("threshold, num_perm, false_negative_weight", [
+    (0.8, 128, 0.5), (0.8, 128, 0.95), (0.5, 64, 0.95), (0.9, 256, 0.95),
+])
+def test_lsh_params_fit_signature(threshold, num_perm, false_negative_weight):
+    bands, rows = lsh_params(threshold, num_perm, false_negative_weight)
+    assert bands >= 1 and rows >= 1
+    assert bands * rows <= num_perm
+
+
+def test_higher_false_negative_weight_lowers_candidate_threshold():
+    # عتبة منحنى LSH التقريبية (1/b)^(1/r) تنخفض كلما زاد وزن السلبيات الكاذبة
+    def curve_threshold(bands, rows):
+        return (1 / bands) ** (1 / rows)
+    assert curve_threshold(*lsh_params(0.8, 128, 0.95)) < curve_threshold(*lsh_params(0.8, 128, 0.5))
+
+
+def test_filter_removes_exact_and_near_duplicates_in_order():
+    near_duplicate_filter = NearDuplicateFilter(0.8)
+
+    kept = list(near_duplicate_filter.filter([BASE, DIFFERENT, NEAR_DUPLICATE, BASE]))
+
+    assert kept == [BASE, DIFFERENT]
+    assert near_duplicate_filter.stats() == {
+        "representatives": 2, "removed": 2, "clusters_with_duplicates": 1, "largest_cluster": 3,
+    }
+
+
+def test_filter_keeps_near_duplicate_below_threshold():
+    near_duplicate_filter = NearDuplicateFilter(0.99)
+
+    assert list(near_duplicate_filter.filter([BASE, NEAR_DUPLICATE])) == [BASE, NEAR_DUPLICATE]
+
+
+def test_seeded_paragraphs_are_not_written_again():
+    near_duplicate_filter = NearDuplicateFilter(0.8)
+    near_duplicate_filter.seed([BASE])
+
+    assert list(near_duplicate_filter.filter([NEAR_DUPLICATE, DIFFERENT])) == [DIFFERENT]
+
+
+def test_stage_is_disabled_by_zero_threshold():
+    assert make_near_duplicate_filter(0) is None
+    assert isinstance(make_near_duplicate_filter(0.8), NearDuplicateFilter)
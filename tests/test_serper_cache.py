@@ -0,0 +1,150 @@
+import time
+import asyncio
+
+import pytest
+
+import serper_cache
+from serper_cache import CachedSerperSearch, StubSerperSearch
+
+
+class FakeClock:
+    # بديل لوحدة time داخل serper_cache: الوقت يتقدم يدوياً فقط
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(serper_cache, "time", fake_clock)
+    return fake_clock
+
+
+def counting_responses():
+    # كل طلب إلى Serper يعيد رداً مختلفاً، فيمكن معرفة إن كانت النتيجة من الذاكرة أم طلباً جديداً
+    counter = {"calls": 0}
+
+    def respond(query):
+        counter["calls"] += 1
+        return {"query": query, "version": counter["calls"]}
+    return respond
+
+
+def make_cache(tmp_path, stub, **kwargs):
+    return CachedSerperSearch(stub, db_path=str(tmp_path / "serper_cache.db"), **kwargs)
+
+
+def wait_for_refresh(cache, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while cache._refreshing:
+        assert time.monotonic() < deadline, "لم ينتهِ التحديث في الخلفية"
+        time.sleep(0.01)
+
+
+def test_fresh_result_is_served_from_cache(tmp_path, clock):
+    stub = StubSerperSearch(counting_responses())
+    cache = make_cache(tmp_path, stub, ttl_seconds=60, stale_seconds=0)
+
+    first = cache.results("رسوم كلية الطب")
+    clock.now += 30
+    second = cache.results("رسوم كلية الطب")
+
+    assert first == second == {"query": "رسوم كلية الطب", "version": 1}
+    assert stub.calls == ["رسوم كلية الطب"]
+    assert cache.stats() == {"hits": 1, "stale_hits": 0, "misses": 1}
+    cache.close()
+
+
+def test_normalized_query_shares_cache_entry(tmp_path, clock):
+    stub = StubSerperSearch(counting_responses())
+    cache = make_cache(tmp_path, stub, ttl_seconds=60, stale_seconds=0)
+
+    cache.results("ما هي رسوم الجامعة؟")
+    cache.results("ما هي رسوم الجامعة")
+
+    assert len(stub.calls) == 1
+    cache.close()
+
+
+def test_expired_result_is_fetched_again(tmp_path, clock):
+    stub = StubSerperSearch(counting_responses())
+    cache = make_cache(tmp_path, stub, ttl_seconds=60, stale_seconds=0)
+
+    cache.results("q")
+    clock.now += 61
+    result = cache.results("q")
+
+    assert result["version"] == 2
+    assert len(stub.calls) == 2
+    assert cache.stats() == {"hits": 0, "stale_hits": 0, "misses": 2}
+    cache.close()
+
+
+def test_stale_result_is_served_and_refreshed_in_background(tmp_path, clock):
+    stub = StubSerperSearch(counting_responses())
+    cache = make_cache(tmp_path, stub, ttl_seconds=60, stale_seconds=600)
+
+    cache.results("q")
+    clock.now += 120 # بعد الـ TTL وقبل نهاية مدة القِدم
+    stale = cache.results("q")
+    wait_for_refresh(cache)
+    refreshed = cache.results("q")
+
+    assert stale["version"] == 1
+    assert refreshed["version"] == 2
+    assert len(stub.calls) == 2
+    assert cache.stats() == {"hits": 1, "stale_hits": 1, "misses": 1}
+    cache.close()
+
+
+def test_result_past_stale_window_is_a_miss(tmp_path, clock):
+    stub = StubSerperSearch(counting_responses())
+    cache = make_cache(tmp_path, stub, ttl_seconds=60, stale_seconds=600)
+
+    cache.results("q")
+    clock.now += 661
+    result = cache.results("q")
+
+    assert result["version"] == 2
+    assert cache.stats() == {"hits": 0, "stale_hits": 0, "misses": 2}
+    cache.close()
+
+
+def test_least_recently_used_result_is_evicted_over_size_limit(tmp_path, clock):
+    stub = StubSerperSearch(lambda query: {"query": query, "padding": "x" * 100})
+    entry_size = len(serper_cache.json.dumps(stub.results("a"), ensure_ascii=False).encode("utf-8"))
+    stub.calls.clear()
+    cache = make_cache(tmp_path, stub, ttl_seconds=3600, stale_seconds=0, max_bytes=2 * entry_size)
+
+    cache.results("a")
+    clock.now += 1
+    cache.results("b")
+    clock.now += 1
+    cache.results("a") # "a" أحدث استخداماً من "b"
+    clock.now += 1
+    cache.results("c") # يتجاوز الحد فيُحذف "b"
+    stub.calls.clear()
+    cache.results("a")
+    cache.results("c")
+    cache.results("b")
+
+    assert stub.calls == ["b"]
+    cache.close()
+
+
+def test_async_results_use_the_same_cache(tmp_path, clock):
+    stub = StubSerperSearch(counting_responses())
+    cache = make_cache(tmp_path, stub, ttl_seconds=60, stale_seconds=0)
+
+    async def ask_twice():
+        return await cache.aresults("q"), await cache.aresults("q")
+
+    first, second = asyncio.run(ask_twice())
+
+    assert first == second
+    assert len(stub.calls) == 1
+    assert cache.stats() == {"hits": 1, "stale_hits": 0, "misses": 1}
+    cache.close()